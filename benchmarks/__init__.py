@@ -0,0 +1,21 @@
+# coding=utf-8
+
+"""
+Benchmarks for cards.py.
+
+The end-to-end benchmarks build synthetic projects of increasing size (see corpus.py) and compare
+the time and memory spent against a stored baseline:
+
+    python -B -m benchmarks.run
+
+The microbenchmarks measure the time and memory spent per call of each function that a build
+spends most of its time in, so that any optimization of these can be validated in isolation:
+
+    python -B -m benchmarks.micro
+
+Note that the benchmarks should always be run from the root of the repository, so that the current
+development module is used instead of any installed one.
+
+A baseline is only meaningful on the machine it was measured on; store a new baseline (using
+--save-baseline) before comparing on any other machine.
+"""
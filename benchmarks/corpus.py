@@ -0,0 +1,200 @@
+# coding=utf-8
+
+"""
+This module provides functions for generating synthetic projects to benchmark builds with.
+
+A project is generated from a specification of its shape; e.g. the number of rows and columns,
+how many copies of each card to make, or how deep definitions reference each other. The same
+specification always generates the exact same project, so that builds can be compared over time.
+"""
+
+import os
+import random
+
+
+class CorpusSpecification:  # pylint: disable=too-few-public-methods
+    """ Represents the shape of a synthetic project. """
+
+    def __init__(self,
+                 rows: int=100,
+                 columns: int=4,
+                 counts: tuple=(1,),
+                 definitions: int=0,
+                 definition_depth: int=1,
+                 includes: int=0,
+                 references: int=0,
+                 images: int=0,
+                 datasources: int=1,
+                 seed: int=0):
+        self.rows = rows  # the number of rows in each datasource
+        self.columns = columns  # the number of text columns in each datasource
+        self.counts = counts  # the counts that each row is given one of, at random
+        self.definitions = definitions  # the number of definitions referenced by cards
+        self.definition_depth = definition_depth  # how deep each definition references others
+        self.includes = includes  # the number of files included by the template
+        self.references = references  # the number of references to other rows, per card
+        self.images = images  # the number of image columns in each datasource
+        self.datasources = datasources
+        self.seed = seed
+
+    def cards_total(self) -> int:
+        """ Return the expected total number of cards, including copies. """
+
+        return round(self.rows * self.datasources * sum(self.counts) / len(self.counts))
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @staticmethod
+    def with_cards_total(cards_total: int, **shape) -> 'CorpusSpecification':
+        """ Return a specification of the given shape, with rows enough for a total of cards. """
+
+        specification = CorpusSpecification(**shape)
+
+        cards_per_row = sum(specification.counts) / len(specification.counts)
+
+        specification.rows = max(1, round(
+            cards_total / cards_per_row / specification.datasources))
+
+        return specification
+
+
+def definition_name(definition_index: int, depth: int) -> str:
+    return 'rule_{0}_{1}'.format(definition_index, depth)
+
+
+def generate_definitions(specification: CorpusSpecification, path: str) -> None:
+    with open(path, 'w') as definitions_file:
+        definitions_file.write('definition,value\n')
+
+        for definition_index in range(specification.definitions):
+            for depth in range(specification.definition_depth):
+                if depth < specification.definition_depth - 1:
+                    # reference the next definition of the chain
+                    value = 'Rule {0}: {{{{ {1} }}}}'.format(
+                        definition_index, definition_name(definition_index, depth + 1))
+                else:
+                    value = '**bold** rule {0}'.format(definition_index)
+
+                definitions_file.write('{0},"{1}"\n'.format(
+                    definition_name(definition_index, depth), value))
+
+
+def generate_template(specification: CorpusSpecification, path: str) -> None:
+    template_directory = os.path.dirname(path)
+
+    includes = []
+
+    for include_index in range(specification.includes):
+        include_path = os.path.join('partials', 'partial-{0}.html'.format(include_index))
+
+        with open(os.path.join(template_directory, include_path), 'w') as include_file:
+            include_file.write('<div class="partial-{0}">{{{{ title }}}}</div>\n'
+                               .format(include_index))
+
+        includes.append('  {{{{ include \'{0}\' }}}}\n'.format(include_path))
+
+    columns = ''.join('  <p class="text-{0}">{{{{ text_{0} }}}}</p>\n'.format(column_index)
+                      for column_index in range(specification.columns))
+
+    images = ''.join('  <div class="image">{{{{ image_{0} }}}}</div>\n'.format(image_index)
+                     for image_index in range(specification.images))
+
+    with open(path, 'w') as template_file:
+        template_file.write('<style type="text/css">\n'
+                            '  .synthetic-card { font-family: Garamond; }\n'
+                            '</style>\n\n'
+                            '<div class="synthetic-card">\n'
+                            '  <h1>{{ title }}</h1>\n' +
+                            columns + images + ''.join(includes) +
+                            '  <span>{{ _card_index }} of {{ _cards_total }}</span>\n'
+                            '</div>\n')
+
+
+def generate_image(path: str, image_index: int) -> None:
+    with open(path, 'w') as image_file:
+        image_file.write('<svg xmlns="http://www.w3.org/2000/svg" width="32" height="32">'
+                         '<circle cx="16" cy="16" r="{0}"/></svg>\n'
+                         .format(1 + image_index % 15))
+
+
+def generate_datasource(specification: CorpusSpecification,
+                        datasource_index: int,
+                        generator: random.Random,
+                        path: str) -> None:
+    column_names = (['@count', '@template', 'title'] +
+                    ['text_{0}'.format(column_index)
+                     for column_index in range(specification.columns)] +
+                    ['image_{0}'.format(image_index)
+                     for image_index in range(specification.images)])
+
+    with open(path, 'w') as datasource_file:
+        datasource_file.write(','.join(column_names) + '\n')
+
+        for row in range(specification.rows):
+            # the first row after the column names is row #2
+            row_index = row + 2
+
+            values = [str(generator.choice(specification.counts)),
+                      'templates/card.html' if row == 0 else '^',
+                      'Card {0}-{1}'.format(datasource_index, row)]
+
+            for column_index in range(specification.columns):
+                text = 'Some *text* for column {0} of card {1}.'.format(column_index, row)
+
+                if column_index == 0:
+                    for _ in range(specification.references):
+                        referenced_row_index = generator.randrange(2, specification.rows + 2)
+
+                        if referenced_row_index != row_index:
+                            text += ' See {{{{ title #{0} }}}}.'.format(referenced_row_index)
+
+                    if specification.definitions > 0:
+                        text += ' {{{{ {0} }}}}'.format(definition_name(
+                            generator.randrange(specification.definitions), 0))
+
+                values.append(text)
+
+            for image_index in range(specification.images):
+                values.append('{{{{ images/image-{0}.svg 32x32 }}}}'.format(
+                    generator.randrange(max(1, specification.rows // 10))))
+
+            datasource_file.write(','.join('"{0}"'.format(value) for value in values) + '\n')
+
+
+def generate_project(specification: CorpusSpecification, path: str) -> (list, str):
+    """ Generate a synthetic project at a path.
+
+        Return the paths of all datasources in the project, and the path of its definitions
+        (if any).
+    """
+
+    generator = random.Random(specification.seed)
+
+    os.makedirs(os.path.join(path, 'templates', 'partials'), exist_ok=True)
+    os.makedirs(os.path.join(path, 'images'), exist_ok=True)
+
+    generate_template(specification, os.path.join(path, 'templates', 'card.html'))
+
+    if specification.images > 0:
+        for image_index in range(max(1, specification.rows // 10)):
+            generate_image(os.path.join(path, 'images', 'image-{0}.svg'.format(image_index)),
+                           image_index)
+
+    definitions_path = None
+
+    if specification.definitions > 0:
+        definitions_path = os.path.join(path, 'definitions.csv')
+
+        generate_definitions(specification, definitions_path)
+
+    data_paths = []
+
+    for datasource_index in range(specification.datasources):
+        data_path = os.path.join(path, 'cards-{0}.csv'.format(datasource_index))
+
+        generate_datasource(specification, datasource_index, generator, data_path)
+
+        data_paths.append(data_path)
+
+    return data_paths, definitions_path
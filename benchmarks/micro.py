@@ -0,0 +1,304 @@
+# coding=utf-8
+
+"""
+Benchmark the functions that a build spends most of its time in, each in isolation
+
+Each function is run over a small, medium and large input taken from the example projects:
+a single column of content, a card template and a page of card templates, respectively.
+
+Usage:
+  micro.py [<name>]... [--min-time=<seconds>] [--baseline=<file>] [--save-baseline]
+  micro.py -h | --help
+
+Examples:
+  python -B -m benchmarks.micro
+    Benchmarks every function, and compares against the stored baseline.
+
+  python -B -m benchmarks.micro fields markdown
+    Benchmarks only fields() and markdown().
+
+Options:
+  -h --help                         Show program help
+  --min-time=<seconds>              Specify the least amount of time spent measuring each
+                                    benchmark [default: 0.2]
+  --baseline=<file>                 Specify baseline file [default: benchmarks/micro-baseline.json]
+  --save-baseline                   Store the results as the new baseline
+"""
+
+import os
+import csv
+import json
+import time
+import platform
+import tracemalloc
+
+from contextlib import redirect_stdout
+from collections import OrderedDict
+
+from docopt import docopt
+
+from benchmarks.run import change
+
+from cards.autotemplate import template_from_data
+from cards.column import Column, Row, get_column_contentd, resolve_column
+from cards.markdown import markdown
+from cards.templatefield import fields
+from cards.util import get_padded_string, lower_first_row
+
+from cards.template import (
+    Template, strip_styles, fill_each, fill_template, fill_definitions, fill_partial_definition,
+    resolve_column_content, resolve_column_field
+)
+
+EXAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'example')
+
+
+class MicrobenchmarkInput:  # pylint: disable=too-few-public-methods
+    """ Represents the input of a microbenchmark; i.e. a template, a row and definitions. """
+
+    def __init__(self, content: str, path: str, row: Row, definitions: dict):
+        self.content = content  # the content of a template
+        self.path = path  # the path of the template
+        self.row = row  # the row that the template is filled with
+        self.definitions = definitions
+
+    def template(self) -> Template:
+        return Template(self.content, self.path)
+
+
+def read_rows(data_path: str) -> list:
+    with open(data_path) as data_file:
+        return [Row(data, data_path, row_index=row_index)
+                for row_index, data in enumerate(csv.DictReader(lower_first_row(data_file)),
+                                                 start=2)]
+
+
+def example_inputs() -> dict:
+    """ Return a small, medium and large input taken from the example projects. """
+
+    data_path = os.path.join(EXAMPLE_PATH, 'love-letter', 'cards.csv')
+    templated_data_path = os.path.join(EXAMPLE_PATH, 'love-letter-templated', 'cards.csv')
+    template_path = os.path.join(EXAMPLE_PATH, 'love-letter-templated', 'templates', 'card.html')
+
+    rows = read_rows(data_path)
+    templated_rows = read_rows(templated_data_path)
+
+    # make a definition out of each card, and one more that can be used as a partial definition
+    definitions = {row.data['name'].lower(): row.data['text'] for row in rows}
+    definitions['art_size'] = '32x32'
+
+    # reference each definition, including the partial one
+    definition_fields = (' '.join('{{{{ {0} }}}}'.format(definition)
+                                  for definition in definitions if definition != 'art_size') +
+                         ' {{ art/guard.png art_size }}')
+
+    with open(data_path) as data_file:
+        auto_template = template_from_data(csv.DictReader(lower_first_row(data_file)))
+
+    with open(template_path) as template_file:
+        card_template = template_file.read().strip()
+
+    # the content of a single column
+    small = MicrobenchmarkInput(
+        rows[0].data['text'] + ' ' + definition_fields, data_path, rows[0], definitions)
+
+    # a single card
+    medium = MicrobenchmarkInput(
+        card_template + '\n' + definition_fields, template_path, templated_rows[0], definitions)
+
+    # a page of cards; one of each card in the example
+    large = MicrobenchmarkInput(
+        '\n'.join([card_template + '\n' + auto_template + '\n' + definition_fields] *
+                  len(templated_rows)),
+        template_path, templated_rows[0], definitions)
+
+    return OrderedDict([('small', small), ('medium', medium), ('large', large)])
+
+
+def fill_each_benchmark(given: MicrobenchmarkInput):
+    template = given.template()
+
+    return lambda: fill_each('name', given.row.data['name'], template)
+
+
+def fill_template_benchmark(given: MicrobenchmarkInput):
+    template = given.template()
+
+    return lambda: fill_template(template, given.row, given.definitions)
+
+
+def fill_definitions_benchmark(given: MicrobenchmarkInput):
+    template = given.template()
+
+    return lambda: fill_definitions(given.definitions, template)
+
+
+def fill_partial_definition_benchmark(given: MicrobenchmarkInput):
+    template = given.template()
+
+    return lambda: fill_partial_definition(
+        'art_size', given.definitions['art_size'], template)
+
+
+def get_column_contentd_benchmark(given: MicrobenchmarkInput):
+    row = Row(dict(given.row.data, text=given.content), given.row.data_path, given.row.row_index)
+
+    return lambda: get_column_contentd(
+        'text', row, given.definitions,
+        content_resolver=resolve_column_content, field_resolver=resolve_column_field)
+
+
+def resolve_column_benchmark(given: MicrobenchmarkInput):
+    row = Row(dict(given.row.data, text=given.content), given.row.data_path, given.row.row_index)
+
+    return lambda: resolve_column(
+        Column('text', given.content), row, given.definitions,
+        content_resolver=resolve_column_content, field_resolver=resolve_column_field)
+
+
+def get_padded_string_benchmark(given: MicrobenchmarkInput):
+    # pad the content as if it was included at the last field of the template
+    index = given.content.rfind('{{')
+
+    return lambda: get_padded_string(given.content, given.content, index)
+
+
+def strip_styles_benchmark(given: MicrobenchmarkInput):
+    template = given.template()
+
+    return lambda: strip_styles(template)
+
+
+# each benchmark makes a single operation ready to run; operations that change the template
+# get a fresh template every time, so that each run does the same amount of work
+MICROBENCHMARKS = OrderedDict([
+    ('fields', lambda given: lambda: list(fields(given.content))),
+    ('fill_each', fill_each_benchmark),
+    ('fill_template', fill_template_benchmark),
+    ('fill_definitions', fill_definitions_benchmark),
+    ('fill_partial_definition', fill_partial_definition_benchmark),
+    ('get_column_contentd', get_column_contentd_benchmark),
+    ('resolve_column', resolve_column_benchmark),
+    ('get_padded_string', get_padded_string_benchmark),
+    ('strip_styles', strip_styles_benchmark),
+    ('markdown', lambda given: lambda: markdown(given.content))
+])
+
+
+def measure(make_operation, min_time: float) -> (float, float):
+    """ Run an operation repeatedly, and return the time (in nanoseconds) and the memory (in bytes)
+        allocated at most, per operation.
+
+        Python does not count individual allocations, so memory is measured as the peak size of
+        all blocks allocated during an operation instead.
+    """
+
+    operation_count = 1
+    time_spent = 0
+
+    while True:
+        # every operation is made ready beforehand, so that only the operation itself is timed
+        operations = [make_operation() for _ in range(operation_count)]
+
+        time_started = time.perf_counter()
+
+        for operation in operations:
+            operation()
+
+        time_spent = time.perf_counter() - time_started
+
+        if time_spent >= min_time:
+            break
+
+        operation_count *= 2
+
+    time_per_operation = time_spent / operation_count * 1e9
+
+    operations = [make_operation() for _ in range(min(operation_count, 100))]
+
+    peak_size_total = 0
+
+    for operation in operations:
+        tracemalloc.start()
+
+        try:
+            operation()
+
+            _, peak_size = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        peak_size_total += peak_size
+
+    return time_per_operation, peak_size_total / len(operations)
+
+
+def main() -> None:
+    arguments = docopt(__doc__)
+
+    names = arguments['<name>'] or list(MICROBENCHMARKS)
+
+    unknown_names = [name for name in names if name not in MICROBENCHMARKS]
+
+    if len(unknown_names) > 0:
+        raise SystemExit('Unknown benchmarks: {0} (should be any of {1})'.format(
+            unknown_names, list(MICROBENCHMARKS)))
+
+    min_time = float(arguments['--min-time'])
+
+    baseline_path = arguments['--baseline']
+
+    baseline = {}
+
+    if os.path.isfile(baseline_path):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file).get('benchmarks', {})
+
+    inputs = example_inputs()
+
+    results = {}
+
+    print('{0:<24} {1:<7} {2:>12} {3:>7} {4:>12} {5:>7}'.format(
+        'benchmark', 'input', 'ns/op', '', 'B/op', ''))
+
+    for name in names:
+        for size, given in inputs.items():
+            key = '{0}/{1}'.format(name, size)
+
+            # some operations warn about their input (e.g. fields in styles); that's expected
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                time_per_operation, size_per_operation = measure(
+                    lambda: MICROBENCHMARKS[name](given), min_time)
+
+            results[key] = {
+                'ns_per_op': time_per_operation,
+                'bytes_per_op': size_per_operation
+            }
+
+            baseline_result = baseline.get(key, {})
+
+            print('{0:<24} {1:<7} {2:>12.0f} {3:>7} {4:>12.0f} {5:>7}'.format(
+                name, size,
+                time_per_operation,
+                change(time_per_operation, baseline_result.get('ns_per_op')),
+                size_per_operation,
+                change(size_per_operation, baseline_result.get('bytes_per_op'))))
+
+    if arguments['--save-baseline']:
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump({
+                'machine': {
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'python': platform.python_version()
+                },
+                # keep the baseline of any benchmark that was not run this time
+                'benchmarks': dict(baseline, **results)
+            }, baseline_file, indent=2, sort_keys=True)
+
+        print('\nSaved baseline\n -> \'{0}\''.format(baseline_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# coding=utf-8
+
+"""
+Benchmark builds of synthetic projects of increasing size, and compare against a baseline
+
+Usage:
+  run.py [--cards=<n>]... [--repeat=<n>] [--tolerance=<percent>] [--baseline=<file>]
+         [--engine=<engine>] [--save-baseline] [--keep=<path>]
+  run.py -h | --help
+
+Examples:
+  python -B -m benchmarks.run
+    Benchmarks builds of 1000, 10000 and 100000 cards, and compares against the stored baseline.
+
+  python -B -m benchmarks.run --cards=5000 --repeat=5
+    Benchmarks builds of 5000 cards, keeping the fastest of 5 builds.
+
+  python -B -m benchmarks.run --save-baseline
+    Benchmarks builds and stores the results as the new baseline.
+
+Options:
+  -h --help                         Show program help
+  --cards=<n>                       Specify the number of cards to benchmark a build of
+                                    (1000, 10000 and 100000 by default)
+  --repeat=<n>                      Specify number of builds of each benchmark [default: 3]
+  --tolerance=<percent>             Specify how much slower (or larger) a benchmark can be
+                                    than its baseline before failing [default: 20]
+  --baseline=<file>                 Specify baseline file [default: benchmarks/baseline.json]
+  --engine=<engine>                 Specify the engine that cards are rendered by
+                                    [default: reference]
+  --save-baseline                   Store the results as the new baseline
+  --keep=<path>                     Keep the generated projects at the specified path
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import multiprocessing
+
+from contextlib import redirect_stdout
+
+from docopt import docopt
+
+from benchmarks.corpus import CorpusSpecification, generate_project
+
+from cards.cards import make
+from cards.context import BuildContext
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak memory is simply not measured there
+    resource = None
+
+# the number of cards in each benchmark, unless otherwise specified
+DEFAULT_CARDS_TOTALS = [1000, 10000, 100000]
+
+# the shape of every generated project; only the number of rows differs between benchmarks
+DEFAULT_SHAPE = {
+    'columns': 4,
+    'counts': (1, 1, 1, 2, 3),
+    'definitions': 20,
+    'definition_depth': 3,
+    'includes': 2,
+    'references': 1,
+    'images': 1,
+    'datasources': 2
+}
+
+
+def peak_memory() -> int:
+    """ Return the peak memory used by the current process (in bytes), if available. """
+
+    if resource is None:
+        return None
+
+    peak_size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # reported in bytes on macOS, but in kilobytes everywhere else
+    return peak_size if sys.platform == 'darwin' else peak_size * 1024
+
+
+def measure_build(data_paths: list,
+                  definitions_path: str,
+                  output_path: str,
+                  engine: str) -> (float, int, int):
+    """ Build a project, and return the time spent, the total number of cards and peak memory.
+
+        Meant to run in a process of its own, so that peak memory is measured for this build only.
+    """
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        time_started = time.perf_counter()
+
+        variant_results = make(
+            data_paths, definitions_path=definitions_path,
+            output_path=output_path, output_filename='index.html',
+            open_output=False, context=BuildContext(is_interactive=False, engine=engine))
+
+        time_in_seconds = time.perf_counter() - time_started
+
+    cards_total = sum(cards_total for _, _, cards_total, _ in variant_results)
+
+    return time_in_seconds, cards_total, peak_memory()
+
+
+def benchmark(cards_total: int, path: str, repeat: int, engine: str) -> dict:
+    """ Generate a project with a total number of cards, and benchmark building it.
+
+        The fastest (and smallest) of all builds is kept.
+    """
+
+    specification = CorpusSpecification.with_cards_total(cards_total, **DEFAULT_SHAPE)
+
+    project_path = os.path.join(path, 'cards-{0}'.format(cards_total))
+
+    data_paths, definitions_path = generate_project(specification, project_path)
+
+    times = []
+    peak_sizes = []
+
+    for _ in range(repeat):
+        # every build runs in a fresh process, so that no build benefits from an earlier one
+        with multiprocessing.Pool(processes=1) as pool:
+            time_in_seconds, cards_built, peak_size = pool.apply(
+                measure_build, (data_paths, definitions_path, project_path, engine))
+
+        times.append(time_in_seconds)
+        peak_sizes.append(peak_size)
+
+    time_in_seconds = min(times)
+
+    return {
+        'cards_total': cards_built,
+        'time_in_seconds': time_in_seconds,
+        'cards_per_second': cards_built / time_in_seconds if time_in_seconds > 0 else 0,
+        'peak_memory': min(peak_sizes) if None not in peak_sizes else None,
+        'specification': specification.to_dict()
+    }
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> list:
+    """ Return each measure of a benchmark that is worse than its baseline, beyond tolerance. """
+
+    worse_measures = []
+
+    for measure in ['time_in_seconds', 'peak_memory']:
+        if result.get(measure) is None or baseline.get(measure) is None:
+            continue
+
+        if result[measure] > baseline[measure] * (1 + tolerance):
+            worse_measures.append(measure)
+
+    return worse_measures
+
+
+def change(value: float, baseline_value: float) -> str:
+    if value is None or baseline_value is None or baseline_value == 0:
+        return 'n/a'
+
+    return '{0:+.0f}%'.format((value / baseline_value - 1) * 100)
+
+
+def main() -> None:
+    arguments = docopt(__doc__)
+
+    cards_totals = ([int(cards_total) for cards_total in arguments['--cards']]
+                    if len(arguments['--cards']) > 0
+                    else DEFAULT_CARDS_TOTALS)
+
+    repeat = max(1, int(arguments['--repeat']))
+    tolerance = float(arguments['--tolerance']) / 100
+
+    baseline_path = arguments['--baseline']
+
+    baseline = {}
+
+    if os.path.isfile(baseline_path):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file).get('benchmarks', {})
+
+    results = {}
+
+    failed_benchmarks = []
+
+    with tempfile.TemporaryDirectory() as temporary_path:
+        path = arguments['--keep'] or temporary_path
+
+        for cards_total in cards_totals:
+            result = benchmark(cards_total, path, repeat, arguments['--engine'])
+
+            results[str(cards_total)] = result
+
+            baseline_result = baseline.get(str(cards_total), {})
+
+            worse_measures = regressions(result, baseline_result, tolerance)
+
+            if len(worse_measures) > 0:
+                failed_benchmarks.append(cards_total)
+
+            print('[{0}] {1} cards: {2:.3f} seconds ({3}), {4:.0f} cards/s, {5} peak ({6})'.format(
+                '!' if len(worse_measures) > 0 else '-',
+                result['cards_total'],
+                result['time_in_seconds'],
+                change(result['time_in_seconds'], baseline_result.get('time_in_seconds')),
+                result['cards_per_second'],
+                '{0:.1f} MB'.format(result['peak_memory'] / (1024 * 1024))
+                if result['peak_memory'] is not None else 'unknown',
+                change(result['peak_memory'], baseline_result.get('peak_memory'))))
+
+    if arguments['--save-baseline']:
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump({
+                'machine': {
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'python': platform.python_version()
+                },
+                # keep the baseline of any benchmark that was not run this time
+                'benchmarks': dict(baseline, **results)
+            }, baseline_file, indent=2, sort_keys=True)
+
+        print('\nSaved baseline\n -> \'{0}\''.format(baseline_path))
+
+    if len(failed_benchmarks) > 0:
+        print('\nBenchmarks slower (or larger) than baseline by more than {0:.0f}%:\n {1}'.format(
+            tolerance * 100, failed_benchmarks))
+
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,18 @@ Usage:
   cards make [<datasource>]... [--definitions=<defs>]
              [--output-path=<path>] [--output-file=<file>] [--include-header=<template>]
              [--card-size=<size>] [--force-page-breaks] [--disable-backs] [--disable-page-sections]
-             [--clean] [--preview] [--verbose]
+             [--cache-dir=<path>] [--cache-size=<mb>] [--cache-datasources] [--keep-layout]
+             [--layout-only] [--variants=<file>] [--shard=<i/N>] [--engine=<engine>]
+             [--diagnostics=<file>] [--profile] [--profile-render=<file>] [--trace=<file>]
+             [--memory-report]
+             [--report=<file>] [--progress] [--base-dir=<path>] [--clean] [--preview] [--verbose]
+  cards merge <shard>... [--output-path=<path>] [--output-file=<file>] [--include-header=<template>]
+              [--card-size=<size>] [--force-page-breaks] [--disable-backs] [--disable-page-sections]
+              [--variants=<file>] [--diagnostics=<file>] [--profile] [--profile-render=<file>]
+              [--trace=<file>] [--memory-report] [--report=<file>] [--keep-layout]
+              [--clean] [--preview] [--verbose]
+  cards batch <project>... [--jobs=<n>] [--cache-dir=<path>] [--cache-size=<mb>]
+              [--cache-datasources] [--engine=<engine>] [--clean] [--preview] [--verbose]
   cards new  [<name>] [--output-path=<path>] [--verbose]
   cards -h | --help
   cards --version
@@ -21,6 +32,20 @@ Examples:
     Builds both 'cards.csv' and 'tokens.csv' datasources with the definitions 'defs.csv',
     and outputs to the specified path (the desktop in this case).
 
+  cards make cards.csv tokens.csv --variants=variants.csv
+    Builds both datasources once, and outputs a file for each variant in 'variants.csv'.
+
+  generate-cards | cards make - --base-dir=src --output-file=- > index.html
+    Builds a datasource piped through stdin (resolving its templates and images from 'src'),
+    and writes the output file to stdout; each page as soon as it is laid out.
+
+  cards make cards.csv --shard=1/2 -o shard-1 && cards make cards.csv --shard=2/2 -o shard-2
+  cards merge shard-1 shard-2
+    Builds half of the cards in each shard (e.g. on separate machines), and then merges them.
+
+  cards batch games/*/src --jobs=4
+    Builds every project concurrently using 4 workers, without asking any questions.
+
   cards new "Empty Game"
     Creates an empty project in the current directory.
 
@@ -28,6 +53,7 @@ Options:
   -h --help                         Show program help
   -o --output-path=<path>           Specify output directory
   -f --output-file=<file>           Specify output filename [default: index.html]
+                                    (or '-' to write it to stdout, showing messages on stderr)
   -p --include-header=<template>    Specify a presentation template
   -d --definitions=<defs>           Specify definitions filename
   --card-size=<size>                Specify default card size [default: standard]
@@ -35,6 +61,38 @@ Options:
   --force-page-breaks               Force a page break after each datasource
   --disable-backs                   Do not render card backs
   --disable-page-sections           Do not render page sections
+  --cache-dir=<path>                Specify a directory for caching rendered cards
+                                    (can be shared between projects and checkouts)
+  --cache-size=<mb>                 Specify maximum size of the cache in megabytes (256 by default)
+  --cache-datasources               Keep parsed datasources in the cache directory (see --cache-dir,
+                                    or ~/.cache/cards.py by default), and only parse them again
+                                    once changed
+  --keep-layout                     Keep the resolved cards next to the output file, so that
+                                    pages can be laid out again later on (see --layout-only);
+                                    unless written to stdout
+  --layout-only                     Only lay out pages again, reusing the cards kept by the
+                                    previous build if none of its inputs have changed
+  --variants=<file>                 Specify variants to build; each variant is an output file
+                                    laid out with its own options from the same cards
+  --shard=<i/N>                     Only build the i'th of N shards of the cards, to be merged
+  --jobs=<n>                        Specify number of projects to build at once
+                                    (number of processors by default)
+  --engine=<engine>                 Specify the engine that cards are rendered by; either
+                                    \'reference\' or \'fast\' [default: reference]
+  --diagnostics=<file>              Save every warning, error and info as JSON Lines
+                                    (including warnings not shown unless verbose)
+  --profile                         Show the time spent in each phase of the build
+  --profile-render=<file>           Like --profile, but also save a cProfile of card rendering
+                                    (e.g. for inspecting with snakeviz or pstats)
+  --trace=<file>                    Save a timeline of the build (e.g. each card rendered) in the
+                                    Chrome trace format, and show the slowest rows and templates
+  --memory-report                   Show the peak and retained memory of each phase and datasource,
+                                    and the sites allocating the most memory (slows down builds)
+  --report=<file>                   Save a report of the build as JSON; e.g. counts, timings,
+                                    cache statistics and the size of each file written
+  --progress                        Show the progress of rendering cards (e.g. rate and ETA)
+  --base-dir=<path>                 Specify the directory that relative paths in a datasource
+                                    read from stdin (given as '-') are resolved against
   --clean                           Automatically remove any unused resources (images)
   --preview                         Only render 1 of each card
   --verbose                         Show more information
@@ -42,51 +100,58 @@ Options:
 """
 
 import os
-import re
+import sys
+
+from contextlib import redirect_stdout
 
 from docopt import docopt
 
-from cards.cards import make, make_empty_project
-from cards.warning import WarningDisplay
+# note that anything needed only by some commands is imported by those commands; this keeps
+# startup fast, especially for e.g. --help or --version (see test/test_startup.py)
+from cards.warning import WarningDisplay, save_diagnostics
+from cards.context import BuildContext
+from cards.profile import BuildProfile, BuildTrace, BuildMemoryReport
+from cards.report import BuildReport
+from cards.progress import BuildProgress
+from cards.update import start_update_check
 
 from cards.version import __version__
-from cards.constants import VERSION_PATTERN
 
-from pkg_resources import parse_version
+
+def get_cache_options(arguments: dict) -> (str, int):
+    """ Return the path and size of the render cache, if any. """
+
+    from cards.cache import CACHE_PATH_VARIABLE, CACHE_SIZE_VARIABLE
+
+    # the cache can also be enabled through the environment; e.g. for all builds on a machine
+    cache_path = arguments['--cache-dir'] or os.environ.get(CACHE_PATH_VARIABLE)
+    cache_size = arguments['--cache-size'] or os.environ.get(CACHE_SIZE_VARIABLE)
+
+    if cache_size is not None:
+        try:
+            cache_size = int(cache_size)
+        except ValueError:
+            WarningDisplay.bad_cache_size(cache_size)
+
+            cache_size = None
+
+    return (cache_path if cache_path is not None and len(cache_path) > 0 else None,
+            cache_size)
 
 
-def check_for_update():
-    """ Determine whether a newer version is available remotely. """
+def get_engine_option(arguments: dict) -> str:
+    """ Return the name of the engine that cards are rendered by. """
 
-    from urllib.request import urlopen
-    from urllib.error import URLError, HTTPError
+    from cards.engine import Engines
 
-    url = 'https://raw.githubusercontent.com/jhauberg/cards.py/master/cards/version.py'
+    engine = arguments['--engine']
 
-    try:
-        # specify a very short timeout, as this is a non-essential feature
-        # and should not stall program exit indefinitely
-        with urlopen(url, timeout=5) as response:
-            # we're certain this file is UTF8, so we'll decode it right away
-            response_body = response.read().decode('utf8')
-            # search for the version string
-            matches = re.search(VERSION_PATTERN, response_body, re.M)
+    if engine not in Engines.ALL:
+        WarningDisplay.bad_engine(engine, Engines.ALL)
 
-            if matches:
-                # if found, grab it and compare to the current installation
-                remote_version_identifier = matches.group(1)
+        engine = Engines.REFERENCE
 
-                if parse_version(__version__) < parse_version(remote_version_identifier):
-                    WarningDisplay.newer_version_available(
-                        new_version_identifier=remote_version_identifier)
-                    # end with empty break
-                    print()
-    except HTTPError:
-        # fail silently
-        pass
-    except URLError:
-        # fail silently
-        pass
+    return engine
 
 
 def main():
@@ -94,39 +159,161 @@ def main():
 
     arguments = docopt(__doc__, version='cards ' + __version__)
 
+    # check for a newer version while working; batches are usually not run by someone watching
+    update_check = start_update_check() if not arguments['batch'] else None
+
     output_path = arguments['--output-path']
 
     if output_path is None or len(output_path) == 0:
         output_path = os.getcwd()
 
-    WarningDisplay.is_verbose = arguments['--verbose']
-
-    if arguments['new']:
-        make_empty_project(
-            in_path=output_path,
-            name=arguments['<name>'])
-    elif arguments['make']:
-        data_paths = arguments['<datasource>']
-
-        output_filename = arguments['--output-file']
-        header_path = arguments['--include-header']
-        definitions_path = arguments['--definitions']
-        default_card_size_identifier = arguments['--card-size']
-        force_page_breaks = arguments['--force-page-breaks']
-        disable_backs = arguments['--disable-backs']
-        disable_sections = arguments['--disable-page-sections']
-        is_preview = arguments['--preview']
-        clean = arguments['--clean']
-
-        make(data_paths, header_path, definitions_path,
-             output_path, output_filename,
-             force_page_breaks,
-             disable_backs, disable_sections,
-             default_card_size_identifier,
-             is_preview,
-             clean)
-
-    check_for_update()
+    profile = (BuildProfile(render_profile_path=arguments['--profile-render'])
+               if arguments['--profile'] or arguments['--profile-render'] is not None
+               else None)
+
+    trace = (BuildTrace(arguments['--trace'])
+             if arguments['--trace'] is not None
+             else None)
+
+    memory_report = (BuildMemoryReport()
+                     if arguments['--memory-report']
+                     else None)
+
+    report = (BuildReport(arguments['--report'])
+              if arguments['--report'] is not None
+              else None)
+
+    # when the output file is written to stdout, every message is shown on stderr instead
+    output_stream = (sys.stdout
+                     if arguments['make'] and arguments['--output-file'] == '-'
+                     else None)
+
+    messages = sys.stderr if output_stream is not None else sys.stdout
+
+    # everything happens within the context of a single build
+    context = BuildContext(is_verbose=arguments['--verbose'],
+                           profile=profile,
+                           trace=trace,
+                           memory_report=memory_report,
+                           report=report,
+                           progress=BuildProgress(messages) if arguments['--progress'] else None)
+
+    with redirect_stdout(messages), context:
+        if arguments['new']:
+            from cards.cards import make_empty_project
+
+            make_empty_project(
+                in_path=output_path,
+                name=arguments['<name>'])
+        elif arguments['batch']:
+            from cards.batch import batch
+
+            cache_path, cache_size = get_cache_options(arguments)
+
+            context.engine = get_engine_option(arguments)
+            context.should_cache_datasources = arguments['--cache-datasources']
+
+            jobs = arguments['--jobs']
+
+            if jobs is not None:
+                try:
+                    jobs = max(1, int(jobs))
+                except ValueError:
+                    WarningDisplay.bad_jobs(jobs)
+
+                    jobs = None
+
+            succeeded = batch(arguments['<project>'], jobs,
+                              arguments['--preview'],
+                              arguments['--clean'],
+                              cache_path,
+                              cache_size)
+
+            sys.exit(0 if succeeded else 1)
+        elif arguments['make']:
+            from cards.cards import make
+            from cards.shard import parse_shard
+
+            from cards.reader import get_stdin_data_path
+
+            # a datasource given as '-' is read from stdin
+            data_paths = [get_stdin_data_path(arguments['--base-dir']) if data_path == '-'
+                          else data_path
+                          for data_path in arguments['<datasource>']]
+
+            output_filename = (arguments['--output-file']
+                               if output_stream is None
+                               else 'index.html')
+            header_path = arguments['--include-header']
+            definitions_path = arguments['--definitions']
+            default_card_size_identifier = arguments['--card-size']
+            force_page_breaks = arguments['--force-page-breaks']
+            disable_backs = arguments['--disable-backs']
+            disable_sections = arguments['--disable-page-sections']
+            is_preview = arguments['--preview']
+            clean = arguments['--clean']
+            layout_only = arguments['--layout-only']
+            variants_path = arguments['--variants']
+            shard = None
+
+            if arguments['--shard'] is not None:
+                shard = parse_shard(arguments['--shard'])
+
+                if shard is None:
+                    # building every card instead would make a full copy on every shard
+                    WarningDisplay.invalid_shard_error(arguments['--shard'])
+
+                    sys.exit(1)
+
+            cache_path, cache_size = get_cache_options(arguments)
+
+            context.engine = get_engine_option(arguments)
+            context.should_cache_datasources = arguments['--cache-datasources']
+
+            make(data_paths, header_path, definitions_path,
+                 output_path, output_filename,
+                 force_page_breaks,
+                 disable_backs, disable_sections,
+                 default_card_size_identifier,
+                 is_preview,
+                 clean,
+                 cache_path,
+                 cache_size,
+                 layout_only,
+                 variants_path,
+                 shard,
+                 output_stream,
+                 keep_layout=arguments['--keep-layout'],
+                 context=context)
+        elif arguments['merge']:
+            from cards.cards import merge
+
+            merge(arguments['<shard>'],
+                  arguments['--include-header'],
+                  output_path,
+                  arguments['--output-file'],
+                  arguments['--force-page-breaks'],
+                  arguments['--disable-backs'],
+                  arguments['--disable-page-sections'],
+                  arguments['--card-size'],
+                  arguments['--preview'],
+                  arguments['--clean'],
+                  arguments['--variants'],
+                  keep_layout=arguments['--keep-layout'],
+                  context=context)
+
+        if arguments['--diagnostics'] is not None:
+            save_diagnostics(arguments['--diagnostics'])
+
+        if report is not None:
+            report.save()
+
+        newer_version = update_check.newer_version() if update_check is not None else None
+
+        if newer_version is not None:
+            WarningDisplay.newer_version_available(new_version_identifier=newer_version)
+            # end with empty break
+            print()
 
 
 if __name__ == '__main__':
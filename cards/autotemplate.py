@@ -1,10 +1,19 @@
 # coding=utf-8
 
+"""
+This module provides the automatic template; a template made by analyzing the rows of a
+datasource, used for any card that does not specify a template of its own.
+"""
+
 import csv
+import random
+
+from collections import OrderedDict
 
 from cards.column import Column
 
-from cards.util import most_common
+# the number of rows analyzed in a streamed datasource; any other datasource is analyzed in full
+SAMPLE_SIZE = 10000
 
 
 def is_probably_number(value: str) -> bool:
@@ -55,28 +64,88 @@ def field_type_from_value(value: str) -> str:
     return field_type
 
 
+class FieldTypeCounter:
+    """ Counts the probable field type of the values in each column of a datasource.
+
+        Only a count for each field type is kept per column; never the values themselves.
+    """
+
+    def __init__(self, column_names: list):
+        # only the columns that can occur as fields in a template are counted
+        columns = (Column(column_name) for column_name in OrderedDict.fromkeys(column_names))
+
+        self.column_names = [column.name for column in columns
+                             if not column.is_excluded() and not column.is_special()]
+
+        # each column (in the order it was first given a field type) mapped to the number
+        # of values of each field type (in the order each type was first met)
+        self.counts = OrderedDict()
+
+    def add(self, row) -> None:
+        """ Count the field type of each value in a row (a mapping of column names). """
+
+        for column_name in self.column_names:
+            field_type = field_type_from_value(row[column_name])
+
+            if field_type is not None:
+                counts = self.counts.get(column_name)
+
+                if counts is None:
+                    counts = self.counts[column_name] = OrderedDict()
+
+                counts[field_type] = counts.get(field_type, 0) + 1
+
+    def field_types(self) -> OrderedDict:
+        """ Return each column mapped to its most common field type.
+
+            When several field types are equally common, the type met first is used.
+        """
+
+        return OrderedDict((column_name, max(counts.items(), key=lambda item: item[1])[0])
+                           for column_name, counts in self.counts.items())
+
+
+def sampled(rows, sample_size: int, seed: int=0) -> list:
+    """ Return a uniformly random sample of rows, holding no more than the sample size at once.
+
+        The sample is always the same for the same rows.
+    """
+
+    random_state = random.Random(seed)
+
+    sample = []
+
+    for index, row in enumerate(rows):
+        if index < sample_size:
+            sample.append(row)
+        else:
+            # replace a sampled row with a decreasing probability (see reservoir sampling)
+            replaced_index = random_state.randint(0, index)
+
+            if replaced_index < sample_size:
+                sample[replaced_index] = row
+
+    return sample
+
+
 def template_from_data(data: csv.DictReader) -> str:
     """ Return a template that is fit for the provided data. """
 
-    analysis = {}
+    return template_from_rows(data.fieldnames, data)
 
-    for row in data:
-        for column_name in data.fieldnames:
-            column = Column(column_name)
 
-            if not column.is_excluded() and not column.is_special():
-                field_type = field_type_from_value(row[column.name])
+def template_from_rows(column_names: list, rows, sample_size: int=None) -> str:
+    """ Return a template that is fit for the provided rows (each a mapping of column names).
 
-                if field_type is not None:
-                    l = analysis.get(column.name, [])
-                    l.append(field_type)
+        If a sample size is specified, only a sample of that many rows is analyzed.
+    """
 
-                    analysis[column.name] = l
+    counter = FieldTypeCounter(column_names)
 
-    for field_name, field_types in analysis.items():
-        field_type = most_common(field_types)
+    for row in (rows if sample_size is None else sampled(rows, sample_size)):
+        counter.add(row)
 
-        analysis[field_name] = field_type
+    analysis = counter.field_types()
 
     sort_fields_by_type = True
 
@@ -84,9 +153,9 @@ def template_from_data(data: csv.DictReader) -> str:
         fields = analysis.items()
     else:
         fields = sorted(analysis.items(), key=lambda item: (
-            0 if item[1] is 'number' else (
-                1 if item[1] is 'title' else (
-                    2 if item[1] is 'text' else -1))))
+            0 if item[1] == 'number' else (
+                1 if item[1] == 'title' else (
+                    2 if item[1] == 'text' else -1))))
 
     template = '' if len(analysis) > 0 else None
 
@@ -97,3 +166,53 @@ def template_from_data(data: csv.DictReader) -> str:
         template += field_tag.format(field_type, field)
 
     return template
+
+
+class AutoTemplate:  # pylint: disable=too-few-public-methods
+    """ Provides the automatic template of a datasource.
+
+        The template is only made once a card actually needs it; so for a datasource where every
+        card specifies a template of its own, the rows are never analyzed at all.
+    """
+
+    def __init__(self, datasource, render_cache=None, is_disabled: bool=False):
+        self.datasource = datasource
+        self.render_cache = render_cache
+        self.is_disabled = is_disabled
+
+        self.is_made = False
+        self.template = None
+
+    def key(self) -> str:
+        """ Return the key that addresses the template in a render cache. """
+
+        content_hash, _, _ = self.render_cache.dependency(self.datasource.data_path)
+
+        return self.render_cache.key('auto-template', content_hash, self.sample_size())
+
+    def sample_size(self) -> int:
+        return SAMPLE_SIZE if self.datasource.is_streamed else None
+
+    def content(self) -> str:
+        """ Return the content of the template, if any. """
+
+        if self.is_disabled:
+            return None
+
+        if not self.is_made:
+            entry = self.render_cache.read(self.key()) if self.render_cache is not None else None
+
+            if entry is not None:
+                self.template = entry['template']
+            else:
+                self.template = template_from_rows(
+                    self.datasource.column_names,
+                    (row.data for row in self.datasource.rows()),
+                    sample_size=self.sample_size())
+
+                if self.render_cache is not None:
+                    self.render_cache.put(self.key(), {'template': self.template})
+
+            self.is_made = True
+
+        return self.template
@@ -0,0 +1,183 @@
+# coding=utf-8
+
+"""
+This module provides functions for building many projects at once.
+
+Each project is built in a worker process of its own, so that projects are built concurrently
+and any warnings or errors are kept separate per project. Batch builds are never interactive;
+no questions are asked and no output is opened when done.
+"""
+
+import io
+import os
+import datetime
+
+from datetime import timedelta
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cards.cards import make
+from cards.context import BuildContext
+
+
+class ProjectResult:  # pylint: disable=too-few-public-methods
+    """ Represents the outcome of building a single project. """
+
+    def __init__(self,
+                 project_path: str,
+                 cards_total: int=0,
+                 pages_total: int=0,
+                 error_count: int=0,
+                 warning_count: int=0,
+                 time_in_seconds: float=0,
+                 log: str='',
+                 failure: str=None):
+        self.project_path = project_path
+        self.cards_total = cards_total
+        self.pages_total = pages_total
+        self.error_count = error_count
+        self.warning_count = warning_count
+        self.time_in_seconds = time_in_seconds
+        self.log = log  # everything printed while building the project
+        self.failure = failure  # the reason the build failed, if it did
+
+    def has_failed(self) -> bool:
+        return self.failure is not None or self.error_count > 0
+
+
+def build_project(project_path: str, options: dict) -> ProjectResult:
+    """ Build all datasources found in a project directory. """
+
+    # workers may be reused for several projects, so every project gets a context of its own
+    context = BuildContext(is_verbose=options.get('is_verbose', False), is_interactive=False,
+                           engine=options.get('engine', 'reference'),
+                           should_cache_datasources=options.get('should_cache_datasources', False))
+
+    time_started = datetime.datetime.now()
+
+    definitions_path = os.path.join(project_path, 'definitions.csv')
+
+    result = ProjectResult(project_path)
+
+    if not os.path.isdir(project_path):
+        # otherwise, an output directory would be made for a project that is not there
+        result.failure = 'no project directory was found'
+
+        return result
+
+    log = io.StringIO()
+
+    with redirect_stdout(log):
+        try:
+            variant_results = make(
+                [project_path],
+                definitions_path=(definitions_path
+                                  if os.path.isfile(definitions_path)
+                                  else None),
+                output_path=project_path,
+                output_filename='index.html',
+                is_preview=options.get('is_preview', False),
+                clean_unused_resources=options.get('clean_unused_resources', False),
+                cache_path=options.get('cache_path', None),
+                cache_size=options.get('cache_size', None),
+                open_output=False,
+                context=context)
+        except Exception as error:  # pylint: disable=broad-except
+            # one broken project should not bring down the entire batch
+            result.failure = '{0}: {1}'.format(type(error).__name__, error)
+        else:
+            for _, pages_total, cards_total, _ in variant_results:
+                result.pages_total += pages_total
+                result.cards_total += cards_total
+
+    result.error_count = context.error_count
+    result.warning_count = context.warning_count
+    result.time_in_seconds = (datetime.datetime.now() - time_started) / timedelta(seconds=1)
+    result.log = log.getvalue()
+
+    return result
+
+
+def batch(project_paths: list,
+          jobs: int=None,
+          is_preview: bool=False,
+          clean_unused_resources: bool=False,
+          cache_path: str=None,
+          cache_size: int=None) -> bool:
+    """ Build every project concurrently, using at most the specified number of workers.
+
+        Return True if all projects were built without errors, False otherwise.
+    """
+
+    time_started = datetime.datetime.now()
+
+    options = {
+        'is_verbose': BuildContext.current().is_verbose,
+        'engine': BuildContext.current().engine,
+        'should_cache_datasources': BuildContext.current().should_cache_datasources,
+        'is_preview': is_preview,
+        'clean_unused_resources': clean_unused_resources,
+        'cache_path': cache_path,
+        'cache_size': cache_size
+    }
+
+    print('Building {0} {1} using {2} workers'.format(
+        len(project_paths), 'projects' if len(project_paths) != 1 else 'project',
+        jobs if jobs is not None else os.cpu_count()))
+    print()
+
+    results = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(build_project, project_path, options)
+                   for project_path in project_paths]
+
+        for future in as_completed(futures):
+            result = future.result()
+
+            results.append(result)
+
+            if result.failure is not None:
+                print('[!] {0}: failed ({1})'.format(result.project_path, result.failure))
+            else:
+                print('[{0}] {1}: {2} {3} on {4} {5} ({6} {7}, {8} {9}) in {10:.3f} seconds'
+                      .format('!' if result.has_failed() else '-', result.project_path,
+                              result.cards_total,
+                              'card' if result.cards_total == 1 else 'cards',
+                              result.pages_total,
+                              'page' if result.pages_total == 1 else 'pages',
+                              result.error_count,
+                              'error' if result.error_count == 1 else 'errors',
+                              result.warning_count,
+                              'warning' if result.warning_count == 1 else 'warnings',
+                              result.time_in_seconds))
+
+            if ((BuildContext.current().is_verbose or result.has_failed()) and
+                    len(result.log.strip()) > 0):
+                # show the full output of a project when something went wrong; note that a
+                # project that failed without any output has its reason shown above instead
+                print(result.log)
+
+    failed_results = [result for result in results if result.has_failed()]
+
+    cards_total = sum(result.cards_total for result in results)
+    pages_total = sum(result.pages_total for result in results)
+
+    time_in_seconds = (datetime.datetime.now() - time_started) / timedelta(seconds=1)
+
+    print()
+    print('[{0}] Built {1} of {2} {3} in {4:.3f} seconds ({5} {6}, {7} {8})'.format(
+        '!' if len(failed_results) > 0 else '-',
+        len(results) - len(failed_results), len(results),
+        'projects' if len(results) != 1 else 'project',
+        time_in_seconds,
+        cards_total, 'card' if cards_total == 1 else 'cards',
+        pages_total, 'page' if pages_total == 1 else 'pages'))
+
+    if len(failed_results) > 0:
+        print('\nProjects with errors:\n {0}'.format(
+            [result.project_path for result in failed_results]))
+
+    print()
+
+    return len(failed_results) == 0
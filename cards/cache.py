@@ -0,0 +1,351 @@
+# coding=utf-8
+
+"""
+This module provides a content-addressed, on-disk cache of rendered card fragments.
+
+A cache directory can be shared between several checkouts (and several processes at once);
+each entry is written atomically, and the least recently used entries are evicted whenever
+the directory grows beyond its size limit.
+
+Nothing about where a card comes from goes into its key; only what it is rendered from. Paths
+are made relative to the datasource of the card (both in keys and in entries), and the row index
+and template path of a card only count if the card actually mentions them. So the same card is
+addressed by the same key in any checkout, or after its row has moved.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows; eviction is simply not serialized there
+    fcntl = None
+
+from cards.template import included_paths
+from cards.column import Row, referenced_data_paths
+
+from cards.constants import DateField, TemplateFields
+from cards.version import __version__
+
+# the environment variables that can be used instead of the --cache-dir/--cache-size options
+CACHE_PATH_VARIABLE = 'CARDS_CACHE_DIR'
+CACHE_SIZE_VARIABLE = 'CARDS_CACHE_SIZE'
+
+# the default maximum size of a cache directory (in megabytes)
+DEFAULT_CACHE_SIZE = 256
+
+# bump whenever the layout of a cache entry changes
+CACHE_FORMAT = 2
+
+# the fields that are filled by where a card comes from; a card mentioning any of these is only
+# the same card when it comes from the same place
+CARD_IDENTITY_FIELDS = (TemplateFields.CARD_ROW_INDEX, TemplateFields.CARD_TEMPLATE_PATH)
+
+
+def relative_to_datasource(path: str, data_path: str) -> str:
+    """ Return a path relative to the directory of a datasource, if it is found within it.
+
+        Any other path is returned as it is (see resolved_from_datasource()).
+    """
+
+    directory = os.path.dirname(data_path) if data_path is not None else ''
+
+    if len(directory) > 0 and path.startswith(directory + os.sep):
+        return path[len(directory) + len(os.sep):]
+
+    return path
+
+
+def resolved_from_datasource(path: str, data_path: str) -> str:
+    """ Return a path made relative to the directory of a datasource as it was before. """
+
+    directory = os.path.dirname(data_path) if data_path is not None else ''
+
+    if len(directory) > 0 and not os.path.isabs(path):
+        return os.path.join(directory, path)
+
+    return path
+
+
+def mentions_card_identity(content: str) -> bool:
+    """ Determine whether some content mentions a field filled by where a card comes from. """
+
+    return any(field in content for field in CARD_IDENTITY_FIELDS)
+
+
+def digest(*components) -> str:
+    """ Return a stable hash of any number of JSON-serializable components. """
+
+    serialized_components = json.dumps(components, sort_keys=True, separators=(',', ':'))
+
+    return hashlib.sha256(serialized_components.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """ Represents a directory of rendered card fragments,
+        addressed by the hash of their inputs.
+    """
+
+    def __init__(self, path: str, max_size_in_megabytes: int=None):
+        self.path = path
+        self.max_size = ((max_size_in_megabytes
+                          if max_size_in_megabytes is not None
+                          else DEFAULT_CACHE_SIZE) * 1024 * 1024)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        # the hash of every dependency met during a build, whether it mentions a date field and
+        # whether it mentions a field filled by where a card comes from
+        self.dependencies = {}
+
+        # whether the definitions of the build mention a field filled by where a card comes from
+        self.definitions_mention_card_identity = False
+
+    def key(self, *components) -> str:
+        """ Return the key that addresses an entry made from the specified components. """
+
+        return digest(CACHE_FORMAT, __version__, *components)
+
+    def dependency(self, path: str) -> (str, bool, bool):
+        """ Return the hash of a file that a card depends on, whether it mentions a date and
+            whether it mentions a field filled by where a card comes from.
+        """
+
+        if path not in self.dependencies:
+            try:
+                with open(path, 'rb') as file:
+                    content = file.read()
+            except IOError:
+                self.dependencies[path] = None, False, False
+            else:
+                self.dependencies[path] = (hashlib.sha256(content).hexdigest(),
+                                           b'date' in content,
+                                           any(field.encode('utf-8') in content
+                                               for field in CARD_IDENTITY_FIELDS))
+
+        return self.dependencies[path]
+
+    def record_dependency(self, path: str, content_hash: str) -> None:
+        """ Record the hash of a dependency that can not be read from its path (e.g. stdin).
+
+            What it mentions is not known, so it is assumed that it mentions anything.
+        """
+
+        self.dependencies[path] = content_hash, True, True
+
+    def definitions_key(self, definitions: dict) -> str:
+        """ Return the part of a key that covers a set of definitions (and anything included). """
+
+        dependencies = []
+
+        for content in definitions.values():
+            # definitions are not resolved relative to any path
+            dependencies.extend(included_paths(content))
+
+        mentions_date = (any('date' in content for content in definitions.values()) or
+                         any(self.dependency(path)[1] for path in dependencies))
+
+        self.definitions_mention_card_identity = (
+            any(mentions_card_identity(content) for content in definitions.values()) or
+            any(self.dependency(path)[2] for path in dependencies))
+
+        return self.key(definitions, self.dependency_keys(dependencies),
+                        DateField.TODAY.isoformat() if mentions_date else None)
+
+    def card_key(self,
+                 template_content: str,
+                 template_path: str,
+                 row: Row,
+                 definitions_key: str) -> str:
+        """ Return the key that addresses the fragment rendered from a template and a row. """
+
+        dependencies = included_paths(template_content, template_path)
+
+        contents = [template_content]
+
+        for content in row.data.values():
+            if content is None:
+                continue
+
+            contents.append(content)
+
+            dependencies.extend(included_paths(content, row.data_path))
+
+            # the card depends on any rows it references; in the same datasource, or another
+            dependencies.extend(referenced_data_paths(content, row.data_path))
+
+        # every path is made relative to the datasource; so the key is the same in any checkout
+        dependency_keys = self.dependency_keys(dependencies, relative_to_path=row.data_path)
+
+        # date fields resolve differently from day to day; but only care when they might occur
+        mentions_date = (any('date' in content for content in contents) or
+                         any(self.dependency(path)[1] for path in dependencies))
+
+        # likewise, the row index and template path only matter to a card that mentions them
+        identity = ((row.row_index, template_path)
+                    if (self.definitions_mention_card_identity or
+                        any(mentions_card_identity(content) for content in contents) or
+                        any(self.dependency(path)[2] for path in dependencies))
+                    else None)
+
+        return self.key(template_content,
+                        relative_to_datasource(template_path, row.data_path)
+                        if template_path is not None
+                        else None,
+                        dict(row.data),
+                        definitions_key, dependency_keys, identity,
+                        DateField.TODAY.isoformat() if mentions_date else None)
+
+    def dependency_keys(self, paths: list, relative_to_path: str=None) -> dict:
+        """ Return a mapping of each path to the hash of its file.
+
+            If a datasource is specified, each path is made relative to it, where possible.
+        """
+
+        return {relative_to_datasource(path, relative_to_path): self.dependency(path)[0]
+                for path in paths}
+
+    def entry_path(self, key: str) -> str:
+        """ Return the path of the file holding the entry for a key. """
+
+        # spread entries over a number of sub-directories to keep directory listings short
+        return os.path.join(self.path, key[:2], key)
+
+    def read(self, key: str) -> dict:
+        """ Return the entry stored for a key, if any, without counting it as a hit or miss. """
+
+        path = self.entry_path(key)
+
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, ValueError):
+            # either not cached, or evicted/written by another process in the meantime;
+            # in any case, treat it as a miss
+            return None
+
+        try:
+            # mark the entry as recently used
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return entry
+
+    def get(self, key: str) -> dict:
+        """ Return the entry stored for a key, if any. """
+
+        entry = self.read(key)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """ Store an entry for a key. """
+
+        directory = os.path.dirname(self.entry_path(key))
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+
+            # write to a temporary file first and then move it in place, so that
+            # any other process reading the entry never sees a partially written file
+            handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+            with os.fdopen(handle, 'w') as entry_file:
+                json.dump(entry, entry_file, separators=(',', ':'))
+
+            os.replace(temporary_path, self.entry_path(key))
+        except OSError:
+            # a cache is a nice-to-have; never fail a build because of it
+            return
+
+        self.stores += 1
+
+    def evict(self) -> int:
+        """ Remove the least recently used entries until the cache fits within its size limit.
+
+            Return the size of the cache after eviction (in bytes).
+        """
+
+        if not os.path.isdir(self.path):
+            return 0
+
+        lock_path = os.path.join(self.path, '.lock')
+
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # another process is already evicting; leave it to that one
+                    return self.size()
+
+            entries = []
+            size = 0
+
+            for directory in os.scandir(self.path):
+                if not directory.is_dir():
+                    continue
+
+                for entry in os.scandir(directory.path):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+                    size += stat.st_size
+
+            # oldest first
+            entries.sort()
+
+            for _, entry_size, entry_path in entries:
+                if size <= self.max_size:
+                    break
+
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    # removed by another process, or still in use
+                    continue
+
+                size -= entry_size
+
+                self.evictions += 1
+
+        return size
+
+    def size(self) -> int:
+        """ Return the total size of all entries in the cache (in bytes). """
+
+        size = 0
+
+        if os.path.isdir(self.path):
+            for directory in os.scandir(self.path):
+                if directory.is_dir():
+                    for entry in os.scandir(directory.path):
+                        try:
+                            size += entry.stat().st_size
+                        except OSError:
+                            continue
+
+        return size
+
+    def hit_rate(self) -> float:
+        """ Return the ratio of lookups that were served from the cache. """
+
+        lookups = self.hits + self.misses
+
+        return self.hits / lookups if lookups > 0 else 0
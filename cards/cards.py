@@ -11,23 +11,20 @@ License: MIT (see LICENSE)
 
 import os
 import csv
-import math
 import shutil
 import datetime
 
 from datetime import timedelta
 
 from cards.template import (
-    Template, fill_each, fill_card, fill_index, fill_image_fields, fill_definitions,
-    template_from_path, strip_styles
+    Template, TemplateRenderData, IndexWriter, fill_index, fill_image_fields,
+    fill_definitions, template_from_path, strip_styles, included_paths
 )
 
-from cards.templatefield import TemplateField
-
-from cards.autotemplate import template_from_data
+from cards.autotemplate import AutoTemplate
 
 from cards.column import (
-    Row, get_invalid_columns, size_identifier_from_columns
+    Row, get_invalid_columns, referenced_data_paths
 )
 
 from cards.resource import (
@@ -35,14 +32,37 @@ from cards.resource import (
     transformed_image_paths, copy_images_to_output_directory
 )
 
+from cards.cache import RenderCache, relative_to_datasource, resolved_from_datasource
+from cards.datasource import (
+    DatasourceIndex, load_datasources, get_datasource_cache_directory
+)
+from cards.reader import is_discoverable_datasource, is_stdin_data_path
+from cards.engine import ReferenceEngine, create_engine
+
+from cards.shard import (
+    is_in_shard, get_shard_path, find_shard_paths, merge_shards
+)
+
+from cards.layout import (
+    ResolvedCards, ResolvedDatasource, ResolvedCard, PageLayout,
+    layout_pages, get_resolved_cards_path
+)
+
+from cards.variant import BuildVariant, get_variants
+
 from cards.constants import Columns, TemplateFields, CardSizes
 from cards.warning import WarningDisplay, WarningContext
+from cards.context import BuildContext, within_build_context
+from cards.profile import Phases, phase, span
 
 from cards.util import (
-    FileWrapper, find_file_path, open_path, lower_first_row, terminal_supports_color,
-    copy_file_if_necessary, create_directories_if_necessary, directory_size, pretty_size
+    FileWrapper, find_file_path, open_path, terminal_supports_color,
+    copy_file_if_necessary, create_directories_if_necessary, pretty_size
 )
 
+# the name of the output file when written to stdout instead (see make_output())
+STDOUT_NAME = '<stdout>'
+
 
 def get_definitions_from_file(path: str) -> dict:
     """ Return a dict with all definitions found in file. """
@@ -67,110 +87,118 @@ def get_definitions_from_file(path: str) -> dict:
     return definitions
 
 
-def get_section_name(contexts: list) -> str:
-    section_name = ''
-
-    for context in contexts:
-        if len(section_name) > 0:
-            section_name += ', '
-
-        section_name += os.path.splitext(context)[0]
-
-    return section_name
+def get_template(template_path: str) -> (str, list):
+    template, template_not_found = Template.from_path(template_path)
 
+    if template_not_found:
+        print('could not open template \'{0}\''.format(template_path))
 
-def get_section(name: str,
-                section_template: str,
-                is_card_backs: bool=False,
-                is_filler: bool=False) -> str:
-    """ Populate a section with a name. """
+    image_paths = fill_image_fields(template)
+    image_paths = transformed_image_paths(image_paths, template.path)
 
-    template = Template(section_template)
+    return template.content, image_paths
 
-    section_class = 'ui-section do-not-print'
 
-    if is_card_backs:
-        section_class = '{0} {1}'.format(section_class, 'page-backs')
+def get_card_fragment(template_content: str,
+                      template_path: str,
+                      row: Row,
+                      definitions: dict,
+                      render_cache: RenderCache=None,
+                      definitions_key: str=None,
+                      engine=None) -> (str, TemplateRenderData):
+    """ Return the fragment of a card (i.e. without index fields populated) and its render data.
 
-    if is_filler:
-        section_class = '{0} {1}'.format(section_class, 'filler')
+        If a render cache is provided, the fragment is looked up there first.
 
-    fill_each('_section_class', section_class, template)
-    fill_each('_datasource_name', name, template)
+        The fragment is rendered by the specified engine; the reference engine, if none is.
+    """
 
-    return template.content + '\n'
+    key = None
 
+    if render_cache is not None:
+        key = render_cache.card_key(template_content, template_path, row, definitions_key)
 
-def get_page(page_number: int,
-             cards: str,
-             page_template: str,
-             section_template: str,
-             contexts: list,
-             is_card_backs: bool=False,
-             is_filler: bool=False,
-             exclude_section: bool=False) -> str:
-    """ Populate a page with cards. """
+        entry = render_cache.get(key)
 
-    template = Template(page_template)
+        if entry is not None:
+            # paths are kept relative to the datasource (see RenderCache.card_key())
+            return entry['content'], TemplateRenderData(
+                image_paths={resolved_from_datasource(image_path, row.data_path)
+                             for image_path in entry['image_paths']},
+                unknown_fields=set(entry['unknown_fields']),
+                unused_fields=set(entry['unused_fields']),
+                referenced_definitions=set(entry['referenced_definitions']),
+                embedded_styles={resolved_from_datasource(style_path, row.data_path): style
+                                 for style_path, style in entry['embedded_styles'].items()})
 
-    page_class = 'page'
+    context = BuildContext.current()
 
-    if is_card_backs:
-        page_class = '{0} {1}'.format(page_class, 'page-backs')
+    raised_count = context.raised_count
 
-    if is_filler:
-        page_class = '{0} {1}'.format(page_class, 'filler')
+    if engine is None:
+        engine = ReferenceEngine()
 
-    fill_each('_page_class', page_class, template)
-    fill_each(TemplateFields.PAGE_NUMBER, str(page_number), template)
-    fill_each(TemplateFields.CARDS, cards, template, indenting=True)
+    content, render_data = engine.fill_card_fragment(
+        Template(template_content, template_path), row, definitions)
 
-    page = template.content + '\n'
+    # only store fragments that rendered cleanly; any warning raised while rendering
+    # would otherwise go missing whenever the fragment is served from the cache
+    if key is not None and context.raised_count == raised_count:
+        render_cache.put(key, {
+            'content': content,
+            'image_paths': [relative_to_datasource(image_path, row.data_path)
+                            for image_path in render_data.image_paths],
+            'unknown_fields': list(render_data.unknown_fields),
+            'unused_fields': list(render_data.unused_fields),
+            'referenced_definitions': list(render_data.referenced_definitions),
+            'embedded_styles': {relative_to_datasource(style_path, row.data_path): style
+                                for style_path, style in render_data.embedded_styles.items()}
+        })
 
-    if not exclude_section and contexts is not None:
-        section_name = get_section_name(contexts)
+    return content, render_data
 
-        if is_card_backs:
-            section_name = '{0} - backs'.format(section_name)
 
-        section = get_section(section_name, section_template, is_card_backs, is_filler)
+def get_base_path() -> str:
+    """ Return the path of the actual location of the current script; i.e. the path from
+        which we can reach included project resources like base templates, icons and so on.
+    """
 
-        page = section + page
+    return os.path.dirname(os.path.realpath(__file__))
 
-    return page
 
+def get_base_template_path(name: str) -> str:
+    return os.path.join(get_base_path(), 'templates/base/{0}.html'.format(name))
 
-def get_sized_card(card_template: str,
-                   size_class: str,
-                   content: str) -> str:
-    """ Populate and return a card in a given size with the specified content. """
 
-    template = Template(card_template)
+# base templates never change while running, so each is only loaded once, however many builds
+# are made; mapped by name to their content (with any image fields filled) and image paths
+BASE_TEMPLATES = {}
 
-    fill_each(TemplateFields.CARD_SIZE, size_class, template)
-    fill_each(TemplateFields.CARD_CONTENT, content, template, indenting=True)
+# mapped by name to their content, as is
+ERROR_TEMPLATES = {}
 
-    return template.content + '\n'
 
+def get_base_template(name: str) -> (str, list):
+    """ Return the content of a base template (e.g. 'card') with any image fields filled,
+        and the paths of those images.
+    """
 
-def get_template(template_path: str) -> (str, list):
-    template, template_not_found = Template.from_path(template_path)
+    if name not in BASE_TEMPLATES:
+        BASE_TEMPLATES[name] = get_template(get_base_template_path(name))
 
-    if template_not_found:
-        print('could not open template \'{0}\''.format(template_path))
+    content, image_paths = BASE_TEMPLATES[name]
 
-    image_paths = fill_image_fields(template)
-    image_paths = transformed_image_paths(image_paths, template.path)
+    return content, list(image_paths)
 
-    return template.content, image_paths
 
+def get_error_template(name: str) -> str:
+    """ Return the content of an error template (e.g. 'not_provided'). """
 
-def get_base_path() -> str:
-    """ Return the path of the actual location of the current script; i.e. the path from
-        which we can reach included project resources like base templates, icons and so on.
-    """
+    if name not in ERROR_TEMPLATES:
+        with open(get_base_template_path('error/' + name)) as error_template:
+            ERROR_TEMPLATES[name] = error_template.read()
 
-    return os.path.dirname(os.path.realpath(__file__))
+    return ERROR_TEMPLATES[name]
 
 
 def make_empty_project(in_path: str,
@@ -271,83 +299,130 @@ def discover_datasources(in_directory: str, except_datasource_name: str=None) ->
     """ Return a list of paths to any datasources in a directory. """
 
     return [os.path.join(in_directory, datasource) for datasource in os.listdir(in_directory)
-            if datasource.endswith('.csv') and
+            if is_discoverable_datasource(datasource) and
             (except_datasource_name is None or
              (except_datasource_name is not None and datasource != except_datasource_name))]
 
 
-def make(data_paths: list,
-         header_path: str=None,
-         definitions_path: str=None,
-         output_path: str=None,
-         output_filename: str=None,
-         force_page_breaks: bool=False,
-         should_disable_backs: bool=False,
-         should_disable_page_sections: bool=False,
-         default_card_size_identifier: str='standard',
-         is_preview: bool=False,
-         clean_unused_resources: bool=False):
-    """ Build cards for all specified datasources. """
+def get_datasources_contain_backs(datasources: list) -> bool:
+    """ Determine whether any datasource contains specifications for card back templates. """
 
-    time_started_make = datetime.datetime.now()
+    for datasource in datasources:
+        if Columns.TEMPLATE_BACK in datasource.column_names:
+            # we don't need to continue; we figured out that at least one datasource
+            # should render card backs
+            return True
 
-    datasource_count = len(data_paths)
+    return False
 
-    exclude_datasource_named = (os.path.basename(definitions_path)
-                                if definitions_path is not None
-                                else None)
 
-    if datasource_count == 0:
-        # attempt finding any datasources in current working directory
-        data_paths = discover_datasources(in_directory='.',
-                                          except_datasource_name=exclude_datasource_named)
+def count_cards(data_paths: list,
+                datasources: dict,
+                is_preview: bool=False,
+                shard: tuple=None) -> (int, bool):
+    """ Return the number of cards to be resolved from all datasources, and whether that number
+        is only an estimate.
 
-        datasource_count = len(data_paths)
-    elif datasource_count > 0:
-        # determine whether any datasources point to a directory
-        for i, datasource_path in enumerate(data_paths):
-            if os.path.isdir(datasource_path):
-                # discover any datasources within the specified directory
-                discovered_datasource_paths = discover_datasources(
-                    datasource_path, except_datasource_name=exclude_datasource_named)
-                # replace the datasource directory with any datasources discovered within
-                data_paths = data_paths[:i] + discovered_datasource_paths + data_paths[i + 1:]
+        Rows of datasources that are read in full are counted exactly, as they would be resolved;
+        rows of streamed datasources can not be read ahead, so each of those is estimated to be
+        a single card.
+    """
 
-        datasource_count = len(data_paths)
+    cards_total = 0
+    is_estimate = False
 
-    if datasource_count > 0:
-        data_path_names, duplicates_count = get_data_path_names(data_paths)
+    # incremented for each row in any datasource, except excluded rows (see resolve_cards())
+    row_sequence = 0
 
-        duplicates = (' ({0} {1})'.format(
-            duplicates_count, 'duplicate' if duplicates_count == 1 else 'duplicates')
-                      if duplicates_count > 0 else '')
+    for data_path in data_paths:
+        datasource = datasources.get(data_path)
 
-        print('Generating cards from {0} {1}{2}:\n {3}'.format(
-            datasource_count, 'datasources' if datasource_count > 1 else 'datasource', duplicates,
-            data_path_names))
-        print()
-    else:
-        WarningDisplay.no_datasources()
+        if datasource is None or len(get_invalid_columns(datasource.column_names)) > 0:
+            # no cards are resolved from this datasource
+            continue
+
+        if datasource.is_streamed:
+            rows = datasource.estimated_rows()
+
+            # any rows that follow can not be put in their shards exactly either
+            row_sequence += rows
+
+            cards_total += rows // shard[1] if shard is not None else rows
+            is_estimate = True
+
+            continue
+
+        for row in datasource.rows():
+            row_sequence += 1
+
+            if ((shard is not None and not is_in_shard(row_sequence, shard)) or
+                    row.is_prototype()):
+                continue
+
+            count, _ = row.determine_count()
+
+            cards_total += min(count, 1) if is_preview else count
+
+    return cards_total, is_estimate
 
-        # just quit- there's nothing to do
-        return
+
+def resolve_cards(data_paths: list,
+                  definitions: dict,
+                  definitions_path: str=None,
+                  should_disable_backs: bool=False,
+                  is_preview: bool=False,
+                  render_cache: RenderCache=None,
+                  shard: tuple=None,
+                  page_layout: PageLayout=None) -> ResolvedCards:
+    """ Resolve every card in all specified datasources, ready to be laid out on pages.
+
+        If a shard is specified (as an index and a count), only the cards of that shard
+        are resolved.
+
+        If a page layout is specified, every card is laid out as soon as it is resolved, instead
+        of being kept; and every datasource is streamed, so that the rows are not kept either.
+    """
 
     disable_auto_templating = False
 
-    if definitions_path is None:
-        # no definitions file has been explicitly specified, so try looking for it automatically
-        found, potential_definitions_path = find_file_path('definitions.csv', data_paths)
+    resolved_cards = ResolvedCards()
 
-        if found and potential_definitions_path is not None:
-            definitions_path = potential_definitions_path
+    resolved_cards.data_paths = list(data_paths)
+    resolved_cards.definitions_path = definitions_path
+    resolved_cards.is_preview = is_preview
+    resolved_cards.backs_rendered = not should_disable_backs
 
-            WarningDisplay.using_automatically_found_definitions_info(
-                definitions_path)
+    # parsed datasources are kept with the rendered cards, if those are cached too
+    datasource_cache_directory = (
+        get_datasource_cache_directory(render_cache.path if render_cache is not None else None)
+        if BuildContext.current().should_cache_datasources
+        else None)
 
-    definitions = get_definitions_from_file(definitions_path)
+    # load every datasource only once; the loaded datasources are shared by everything below
+    datasources = load_datasources(data_paths,
+                                   streaming=True if page_layout is not None else None,
+                                   cache_directory=datasource_cache_directory)
 
-    if is_preview:
-        WarningDisplay.preview_enabled_info()
+    # any row can reference rows in any datasource; including datasources that are not built
+    datasource_index = DatasourceIndex(datasources, cache_directory=datasource_cache_directory)
+
+    if render_cache is not None:
+        for data_path, datasource in datasources.items():
+            if datasource.content_hash is not None:
+                # e.g. stdin; rows referenced from cards can not be read again through the path
+                render_cache.record_dependency(data_path, datasource.content_hash)
+
+    # if pages should render card backs, we need to figure out if any datasources
+    # actually *do* contain specifications for card back templates
+    # if any do, we need to know this beforehand to handle the synchronization issue
+    # with mixing non-back and back datasources for double-sided printing
+    resolved_cards.contains_backs = get_datasources_contain_backs(datasources.values())
+
+    if page_layout is not None:
+        page_layout.keep_pages_in_sync(resolved_cards.contains_backs)
+
+    # every file that the resolved cards depend on
+    dependencies = set([definitions_path] + list(data_paths))
 
     # dict of all image paths discovered for each context during card generation
     context_image_paths = {}
@@ -376,147 +451,63 @@ def make(data_paths: list,
         # and any complex/partially defined image fields will not be resolved at this point)
         definitions[definition] = template.content
 
+        dependencies.update(included_paths(content))
+
+    definitions_key = (render_cache.definitions_key(definitions)
+                       if render_cache is not None
+                       else None)
+
+    # the engine that every card is rendered by; definitions must not change from here on
+    engine = create_engine(BuildContext.current().engine)
+
     if definitions_path is not None:
         image_paths_from_definitions = transformed_image_paths(image_paths_from_definitions,
                                                                definitions_path)
 
         context_image_paths[definitions_path] = list(set(image_paths_from_definitions))
 
-    base_path = get_base_path()
-
-    card_template_path = os.path.join(base_path, 'templates/base/card.html')
-    card, filled_image_paths = get_template(card_template_path)
-
-    if len(filled_image_paths) > 0:
-        context_image_paths[card_template_path] = list(set(filled_image_paths))
-
-    page_template_path = os.path.join(base_path, 'templates/base/page.html')
-    page, filled_image_paths = get_template(page_template_path)
-
-    if len(filled_image_paths) > 0:
-        context_image_paths[page_template_path] = list(set(filled_image_paths))
-
-    page_filler_template_path = os.path.join(base_path, 'templates/base/page_filler.html')
-    page_filler, filled_image_paths = get_template(page_filler_template_path)
-
-    if len(filled_image_paths) > 0:
-        context_image_paths[page_filler_template_path] = list(set(filled_image_paths))
-
-    section_template_path = os.path.join(base_path, 'templates/base/section.html')
-    section, filled_image_paths = get_template(section_template_path)
-
-    if len(filled_image_paths) > 0:
-        context_image_paths[section_template_path] = list(set(filled_image_paths))
-
-    index_template_path = os.path.join(base_path, 'templates/base/index.html')
-    index, filled_image_paths = get_template(index_template_path)
-
-    if len(filled_image_paths) > 0:
-        context_image_paths[index_template_path] = list(set(filled_image_paths))
-
-    not_found_template_path = os.path.join(base_path, 'templates/base/error/could_not_open.html')
-
-    with open(not_found_template_path) as error_template:
-        template_not_opened = error_template.read()
-
-    no_front_template_path = os.path.join(base_path, 'templates/base/error/not_provided.html')
-
-    with open(no_front_template_path) as error_template:
-        template_not_provided = error_template.read()
-
-    no_back_template_path = os.path.join(base_path, 'templates/base/error/back_not_provided.html')
-
-    with open(no_back_template_path) as error_template:
-        template_back_not_provided = error_template.read()
-
-    default_card_size = CardSizes.get_card_size(default_card_size_identifier)
-
-    if default_card_size is None:
-        default_card_size = CardSizes.get_default_card_size()
-
-        WarningDisplay.bad_card_size(
-            WarningContext(), size_identifier=default_card_size_identifier)
-
-    # buffer that will contain at most MAX_CARDS_PER_PAGE amount of cards
-    cards = ''
-    # buffer that will contain at most MAX_CARDS_PER_PAGE amount of card backs
-    backs = ''
-    # buffer of a row of backs that is filled in reverse to support double-sided printing
-    backs_row = ''
-    # buffer for all generated pages
-    pages = ''
+    template_not_opened = get_error_template('could_not_open')
+    template_not_provided = get_error_template('not_provided')
+    template_back_not_provided = get_error_template('back_not_provided')
 
     embedded_styles = {}
+    # the position (i.e. the row sequence) at which each embedded style was first met
+    embedded_style_positions = {}
 
-    # incremented each time a card is generated, but reset to 0 for each page
-    cards_on_page = 0
-    # incremented each time a card is generated
-    cards_total = 0
-    # incremented each time a page is generated
-    pages_total = 0
-    # incremented for each unique card (i.e. not incremented for copies/duplicates)
-    cards_total_unique = 0
-    # holds total card counts per datasource
-    cards_total_per_context = {}
-
-    previous_card_size = None
-
-    page_size = CardSizes.get_page_size()
-
-    pages_contain_backs = False
-
-    if not should_disable_backs:
-        # if pages should render card backs, we need to figure out if any datasources
-        # actually *do* contain specifications for card back templates
-        # if any do, we need to know this beforehand to handle the synchronization issue
-        # with mixing non-back and back datasources for double-sided printing
-        for data_path in data_paths:
-            if not os.path.isfile(data_path):
-                continue
-
-            with open(data_path) as data_file:
-                # read the first line which should contain the column names
-                header_line = data_file.readline()
-
-                if Columns.TEMPLATE_BACK in header_line:
-                    pages_contain_backs = True
-                    # we don't need to continue; we figured out that at least one datasource
-                    # should render card backs
-                    break
+    # incremented for each row in any datasource, except excluded rows
+    row_sequence = 0
 
-    previous_context = None
-    contexts_per_page = []
+    progress = BuildContext.current().progress
 
-    disable_backs = should_disable_backs
+    if progress is not None:
+        progress.begin(*count_cards(data_paths, datasources, is_preview, shard))
 
-    for data_path_index, data_path in enumerate(data_paths):
+    for data_path in data_paths:
         # define the context as the base filename of the current data- useful when troubleshooting
         context = os.path.basename(data_path)
 
-        card_size = default_card_size
-
-        image_paths_from_datasource = []
+        # note that duplicate image paths are not kept, since that would just
+        # cause unnecessary copy operations
+        image_paths_from_datasource = set()
 
         # determine whether this path leads to anything
-        if not os.path.isfile(data_path):
+        if not os.path.isfile(data_path) and not is_stdin_data_path(data_path):
             # if it doesn't, warn that the path to the datasource is not right
             WarningDisplay.bad_data_path_error(WarningContext(context), data_path)
             # and skip this datasource
             continue
 
-        cards_total_per_context[context] = 0
-
-        with open(data_path) as data_file_raw:
-            # wrap the file stream to retain access to unparsed lines
-            data_file = FileWrapper(data_file_raw)
-            # read the csv as a dict, so that we can access each column by name
-            data = csv.DictReader(lower_first_row(data_file))
+        datasource = datasources.get(data_path)
 
-            # make a list of all column names as they are (but stripped of excess whitespace)
-            column_names = [column_name.strip() for column_name in data.fieldnames]
+        if datasource is None:
+            # the datasource could not be read; this has already been warned about
+            continue
 
-            # then determine the size identifier (if any; e.g. '@template:jumbo')
-            size_identifier, stripped_column_names = size_identifier_from_columns(column_names)
+        with span(context, 'datasource', data_path=data_path):
+            # the column names as they are (but stripped of excess whitespace); note that any
+            # size identifier (e.g. '@template:jumbo') has been isolated from the column names
+            stripped_column_names = datasource.column_names
+            size_identifier = datasource.size_identifier
 
             # determine whether this datasource contains invalid columns
             invalid_column_names = get_invalid_columns(stripped_column_names)
@@ -528,114 +519,27 @@ def make(data_paths: list,
 
                 continue
 
-            # replace the column keys with stripped/parsed representations
-            # (e.g. '@template:jumbo' becomes just '@template')
-            data.fieldnames = stripped_column_names
-
-            if size_identifier is not None:
-                new_card_size = CardSizes.get_card_size(size_identifier)
-
-                if new_card_size is not None:
-                    card_size = new_card_size
-                else:
-                    WarningDisplay.bad_card_size(
-                        WarningContext(context), size_identifier)
-
-            if card_size != previous_card_size:
-                if cards_on_page > 0:
-                    # card sizing is different for this datasource, so any remaining cards
-                    # must be added to a new page at this point
-                    pages += get_page(pages_total + 1, cards, page, section, contexts_per_page,
-                                      exclude_section=should_disable_page_sections)
-                    pages_total += 1
-
-                    if not disable_backs:
-                        # using the last value of cards_per_row
-                        cards_on_last_row = cards_on_page % cards_per_row
-
-                        if cards_on_last_row is not 0:
-                            # less than MAX_CARDS_PER_ROW cards were added to the current line, so
-                            # we have to add additional blank filler cards to ensure correct layout
-                            remaining_backs = cards_per_row - cards_on_last_row
-
-                            while remaining_backs > 0:
-                                # keep adding empty filler card backs until we've filled a row
-                                backs_row = empty_back + backs_row
-
-                                remaining_backs -= 1
-
-                        backs += backs_row
-
-                        backs_row = ''
-
-                        # fill another page with the backs
-                        pages += get_page(pages_total + 1, backs, page, section, contexts_per_page,
-                                          is_card_backs=True,
-                                          exclude_section=should_disable_page_sections)
-                        pages_total += 1
+            if (size_identifier is not None and
+                    CardSizes.get_card_size(size_identifier) is None):
+                WarningDisplay.bad_card_size(
+                    WarningContext(context), size_identifier)
 
-                        backs = ''
-
-                    if pages_contain_backs and disable_backs:
-                        # we know some pages with backs have been added, and we know that this
-                        # datasource does not contain any card backs, so in order to keep
-                        # two-sided printing in sync, we need to add a filler page
-
-                        # the filler page counts as a page full of backs, but contains content
-                        # that will not be printed (not even a footer)
-                        pages += get_page(pages_total + 1, '', page_filler, section, contexts_per_page,
-                                          is_card_backs=True, is_filler=True,
-                                          exclude_section=should_disable_page_sections)
-                        pages_total += 1
-
-                        WarningDisplay.datasource_contains_filler_pages(
-                            WarningContext(previous_context))
-
-                    # reset to prepare for the next page
-                    cards_on_page = 0
-                    cards = ''
-
-                # we're finished with the current datasource, and we'll be starting a new page
-                # so we reset any saved contexts
-                contexts_per_page = []
-
-            contexts_per_page.append(context)
+                # use the default card size instead
+                size_identifier = None
 
             disable_backs = should_disable_backs
-            contains_filler_pages = False
-
-            card_width, card_height = card_size.size_in_inches
-            page_width, page_height = page_size.size_in_inches
 
-            cards_per_row = math.floor(page_width / card_width)
-            cards_per_column = math.floor(page_height / card_height)
+            # get a fitting template by analyzing the content of the data; but only once
+            # (and if) any card actually needs it
+            default_template = AutoTemplate(
+                datasource, render_cache, is_disabled=disable_auto_templating)
 
-            max_cards_per_page = cards_per_column * cards_per_row
-
-            if disable_auto_templating:
-                default_template_content = None
-            else:
-                # get a fitting template by analyzing the content of the data
-                default_template_content = template_from_data(data)
-
-                # reset the iterator
-                # (note how this is done directly on the file stream; i.e. not on the wrapper)
-                data_file_raw.seek(0)
-
-                # and start over
-                data = csv.DictReader(
-                    lower_first_row(data_file),
-                    fieldnames=stripped_column_names)
-
-                # setting fieldnames explicitly causes the first row
-                # to be treated as data, so skip it
-                next(data)
-
-            if default_template_content is None and Columns.TEMPLATE not in data.fieldnames:
+            if (Columns.TEMPLATE not in stripped_column_names and
+                    default_template.content() is None):
                 WarningDisplay.missing_default_template(
                     WarningContext(context))
 
-            if not disable_backs and Columns.TEMPLATE_BACK in data.fieldnames:
+            if not disable_backs and Columns.TEMPLATE_BACK in stripped_column_names:
                 WarningDisplay.assume_backs_info(
                     WarningContext(context))
             else:
@@ -646,14 +550,15 @@ def make(data_paths: list,
                     # so disable them completely
                     disable_backs = True
 
-            if not disable_backs:
-                # empty backs may be necessary to fill in empty spots on a page to ensure
-                # that the layout remains correct
-                # note that we're using a completely empty template, except for the size class field
-                empty_back = get_sized_card(
-                    '<div class="card {0}"></div>'.format(
-                        str(TemplateField(name=TemplateFields.CARD_SIZE))),
-                    size_class=card_size.style, content='')
+            resolved_datasource = ResolvedDatasource(
+                context, data_path, size_identifier, has_backs=not disable_backs)
+
+            if page_layout is not None:
+                if page_layout.datasource is not None:
+                    # the previous datasource was not the last one after all
+                    page_layout.end_datasource()
+
+                page_layout.begin_datasource(resolved_datasource)
 
             ambiguous_references = determine_ambiguous_references(
                 set(stripped_column_names),
@@ -666,20 +571,25 @@ def make(data_paths: list,
             previous_template_path = None
             previous_template_path_back = None
 
-            row_index = 1
+            # note that excluded rows are not among the rows of the datasource
+            for row in datasource.rows():
+                row_index = row.row_index
+                row_data = row.data
 
-            for row_data in data:
-                # since the column names counts as a row, and most editors
-                # do not use a zero-based row index, the first row == 2
-                row_index += 1
+                row_sequence += 1
 
-                if Row.is_excluded(data_file.raw_line):
-                    # this row should be ignored - so skip and continue
-                    # note that we still need to increment the row_index;
-                    # otherwise row references will be offset incorrectly
-                    continue
+                if shard is not None and not is_in_shard(row_sequence, shard):
+                    # this card is resolved by another shard, but following rows
+                    # might still point to its template paths
+                    previous_template_path = previous_or_current_path(
+                        row_data.get(Columns.TEMPLATE, None), previous_template_path)
+
+                    if not disable_backs:
+                        previous_template_path_back = previous_or_current_path(
+                            row_data.get(Columns.TEMPLATE_BACK, None),
+                            previous_template_path_back)
 
-                row = Row(row_data, data_path, row_index)
+                    continue
 
                 if row.is_prototype():
                     # prototype rows should be skipped, but since the skip is intentional,
@@ -728,11 +638,21 @@ def make(data_paths: list,
                     # note, however, that we *do* want to register the template paths
                     continue
 
+                for content in row_data.values():
+                    if content is not None and ('include' in content or 'inline' in content):
+                        dependencies.update(included_paths(content, data_path))
+
+                    if content is not None and '#' in content:
+                        dependencies.update(referenced_data_paths(content, data_path))
+
                 resolved_template_path = None
 
                 if template_path is not None and len(template_path) > 0:
-                    template_content, not_found, resolved_template_path = template_from_path(
-                        template_path, relative_to_path=data_path)
+                    with phase(Phases.TEMPLATES):
+                        template_content, not_found, resolved_template_path = template_from_path(
+                            template_path, relative_to_path=data_path)
+
+                    dependencies.add(resolved_template_path)
 
                     if not_found:
                         template_content = template_not_opened
@@ -741,13 +661,13 @@ def make(data_paths: list,
                             WarningContext(context, row_index),
                             resolved_template_path, cards_affected=count)
                     elif len(template_content) == 0:
-                        template_content = default_template_content
+                        template_content = default_template.content()
 
                         WarningDisplay.empty_template(
                             WarningContext(context, row_index),
                             resolved_template_path, cards_affected=count)
                 else:
-                    template_content = default_template_content
+                    template_content = default_template.content()
 
                     if template_content is not None:
                         WarningDisplay.using_auto_template(
@@ -765,16 +685,22 @@ def make(data_paths: list,
                 template_front = Template(template_content, template_path)
 
                 embedded_styles[template_front.path] = strip_styles(template_front)
+                embedded_style_positions.setdefault(template_front.path, row_sequence)
 
                 stripped_template_content = template_front.content
                 resolved_template_path_back = None
 
+                dependencies.update(included_paths(template_content, resolved_template_path))
+
                 if not disable_backs:
                     template_back_content = None
 
                     if template_path_back is not None and len(template_path_back) > 0:
-                        template_back_content, not_found, resolved_template_path_back = template_from_path(
-                            template_path_back, relative_to_path=data_path)
+                        with phase(Phases.TEMPLATES):
+                            template_back_content, not_found, resolved_template_path_back = (
+                                template_from_path(template_path_back, relative_to_path=data_path))
+
+                        dependencies.add(resolved_template_path_back)
 
                         if not_found:
                             template_back_content = template_not_opened
@@ -795,321 +721,859 @@ def make(data_paths: list,
                     template_back = Template(template_back_content, template_path_back)
 
                     embedded_styles[template_back.path] = strip_styles(template_back)
+                    embedded_style_positions.setdefault(template_back.path, row_sequence)
 
                     stripped_template_back_content = template_back.content
 
-                # this is also the shared index for any instance of this card
-                cards_total_unique += 1
+                    dependencies.update(
+                        included_paths(template_back_content, resolved_template_path_back))
+
+                # every copy of this card renders identically, except for index fields,
+                # so render the card only once and leave the index fields for the layout
+                with phase(Phases.RENDER_FRONT), span(
+                        '{0}:#{1}'.format(context, row_index), 'card',
+                        row='{0}:#{1}'.format(context, row_index), side='front',
+                        context=context, row_index=row_index,
+                        template_path=resolved_template_path):
+                    front_fragment, render_data = get_card_fragment(
+                        stripped_template_content, resolved_template_path,
+                        row.front_row(), definitions,
+                        render_cache, definitions_key, engine)
+
+                if (front_fragment is not template_not_provided
+                        and front_fragment is not template_not_opened):
+                    if len(render_data.unused_fields) > 0:
+                        WarningDisplay.missing_fields_in_template(
+                            WarningContext(context, row_index),
+                            list(render_data.unused_fields),
+                            cards_affected=count)
+
+                    if len(render_data.unknown_fields) > 0:
+                        WarningDisplay.unknown_fields_in_template(
+                            WarningContext(context, row_index),
+                            list(render_data.unknown_fields),
+                            template_path,
+                            cards_affected=count)
+
+                all_referenced_definitions |= render_data.referenced_definitions
+
+                embedded_styles.update(render_data.embedded_styles)
 
-                for i in range(count):
-                    card_index = cards_total + 1
+                for style_path in render_data.embedded_styles:
+                    embedded_style_positions.setdefault(style_path, row_sequence)
 
-                    # since we're mutating the template for each card, we need to make a new one
-                    template_front = Template(
-                        stripped_template_content, resolved_template_path)
+                image_paths_from_datasource.update(render_data.image_paths)
 
-                    card_content, render_data = fill_card(
-                        template_front,
-                        row.front_row(),
-                        card_index, cards_total_unique,
-                        definitions)
+                back_fragment = None
 
-                    if (template_front.content is not template_not_provided
-                            and template_front.content is not template_not_opened):
+                if not disable_backs:
+                    with phase(Phases.RENDER_BACK), span(
+                            '{0}:#{1}'.format(context, row_index), 'card',
+                            row='{0}:#{1}'.format(context, row_index), side='back',
+                            context=context, row_index=row_index,
+                            template_path=resolved_template_path_back):
+                        back_fragment, render_data = get_card_fragment(
+                            stripped_template_back_content, resolved_template_path_back,
+                            row.back_row(), definitions,
+                            render_cache, definitions_key, engine)
+
+                    if (back_fragment is not template_back_not_provided
+                            and back_fragment is not template_not_opened):
                         if len(render_data.unused_fields) > 0:
                             WarningDisplay.missing_fields_in_template(
                                 WarningContext(context, row_index),
-                                list(render_data.unused_fields),
+                                list(render_data.unused_fields), is_back_template=True,
                                 cards_affected=count)
 
                         if len(render_data.unknown_fields) > 0:
                             WarningDisplay.unknown_fields_in_template(
                                 WarningContext(context, row_index),
                                 list(render_data.unknown_fields),
-                                template_path,
+                                template_path_back,
+                                is_back_template=True,
                                 cards_affected=count)
 
                     all_referenced_definitions |= render_data.referenced_definitions
 
                     embedded_styles.update(render_data.embedded_styles)
 
-                    image_paths_from_datasource.extend(render_data.image_paths)
+                    for style_path in render_data.embedded_styles:
+                        embedded_style_positions.setdefault(style_path, row_sequence)
 
-                    current_card = get_sized_card(
-                        card, size_class=card_size.style, content=card_content)
+                    image_paths_from_datasource.update(render_data.image_paths)
 
-                    cards += current_card
+                resolved_card = ResolvedCard(row_index, count, front_fragment, back_fragment)
 
-                    cards_on_page += 1
-                    cards_total += 1
+                if page_layout is not None:
+                    page_layout.add_card(resolved_card)
 
-                    cards_total_per_context[context] += 1
+                    resolved_datasource.cards_laid_out += count
+                    resolved_datasource.cards_laid_out_unique += 1
+                else:
+                    resolved_datasource.cards.append(resolved_card)
 
-                    if not disable_backs:
-                        template_back = Template(
-                            stripped_template_back_content, resolved_template_path_back)
+                if progress is not None:
+                    progress.advance(context, count)
 
-                        back_content, render_data = fill_card(
-                            template_back,
-                            row.back_row(),
-                            card_index, cards_total_unique,
-                            definitions)
+        resolved_cards.datasources.append(resolved_datasource)
 
-                        if (template_back.content is not template_back_not_provided
-                                and template_back.content is not template_not_opened):
-                            if len(render_data.unused_fields) > 0:
-                                WarningDisplay.missing_fields_in_template(
-                                    WarningContext(context, row_index),
-                                    list(render_data.unused_fields), is_back_template=True,
-                                    cards_affected=count)
+        context_image_paths[data_path] = list(image_paths_from_datasource)
 
-                            if len(render_data.unknown_fields) > 0:
-                                WarningDisplay.unknown_fields_in_template(
-                                    WarningContext(context, row_index),
-                                    list(render_data.unknown_fields),
-                                    template_path_back,
-                                    is_back_template=True,
-                                    cards_affected=count)
+    resolved_cards.definitions = definitions
+    resolved_cards.referenced_definitions = all_referenced_definitions
+    resolved_cards.embedded_styles = [(template_path, style,
+                                       embedded_style_positions[template_path])
+                                      for template_path, style in embedded_styles.items()]
+    resolved_cards.image_paths = list(context_image_paths.items())
 
-                        all_referenced_definitions |= render_data.referenced_definitions
+    # the cards also depend on any datasource that was only referenced
+    dependencies.update(datasource_index.referenced_data_paths)
 
-                        embedded_styles.update(render_data.embedded_styles)
+    # every card is resolved; so no datasource is read from again
+    datasource_index.close()
 
-                        image_paths_from_datasource.extend(render_data.image_paths)
+    if page_layout is not None and page_layout.datasource is not None:
+        page_layout.end_datasource(is_last=True)
 
-                        current_card_back = get_sized_card(
-                            card, size_class=card_size.style, content=back_content)
+    resolved_cards.record_inputs(dependencies)
 
-                        # prepend this card back to the current line of backs
-                        backs_row = current_card_back + backs_row
+    if progress is not None:
+        progress.finish()
 
-                        # card backs are prepended rather than appended to
-                        # ensure correct layout when printing doublesided
+    return resolved_cards
 
-                        if cards_on_page % cards_per_row is 0:
-                            # a line has been filled- append the 3 card backs
-                            # to the page in the right order
-                            backs += backs_row
 
-                            # reset to prepare for the next line
-                            backs_row = ''
+@within_build_context
+def make(data_paths: list,
+         header_path: str=None,
+         definitions_path: str=None,
+         output_path: str=None,
+         output_filename: str=None,
+         force_page_breaks: bool=False,
+         should_disable_backs: bool=False,
+         should_disable_page_sections: bool=False,
+         default_card_size_identifier: str='standard',
+         is_preview: bool=False,
+         clean_unused_resources: bool=False,
+         cache_path: str=None,
+         cache_size: int=None,
+         layout_only: bool=False,
+         variants_path: str=None,
+         shard: tuple=None,
+         output_stream=None,
+         open_output: bool=True,
+         keep_layout: bool=False) -> list:
+    """ Build cards for all specified datasources.
+
+        If a cache path is specified, rendered cards are stored in (and looked up from)
+        a render cache at that path.
+
+        If keep layout is specified, the resolved cards are kept next to the output file. If layout
+        only is specified, the resolved cards kept by a previous build are used to only lay out
+        pages again, as long as none of their inputs have changed; and they are kept again if they
+        had to be resolved anew.
+
+        If a variants path is specified, an output file is laid out for each variant found there,
+        all from the same resolved cards.
+
+        If a shard is specified (as an index and a count), only the cards of that shard are
+        resolved and kept for a later merge; see merge().
+
+        If an output stream is specified (e.g. stdout), the output file is written to that stream
+        instead; see make_output(). Anything else (e.g. images) is still written to the output path.
+        Unless laid out for several variants, each card is then laid out and written as soon as it
+        is resolved (see make_streamed_output()); and the resolved cards are not kept.
+
+        Return the output path, total pages, total cards and total unique cards of each variant.
+
+        The build runs within a context of its own, unless one is specified (see BuildContext).
+    """
 
-                    if cards_on_page == max_cards_per_page:
-                        # add another page full of cards
-                        pages += get_page(pages_total + 1, cards, page, section, contexts_per_page,
-                                          exclude_section=should_disable_page_sections)
-                        pages_total += 1
+    time_started_make = datetime.datetime.now()
 
-                        if not disable_backs:
-                            # and one full of backs
-                            pages += get_page(pages_total + 1, backs, page, section,
-                                              contexts_per_page, is_card_backs=True,
-                                              exclude_section=should_disable_page_sections)
-                            pages_total += 1
+    datasource_count = len(data_paths)
 
-                            # reset to prepare for the next page
-                            backs = ''
+    exclude_datasource_named = (os.path.basename(definitions_path)
+                                if definitions_path is not None
+                                else None)
 
-                        if pages_contain_backs and disable_backs:
-                            pages += get_page(pages_total + 1, '', page_filler, section,
-                                              contexts_per_page, is_card_backs=True, is_filler=True,
-                                              exclude_section=should_disable_page_sections)
-                            pages_total += 1
+    with phase(Phases.DISCOVERY):
+        if datasource_count == 0:
+            # attempt finding any datasources in current working directory
+            data_paths = discover_datasources(in_directory='.',
+                                              except_datasource_name=exclude_datasource_named)
+
+            datasource_count = len(data_paths)
+        elif datasource_count > 0:
+            # determine whether any datasources point to a directory
+            for i, datasource_path in enumerate(data_paths):
+                if os.path.isdir(datasource_path):
+                    # discover any datasources within the specified directory
+                    discovered_datasource_paths = discover_datasources(
+                        datasource_path, except_datasource_name=exclude_datasource_named)
+                    # replace the datasource directory with any datasources discovered within
+                    data_paths = data_paths[:i] + discovered_datasource_paths + data_paths[i + 1:]
+
+            datasource_count = len(data_paths)
 
-                            contains_filler_pages = True
+    if datasource_count > 0:
+        data_path_names, duplicates_count = get_data_path_names(data_paths)
 
-                        # reset to prepare for the next page
-                        cards_on_page = 0
-                        cards = ''
+        duplicates = (' ({0} {1})'.format(
+            duplicates_count, 'duplicate' if duplicates_count == 1 else 'duplicates')
+                      if duplicates_count > 0 else '')
 
-                        # we're not necesarilly done with the current context, but any other context
-                        # should be cleared at this point
-                        contexts_per_page = [context]
+        print('Generating cards from {0} {1}{2}:\n {3}'.format(
+            datasource_count, 'datasources' if datasource_count > 1 else 'datasource', duplicates,
+            data_path_names))
+        print()
+    else:
+        WarningDisplay.no_datasources()
 
-        if (force_page_breaks or data_path is data_paths[-1]) and cards_on_page > 0:
-            # in case we're forcing pagebreaks for each datasource, or we're on the last datasource
-            # and there's still cards remaining, then do a pagebreak and fill those into a new page
-            pages += get_page(pages_total + 1, cards, page, section, contexts_per_page,
-                              exclude_section=should_disable_page_sections)
-            pages_total += 1
+        # just quit- there's nothing to do
+        return []
 
-            if not disable_backs:
-                cards_on_last_row = cards_on_page % cards_per_row
+    if definitions_path is None:
+        # no definitions file has been explicitly specified, so try looking for it automatically
+        with phase(Phases.DISCOVERY):
+            found, potential_definitions_path = find_file_path('definitions.csv', data_paths)
 
-                if cards_on_last_row is not 0:
-                    # less than MAX_CARDS_PER_ROW cards were added to the current line,
-                    # so we have to add additional blank filler cards to ensure a correct layout
+        if found and potential_definitions_path is not None:
+            definitions_path = potential_definitions_path
 
-                    remaining_backs = cards_per_row - cards_on_last_row
+            WarningDisplay.using_automatically_found_definitions_info(
+                definitions_path)
 
-                    while remaining_backs > 0:
-                        # keep adding empty filler card backs until we've filled a row
-                        backs_row = empty_back + backs_row
+    if output_path is None:
+        # output to current working directory unless otherwise specified
+        output_path = ''
 
-                        remaining_backs -= 1
+    output_directory_name = 'generated'
 
-                backs += backs_row
+    # construct the final output path
+    output_path = os.path.join(output_path, output_directory_name)
 
-                backs_row = ''
+    default_variant = BuildVariant(
+        output_filename,
+        default_card_size_identifier=default_card_size_identifier,
+        force_page_breaks=force_page_breaks,
+        should_disable_backs=should_disable_backs,
+        should_disable_page_sections=should_disable_page_sections,
+        is_preview=is_preview)
 
-                # fill another page with the backs
-                pages += get_page(pages_total + 1, backs, page, section, contexts_per_page,
-                                  is_card_backs=True,
-                                  exclude_section=should_disable_page_sections)
-                pages_total += 1
+    variants = get_variants(variants_path, default_variant)
 
-                backs = ''
+    if len(variants) == 0:
+        # just quit- there's nothing to do
+        return []
 
-            if pages_contain_backs and disable_backs:
-                pages += get_page(pages_total + 1, '', page_filler, section, contexts_per_page,
-                                  is_card_backs=True, is_filler=True,
-                                  exclude_section=should_disable_page_sections)
-                pages_total += 1
+    # cards are resolved only once for all variants, so they must be resolved
+    # with backs (or in full) if any variant needs it
+    should_resolve_backs = any(not variant.should_disable_backs for variant in variants)
+    should_resolve_preview = all(variant.is_preview for variant in variants)
 
-                contains_filler_pages = True
+    resolved_cards_path = get_resolved_cards_path(output_path, output_filename)
 
-            # reset to prepare for the next page
-            cards_on_page = 0
-            cards = ''
+    resolved_cards = None
 
-            # we're finished with this context
-            contexts_per_page = []
+    # whether the resolved cards of the previous build are used
+    is_reusing_resolved_cards = False
 
-        if contains_filler_pages:
-            WarningDisplay.datasource_contains_filler_pages(
-                WarningContext(context))
+    if layout_only and shard is None:
+        resolved_cards = ResolvedCards.load(resolved_cards_path)
 
-        # temporary solution involving creating new Template object only used for fill_each,
-        # could be prettier; refactor as part of #34
-        pages_template = Template(pages)
+        if resolved_cards is not None and resolved_cards.is_current(
+                data_paths, definitions_path, should_resolve_preview, not should_resolve_backs):
+            WarningDisplay.layout_only_info()
 
-        fill_each(TemplateFields.CARDS_TOTAL_IN_CONTEXT,
-                  str(cards_total_per_context[context]),
-                  pages_template)
+            is_reusing_resolved_cards = True
+        else:
+            WarningDisplay.layout_only_not_possible_info()
 
-        pages = pages_template.content
+            resolved_cards = None
 
-        # store the card size that was just used, so we can determine
-        # whether or not the size changes for the next datasource
-        previous_card_size = card_size
+    if resolved_cards is None:
+        with phase(Phases.DEFINITIONS):
+            definitions = get_definitions_from_file(definitions_path)
+    else:
+        definitions = resolved_cards.definitions
 
-        # ensure there are no duplicate image paths, since that would just
-        # cause unnecessary copy operations
-        context_image_paths[data_path] = list(set(image_paths_from_datasource))
+    if should_resolve_preview:
+        WarningDisplay.preview_enabled_info()
 
-        previous_context = context
+    for variant in variants:
+        if CardSizes.get_card_size(variant.default_card_size_identifier) is None:
+            WarningDisplay.bad_card_size(
+                WarningContext(), size_identifier=variant.default_card_size_identifier)
+
+    render_cache = (RenderCache(cache_path, max_size_in_megabytes=cache_size)
+                    if cache_path is not None
+                    else None)
+
+    # the output path, total pages, total cards and total unique cards of each variant
+    variant_results = None
+
+    if resolved_cards is None:
+        if (output_stream is not None and shard is None and
+                len(variants) == 1 and variants[0].datasources is None):
+            # every card can be laid out (and written) as soon as it is resolved, as there are no
+            # other variants that need it
+            resolved_cards, variant_results = make_streamed_output(
+                lambda page_layout: resolve_cards(
+                    data_paths, definitions, definitions_path,
+                    not should_resolve_backs, should_resolve_preview, render_cache,
+                    shard, page_layout),
+                definitions, variants[0], output_path, header_path, clean_unused_resources,
+                output_stream)
+        else:
+            with phase(Phases.RESOLVE):
+                resolved_cards = resolve_cards(
+                    data_paths, definitions, definitions_path,
+                    not should_resolve_backs, should_resolve_preview, render_cache,
+                    shard)
 
-    # determine unused definitions, if any
-    unused_definitions = list(set(definitions.keys()) - all_referenced_definitions)
+    if shard is not None:
+        resolved_cards.shard = shard
 
-    if len(unused_definitions) > 0:
-        WarningDisplay.unused_definitions(unused_definitions)
+        shard_path = get_shard_path(output_path, shard)
+
+        with phase(Phases.WRITE):
+            resolved_cards.save(shard_path)
+
+        # copy any referenced images along with the shard, so that shards can be merged
+        # without access to the original resources
+        with phase(Phases.RESOURCES):
+            for context, image_paths in resolved_cards.image_paths:
+                copy_images_to_output_directory(
+                    image_paths, context, output_path)
+
+        report_build(time_started_make, resolved_cards, render_cache=render_cache)
+
+        if render_cache is not None:
+            # keep the cache within its size limit by evicting the least recently used entries
+            render_cache.evict()
+
+        print_finished(time_started_make)
+
+        cards_total_unique = resolved_cards.cards_total_unique()
+
+        print('Resolved {0} {1} for shard {2}/{3}\n -> \'{4}\''
+              .format(cards_total_unique, 'cards' if cards_total_unique != 1 else 'card',
+                      shard[0], shard[1], shard_path))
+        print()
+
+        print_render_cache_summary(render_cache)
+        print_profile()
+        print_memory_report()
+        print_trace()
+
+        return []
+
+    if ((keep_layout or layout_only) and not is_reusing_resolved_cards and
+            output_stream is None):
+        # keep the resolved cards around, so that pages can be laid out again later on
+        # (but not when written to a stream; the cards might not even have been kept)
+        with phase(Phases.WRITE):
+            resolved_cards.save(resolved_cards_path)
+
+    if variant_results is None:
+        variant_results = make_output(
+            resolved_cards, variants, output_path, header_path, clean_unused_resources,
+            output_stream)
+
+    if render_cache is not None:
+        # keep the cache within its size limit by evicting the least recently used entries
+        render_cache.evict()
+
+    report_build(time_started_make, resolved_cards, variant_results, render_cache)
+
+    print_finished(time_started_make)
+    print_generated(output_path, variant_results)
+    print_render_cache_summary(render_cache)
+    print_profile()
+    print_memory_report()
+    print_trace()
+
+    if open_output and output_stream is None:
+        open_path(output_path)
+
+    return variant_results
+
+
+@within_build_context
+def merge(shard_paths: list,
+          header_path: str=None,
+          output_path: str=None,
+          output_filename: str=None,
+          force_page_breaks: bool=False,
+          should_disable_backs: bool=False,
+          should_disable_page_sections: bool=False,
+          default_card_size_identifier: str='standard',
+          is_preview: bool=False,
+          clean_unused_resources: bool=False,
+          variants_path: str=None,
+          keep_layout: bool=False):
+    """ Merge the cards of all shards of a build, and lay them out as if built at once.
+
+        Each path can either point to a shard manifest, or the output path of a shard build.
+
+        The merge runs within a context of its own, unless one is specified (see BuildContext).
+    """
+
+    time_started_merge = datetime.datetime.now()
+
+    manifest_paths = []
+
+    for shard_path in shard_paths:
+        found_manifest_paths = find_shard_paths(shard_path)
+
+        if len(found_manifest_paths) == 0:
+            WarningDisplay.bad_shard_error(shard_path)
+
+        manifest_paths.extend(found_manifest_paths)
+
+    shards = []
+
+    for manifest_path in manifest_paths:
+        resolved_cards = ResolvedCards.load(manifest_path)
+
+        if resolved_cards is None or resolved_cards.shard is None:
+            WarningDisplay.bad_shard_error(manifest_path)
+
+            continue
+
+        shards.append((resolved_cards, manifest_path))
+
+    if len(shards) == 0:
+        # just quit- there's nothing to do
+        return
+
+    first_shard, _ = shards[0]
+
+    shard_count = first_shard.shard[1]
+
+    for resolved_cards, manifest_path in shards:
+        if (resolved_cards.shard[1] != shard_count or
+                resolved_cards.data_paths != first_shard.data_paths):
+            WarningDisplay.mismatched_shard_error(manifest_path)
+
+            return
+
+    shards.sort(key=lambda shard: shard[0].shard[0])
+
+    shard_indices = [resolved_cards.shard[0] for resolved_cards, _ in shards]
+
+    missing_shards = ['{0}/{1}'.format(shard_index, shard_count)
+                      for shard_index in range(1, shard_count + 1)
+                      if shard_index not in shard_indices]
+
+    if len(missing_shards) > 0 or len(set(shard_indices)) != len(shard_indices):
+        WarningDisplay.missing_shards_error(missing_shards)
+
+        return
+
+    print('Merging cards from {0} {1}:\n {2}'.format(
+        shard_count, 'shards' if shard_count > 1 else 'shard',
+        [manifest_path for _, manifest_path in shards]))
+    print()
+
+    default_variant = BuildVariant(
+        output_filename,
+        default_card_size_identifier=default_card_size_identifier,
+        force_page_breaks=force_page_breaks,
+        should_disable_backs=should_disable_backs,
+        should_disable_page_sections=should_disable_page_sections,
+        is_preview=is_preview)
+
+    variants = get_variants(variants_path, default_variant)
+
+    if len(variants) == 0:
+        # just quit- there's nothing to do
+        return
+
+    for variant in variants:
+        if CardSizes.get_card_size(variant.default_card_size_identifier) is None:
+            WarningDisplay.bad_card_size(
+                WarningContext(), size_identifier=variant.default_card_size_identifier)
+
+    with phase(Phases.RESOLVE):
+        resolved_cards = merge_shards(shards)
 
     if output_path is None:
         # output to current working directory unless otherwise specified
         output_path = ''
 
-    output_directory_name = 'generated'
-
     # construct the final output path
-    output_path = os.path.join(output_path, output_directory_name)
+    output_path = os.path.join(output_path, 'generated')
+
+    if keep_layout:
+        # keep the merged cards around, so that pages can be laid out again later on
+        with phase(Phases.WRITE):
+            resolved_cards.save(get_resolved_cards_path(output_path, output_filename))
+
+    variant_results = make_output(
+        resolved_cards, variants, output_path, header_path, clean_unused_resources)
+
+    report_build(time_started_merge, resolved_cards, variant_results)
+
+    print_finished(time_started_merge)
+    print_generated(output_path, variant_results)
+    print_profile()
+    print_memory_report()
+    print_trace()
+
+    open_path(output_path)
+
+
+def get_page_layout(base_templates: dict,
+                    variant: BuildVariant,
+                    pages_contain_backs: bool,
+                    page_writer=None) -> PageLayout:
+    """ Return a layout of pages for a variant, using the base templates. """
+
+    default_card_size = CardSizes.get_card_size(variant.default_card_size_identifier)
+
+    if default_card_size is None:
+        default_card_size = CardSizes.get_default_card_size()
+
+    return PageLayout(
+        base_templates['card'], base_templates['page'],
+        base_templates['page_filler'], base_templates['section'],
+        default_card_size,
+        variant.force_page_breaks,
+        variant.should_disable_backs,
+        variant.should_disable_page_sections,
+        pages_contain_backs=pages_contain_backs,
+        is_preview=variant.is_preview,
+        page_writer=page_writer)
+
+
+def get_base_templates() -> (dict, dict):
+    """ Return every base template by name, and any image paths filled in those by path. """
+
+    base_templates = {}
+    # dict of all image paths discovered for each base template
+    context_image_paths = {}
+
+    for template_name in ['card', 'page', 'page_filler', 'section', 'index']:
+        template_path = get_base_template_path(template_name)
+
+        with phase(Phases.TEMPLATES):
+            template, filled_image_paths = get_base_template(template_name)
+
+        if len(filled_image_paths) > 0:
+            context_image_paths[template_path] = list(set(filled_image_paths))
+
+        base_templates[template_name] = template
+
+    return base_templates, context_image_paths
+
+
+def get_header(header_path: str=None) -> str:
+    """ Return the content of a header file, if any. """
+
+    header = ''
+
+    if header_path is not None:
+        try:
+            with open(header_path) as header_file:
+                header = header_file.read().strip()
+        except IOError:
+            WarningDisplay.bad_header_file_error(header_path)
+
+    return header
+
+
+def get_styles(resolved_cards: ResolvedCards) -> str:
+    """ Return every style embedded in the templates of resolved cards. """
+
+    styles = ''
+
+    for template_path, style, _ in resolved_cards.embedded_styles:
+        styles = styles + '\n' + style if len(styles) > 0 else style
+
+    return styles
+
+
+def warn_unused_definitions(resolved_cards: ResolvedCards) -> None:
+    """ Warn about any definitions that were not referenced by resolved cards. """
+
+    definitions = resolved_cards.definitions
+
+    # determine unused definitions, if any
+    unused_definitions = list(set(definitions.keys()) - resolved_cards.referenced_definitions)
+
+    if len(unused_definitions) > 0:
+        WarningDisplay.unused_definitions(unused_definitions)
+
+
+def add_index_image_paths(context_image_paths: dict, render_data: TemplateRenderData) -> None:
+    """ Add any image paths found while populating an index to the image paths of each context. """
+
+    if len(render_data.image_paths) > 0:
+        index_template_path = get_base_template_path('index')
+
+        image_paths_from_index = transformed_image_paths(render_data.image_paths,
+                                                         index_template_path)
+        # we assume that any leftover images would have been from a definition
+        context_image_paths[index_template_path] = list(
+            set(context_image_paths.get(index_template_path, []) +
+                image_paths_from_index))
+
+
+def make_output(resolved_cards: ResolvedCards,
+                variants: list,
+                output_path: str,
+                header_path: str=None,
+                clean_unused_resources: bool=False,
+                output_stream=None) -> list:
+    """ Lay out resolved cards on pages and write an output file for each variant.
+
+        If an output stream is specified (e.g. stdout), the first variant is written to that
+        stream instead of a file; each page as soon as it is laid out. As the totals are not known
+        until every page has been laid out, they are written after the pages (see IndexWriter).
+
+        Return the output path, total pages, total cards and total unique cards of each variant.
+    """
+
+    definitions = resolved_cards.definitions
+
+    base_templates, base_image_paths = get_base_templates()
+
+    # dict of all image paths discovered for each context during card generation
+    context_image_paths = dict(resolved_cards.image_paths)
+    context_image_paths.update(base_image_paths)
+
+    warn_unused_definitions(resolved_cards)
 
     # ensure all directories exist or created if missing
     create_directories_if_necessary(output_path)
 
-    output_filepath = os.path.join(output_path, output_filename)
+    styles = get_styles(resolved_cards)
+    header = get_header(header_path)
+
+    # the output path, total pages, total cards and total unique cards of each variant
+    variant_results = []
 
-    # begin writing pages to the output file (overwriting any existing file)
-    with open(output_filepath, 'w') as result:
-        styles = ''
+    for variant_index, variant in enumerate(variants):
+        datasources = [datasource for datasource in resolved_cards.datasources
+                       if variant.includes(datasource.context, datasource.data_path)]
 
-        for template_path, style in embedded_styles.items():
-            styles = styles + '\n' + style if len(styles) > 0 else style
+        if variant.datasources is not None:
+            unknown_datasources = [name for name in variant.datasources
+                                   if not any(datasource.context == name or
+                                              datasource.data_path == name
+                                              for datasource in resolved_cards.datasources)]
 
-        header = ''
+            if len(unknown_datasources) > 0:
+                WarningDisplay.unknown_variant_datasources(
+                    variant.output_filename, unknown_datasources)
 
-        if header_path is not None:
-            try:
-                with open(header_path) as header_file:
-                    header = header_file.read().strip()
-            except IOError:
-                WarningDisplay.bad_header_file_error(header_path)
+        if output_stream is not None and variant_index == 0:
+            index_writer = IndexWriter(
+                output_stream, base_templates['index'], styles, header, None, None, definitions)
 
-        index, render_data = fill_index(
-            index, styles, pages, header, pages_total, cards_total, definitions)
+            page_layout = get_page_layout(
+                base_templates, variant, resolved_cards.contains_backs,
+                page_writer=index_writer.write_page)
 
-        if len(render_data.image_paths) > 0:
-            image_paths_from_index = transformed_image_paths(render_data.image_paths,
-                                                             index_template_path)
-            # we assume that any leftover images would have been from a definition
-            context_image_paths[index_template_path] = list(set(image_paths_from_index))
+            # write each page as soon as it is laid out
+            with phase(Phases.WRITE):
+                index_writer.begin()
 
-        result.write(index)
+                layout_pages(datasources, page_layout)
+
+                render_data = index_writer.end(totals=page_layout.totals())
+
+            pages_total, cards_total = page_layout.pages_total, page_layout.cards_total
+
+            output_filepath = STDOUT_NAME
+        else:
+            page_layout = get_page_layout(
+                base_templates, variant, resolved_cards.contains_backs)
+
+            with phase(Phases.LAYOUT):
+                pages, pages_total, cards_total = layout_pages(datasources, page_layout)
+
+            output_filepath = os.path.join(output_path, variant.output_filename)
+
+            with phase(Phases.FILL_INDEX):
+                index, render_data = fill_index(
+                    base_templates['index'], styles, pages, header, pages_total, cards_total,
+                    definitions)
+
+            # write pages to the output file (overwriting any existing file)
+            with phase(Phases.WRITE):
+                with open(output_filepath, 'w') as result:
+                    result.write(index)
+
+            BuildContext.current().record_output_file(output_filepath, 'written')
+
+        add_index_image_paths(context_image_paths, render_data)
+
+        variant_results.append((output_filepath, pages_total, cards_total,
+                                page_layout.cards_total_unique))
+
+    copy_output_resources(context_image_paths, output_path, clean_unused_resources)
+
+    return variant_results
+
+
+def make_streamed_output(resolve,
+                         definitions: dict,
+                         variant: BuildVariant,
+                         output_path: str,
+                         header_path: str=None,
+                         clean_unused_resources: bool=False,
+                         output_stream=None) -> (ResolvedCards, list):
+    """ Resolve cards and lay them out on pages at once, writing each page to a stream as soon as
+        it is laid out; so that only a single page of cards is held in memory at any time.
+
+        The cards are resolved by calling resolve() with the page layout that every card should be
+        laid out by (see resolve_cards()). As neither the totals nor the styles are known until
+        every card has been resolved, they are written after the pages (see IndexWriter).
+
+        Return the resolved cards (without any of the cards kept), along with the output path,
+        total pages, total cards and total unique cards of the variant.
+    """
+
+    base_templates, base_image_paths = get_base_templates()
+
+    # ensure all directories exist or created if missing
+    create_directories_if_necessary(output_path)
+
+    index_writer = IndexWriter(
+        output_stream, base_templates['index'], None, get_header(header_path), None, None,
+        definitions)
+
+    # whether pages must be kept in sync is not known until the datasources have been read
+    page_layout = get_page_layout(
+        base_templates, variant, pages_contain_backs=False, page_writer=index_writer.write_page)
+
+    index_writer.begin()
+
+    with phase(Phases.RESOLVE):
+        resolved_cards = resolve(page_layout)
+
+    with phase(Phases.WRITE):
+        render_data = index_writer.end(get_styles(resolved_cards), page_layout.totals())
+
+    # dict of all image paths discovered for each context during card generation
+    context_image_paths = dict(resolved_cards.image_paths)
+    context_image_paths.update(base_image_paths)
+
+    warn_unused_definitions(resolved_cards)
+
+    add_index_image_paths(context_image_paths, render_data)
+
+    copy_output_resources(context_image_paths, output_path, clean_unused_resources)
+
+    return resolved_cards, [(STDOUT_NAME, page_layout.pages_total, page_layout.cards_total,
+                             page_layout.cards_total_unique)]
+
+
+def copy_output_resources(context_image_paths: dict,
+                          output_path: str,
+                          clean_unused_resources: bool=False) -> None:
+    """ Copy every resource needed by the output files (e.g. styles, scripts and any referenced
+        images) to the output path; and clean up any unused resources, if specified.
+    """
+
+    base_path = get_base_path()
 
     css_path = os.path.join(output_path, 'css')
     js_path = os.path.join(output_path, 'js')
 
     resources_path = os.path.join(output_path, get_resources_path())
 
-    create_directories_if_necessary(css_path)
-    create_directories_if_necessary(js_path)
-    create_directories_if_necessary(resources_path)
+    with phase(Phases.RESOURCES):
+        create_directories_if_necessary(css_path)
+        create_directories_if_necessary(js_path)
+        create_directories_if_necessary(resources_path)
 
-    copy_file_if_necessary(os.path.join(base_path, 'templates/base/css/cards.css'),
-                           os.path.join(css_path, 'cards.css'))
+        for base_resource_path, resource_path in [('css/cards.css', css_path),
+                                                  ('css/index.css', css_path),
+                                                  ('js/index.js', js_path)]:
+            destination_path = os.path.join(
+                resource_path, os.path.basename(base_resource_path))
 
-    copy_file_if_necessary(os.path.join(base_path, 'templates/base/css/index.css'),
-                           os.path.join(css_path, 'index.css'))
+            resource_was_copied, resource_already_existed = copy_file_if_necessary(
+                os.path.join(base_path, 'templates/base', base_resource_path), destination_path)
 
-    copy_file_if_necessary(os.path.join(base_path, 'templates/base/js/index.js'),
-                           os.path.join(js_path, 'index.js'))
+            BuildContext.current().record_copied_file(
+                destination_path, resource_was_copied, resource_already_existed)
 
-    all_copied_image_filenames = []
+        all_copied_image_filenames = []
 
-    # additionally, copy all referenced images to the output directory
-    for context in context_image_paths:
-        image_paths = context_image_paths[context]
-        image_filenames = [os.path.basename(image_path) for image_path in image_paths]
+        # additionally, copy all referenced images to the output directory
+        for context in context_image_paths:
+            image_paths = context_image_paths[context]
+            image_filenames = [os.path.basename(image_path) for image_path in image_paths]
 
-        copy_images_to_output_directory(
-            image_paths, context, output_path)
+            copy_images_to_output_directory(
+                image_paths, context, output_path)
 
-        all_copied_image_filenames.extend(image_filenames)
+            all_copied_image_filenames.extend(image_filenames)
 
-    unused_resources, unused_resource_paths = get_unused_resources(
-        output_path, all_copied_image_filenames)
+    with phase(Phases.UNUSED_RESOURCES):
+        unused_resources, unused_resource_paths = get_unused_resources(
+            output_path, all_copied_image_filenames)
 
-    if len(unused_resources) > 0:
-        if clean_unused_resources:
-            for unused_resource_path in unused_resource_paths:
-                os.remove(unused_resource_path)
+        if len(unused_resources) > 0:
+            if clean_unused_resources:
+                for unused_resource_path in unused_resource_paths:
+                    os.remove(unused_resource_path)
+
+                WarningDisplay.unused_resources_were_cleaned(
+                    unused_resources, in_resource_dir=resources_path)
+            else:
+                WarningDisplay.unused_resources(
+                    unused_resources, in_resource_dir=resources_path)
 
-            WarningDisplay.unused_resources_were_cleaned(
-                unused_resources, in_resource_dir=resources_path)
-        else:
-            WarningDisplay.unused_resources(
-                unused_resources, in_resource_dir=resources_path)
 
-    output_location_message = (' -> \033[4m\'{0}\'\033[0m'.format(output_filepath)
-                               if terminal_supports_color() else
-                               ' -> \'{0}\''.format(output_filepath))
+def report_build(time_started: datetime.datetime,
+                 resolved_cards: ResolvedCards,
+                 variant_results: list=None,
+                 render_cache: RenderCache=None) -> None:
+    """ Record the outcome of a build in its report, if any. """
+
+    report = BuildContext.current().report
+
+    if report is None:
+        return
+
+    report.time_in_seconds = (datetime.datetime.now() - time_started) / timedelta(seconds=1)
+
+    report.record_resolved_cards(resolved_cards)
+
+    if variant_results is not None:
+        report.record_variants(variant_results)
+
+    if render_cache is not None:
+        report.record_render_cache(render_cache)
+
+
+def print_finished(time_started: datetime.datetime) -> None:
+    """ Print the time spent since a build started, along with any warnings or errors. """
+
+    context = BuildContext.current()
 
     # get the grammar right
-    errors_or_error = 'error' if WarningDisplay.error_count == 1 else 'errors'
-    warnings_or_warning = 'warning' if WarningDisplay.warning_count == 1 else 'warnings'
+    errors_or_error = 'error' if context.error_count == 1 else 'errors'
+    warnings_or_warning = 'warning' if context.warning_count == 1 else 'warnings'
 
     warnings_and_errors_message = (' ({0} {1}, {2} {3}{4})'
-                                   .format(WarningDisplay.error_count, errors_or_error,
-                                           WarningDisplay.warning_count, warnings_or_warning,
+                                   .format(context.error_count, errors_or_error,
+                                           context.warning_count, warnings_or_warning,
                                            ('; set --verbose for more'
-                                            if not WarningDisplay.is_verbose else ''))
+                                            if not context.is_verbose else ''))
                                    if WarningDisplay.has_encountered_errors()
                                    or WarningDisplay.has_encountered_warnings()
                                    else '')
 
     now = datetime.datetime.now()
 
-    time_difference = now - time_started_make
+    time_difference = now - time_started
     time_difference_in_seconds = time_difference / timedelta(seconds=1)
 
     if WarningDisplay.has_displayed_messages():
@@ -1121,28 +1585,155 @@ def make(data_paths: list,
         time_difference_in_seconds, warnings_and_errors_message))
     print()
 
-    # find the total size of the generated directory
-    generated_directory_size = pretty_size(directory_size(output_path))
 
-    if cards_total > 0:
-        # get the grammar right
-        pages_or_page = 'pages' if pages_total > 1 else 'page'
-        cards_or_card = 'cards' if cards_total > 1 else 'card'
+def print_generated(output_path: str, variant_results: list) -> None:
+    """ Print the outcome of each variant of a build. """
+
+    # the total size of every file of the output; i.e. not counting anything else
+    # that happens to be in the generated directory
+    generated_directory_size = pretty_size(BuildContext.current().output_size())
+
+    for output_filepath, pages_total, cards_total, cards_total_unique in variant_results:
+        output_location_message = (' -> \033[4m\'{0}\'\033[0m'.format(output_filepath)
+                                   if terminal_supports_color() else
+                                   ' -> \'{0}\''.format(output_filepath))
+
+        if cards_total > 0:
+            # get the grammar right
+            pages_or_page = 'pages' if pages_total > 1 else 'page'
+            cards_or_card = 'cards' if cards_total > 1 else 'card'
 
-        if cards_total > cards_total_unique:
-            print('Generated {0} ({1} unique) {2} on {3} {4} ({5})\n{6}'
-                  .format(cards_total, cards_total_unique, cards_or_card,
-                          pages_total, pages_or_page,
-                          generated_directory_size, output_location_message))
+            if cards_total > cards_total_unique:
+                print('Generated {0} ({1} unique) {2} on {3} {4} ({5})\n{6}'
+                      .format(cards_total, cards_total_unique, cards_or_card,
+                              pages_total, pages_or_page,
+                              generated_directory_size, output_location_message))
+            else:
+                print('Generated {0} {1} on {2} {3} ({4})\n{5}'
+                      .format(cards_total, cards_or_card,
+                              pages_total, pages_or_page,
+                              generated_directory_size, output_location_message))
         else:
-            print('Generated {0} {1} on {2} {3} ({4})\n{5}'
-                  .format(cards_total, cards_or_card,
-                          pages_total, pages_or_page,
-                          generated_directory_size, output_location_message))
-    else:
-        print('Generated 0 cards ({0})\n{1}'
-              .format(generated_directory_size, output_location_message))
+            print('Generated 0 cards ({0})\n{1}'
+                  .format(generated_directory_size, output_location_message))
+
+        print()
+
+
+def print_render_cache_summary(render_cache: RenderCache=None) -> None:
+    """ Print the number of cards served from a render cache, if any. """
+
+    if render_cache is not None:
+        print('Render cache: {0} {1}, {2} {3} ({4:.0f}% hit rate, {5} evicted)'
+              .format(render_cache.hits, 'hit' if render_cache.hits == 1 else 'hits',
+                      render_cache.misses, 'miss' if render_cache.misses == 1 else 'misses',
+                      render_cache.hit_rate() * 100, render_cache.evictions))
+        print()
+
+
+def print_profile() -> None:
+    """ Print the time spent in each phase of a build, if profiled. """
+
+    profile = BuildContext.current().profile
+
+    if profile is None:
+        return
+
+    total_wall_time, total_cpu_time = profile.total_time()
 
+    print('Profile (wall time / CPU time):')
+
+    for name, phase_time in profile.phases.items():
+        print(' {0:<24}{1:>9.3f}s {2:>9.3f}s  ({3}x)'.format(
+            name, phase_time.wall_time, phase_time.cpu_time, phase_time.count))
+
+    # anything not spent in a phase; e.g. printing or parsing options
+    other_wall_time = total_wall_time - sum(
+        phase_time.wall_time for phase_time in profile.phases.values())
+    other_cpu_time = total_cpu_time - sum(
+        phase_time.cpu_time for phase_time in profile.phases.values())
+
+    print(' {0:<24}{1:>9.3f}s {2:>9.3f}s'.format('other', other_wall_time, other_cpu_time))
+    print(' {0:<24}{1:>9.3f}s {2:>9.3f}s'.format('total', total_wall_time, total_cpu_time))
     print()
 
-    open_path(output_path)
+    if profile.save_render_profile():
+        print('Saved render profile\n -> \'{0}\''.format(profile.render_profile_path))
+        print()
+
+
+def print_memory_report() -> None:
+    """ Print the memory used by each phase and each datasource of a build, if measured. """
+
+    memory_report = BuildContext.current().memory_report
+
+    if memory_report is None:
+        return
+
+    def megabytes(size_in_bytes: int) -> float:
+        return size_in_bytes / (1024 * 1024)
+
+    def shortened(data_path: str) -> str:
+        try:
+            data_path = os.path.relpath(data_path)
+        except ValueError:
+            # e.g. on another drive than the working directory
+            pass
+
+        # keep the end of the path; that is what tells the datasources apart
+        return data_path if len(data_path) <= 24 else '...' + data_path[-21:]
+
+    print('Memory (peak / retained):')
+
+    for name, usage in memory_report.phases.items():
+        print(' {0:<24}{1:>9.2f} MB {2:>9.2f} MB'.format(
+            name, megabytes(usage.peak_size), megabytes(usage.retained_size)))
+
+    print()
+
+    if len(memory_report.datasources) > 0:
+        print('Memory by datasource (peak / retained):')
+
+        for data_path, usage in memory_report.datasources.items():
+            print(' {0:<24}{1:>9.2f} MB {2:>9.2f} MB'.format(
+                shortened(data_path), megabytes(usage.peak_size), megabytes(usage.retained_size)))
+
+        print()
+
+    if len(memory_report.top_allocations) > 0:
+        print('Top allocation sites (in use after \'{0}\'):'.format(
+            memory_report.top_allocations_phase))
+
+        for filename, lineno, size, count in memory_report.top_allocations:
+            print(' {0:>9.2f} MB  {1}:{2} ({3} blocks)'.format(
+                megabytes(size), filename, lineno, count))
+
+        print()
+
+
+def print_trace() -> None:
+    """ Save the trace of a build, if traced, and print its slowest rows and templates. """
+
+    trace = BuildContext.current().trace
+
+    if trace is None:
+        return
+
+    trace.save()
+
+    print('Slowest rows:')
+
+    for row, duration, renders in trace.slowest('card', 'row'):
+        print(' {0:>9.3f}s  {1} ({2} {3})'.format(
+            duration, row, renders, 'render' if renders == 1 else 'renders'))
+
+    print()
+    print('Slowest templates:')
+
+    for template_path, duration, renders in trace.slowest('card', 'template_path'):
+        print(' {0:>9.3f}s  {1} ({2} {3})'.format(
+            duration, template_path, renders, 'render' if renders == 1 else 'renders'))
+
+    print()
+    print('Saved trace\n -> \'{0}\''.format(trace.path))
+    print()
@@ -8,7 +8,7 @@ import os
 import csv
 import itertools
 
-from cards.templatefield import TemplateField, fields
+from cards.templatefield import TemplateField, fields, parse_row_reference
 from cards.markdown import markdown
 
 from cards.util import FileWrapper, lower_first_row
@@ -55,15 +55,21 @@ class Column:
 class Row:
     """ Represents a row in a datasource. """
 
+    __slots__ = ('data', 'data_path', 'row_index', 'layout', 'datasource')
+
     def __init__(self,
                  data: dict,
                  data_path: str=None,
                  row_index: int=None,
-                 is_excluded: bool=False):
+                 layout=None,
+                 datasource=None):
         self.data = data
         self.data_path = data_path
         self.row_index = row_index
-        self.is_excluded = is_excluded
+        # the classified columns of the datasource, if the data is a view into it (see RowData)
+        self.layout = layout
+        # the loaded datasource that the row is from, if any; other rows are looked up in it
+        self.datasource = datasource
 
     def _usable_columns(self):
         return (column for column in
@@ -96,6 +102,13 @@ class Row:
     def front_row(self) -> 'Row':
         """ Return a Row containing only data fit for the front of a card. """
 
+        if self.layout is not None:
+            # the columns fit for the front are already known; no need to classify them again
+            return Row(data=self.data.viewed_as(self.layout.front),
+                       data_path=self.data_path,
+                       row_index=self.row_index,
+                       datasource=self.datasource)
+
         return Row(data=self._front_data(),
                    data_path=self.data_path,
                    row_index=self.row_index)
@@ -103,6 +116,12 @@ class Row:
     def back_row(self) -> 'Row':
         """ Return a Row containing only data fit for the back of a card. """
 
+        if self.layout is not None:
+            return Row(data=self.data.viewed_as(self.layout.back),
+                       data_path=self.data_path,
+                       row_index=self.row_index,
+                       datasource=self.datasource)
+
         return Row(data=self._back_data(),
                    data_path=self.data_path,
                    row_index=self.row_index)
@@ -206,8 +225,18 @@ def size_identifier_from_columns(column_names: list) -> (str, list):
     return size_identifier, parsed_column_names
 
 
-def get_row(row_number: int, referencing_row: Row, referencing_column: Column) -> Row:
-    """ Return the row at a row index. """
+def get_row(row_number: int,
+            referencing_row: Row,
+            referencing_column: Column,
+            datasource=None) -> Row:
+    """ Return the row at a row index.
+
+        The row is looked up in the datasource of the referencing row, unless another datasource
+        is specified.
+    """
+
+    if datasource is None:
+        datasource = referencing_row.datasource
 
     context = os.path.basename(referencing_row.data_path)
 
@@ -237,6 +266,21 @@ def get_row(row_number: int, referencing_row: Row, referencing_column: Column) -
 
         return None
 
+    if datasource is not None:
+        # look up the row in the datasource that is already loaded, instead of reading it again
+        row, is_excluded = datasource.row_at(row_number)
+
+        if is_excluded:
+            WarningDisplay.referencing_excluded_row(
+                WarningContext(context, row_index=from_row_index, column=from_column_name),
+                referenced_row_number=row_number)
+        elif row is None:
+            WarningDisplay.referencing_row_out_of_bounds(
+                WarningContext(context, row_index=from_row_index, column=from_column_name),
+                referenced_row_number=row_number)
+
+        return row
+
     with open(referencing_row.data_path) as data_file_raw:
         data_file = FileWrapper(data_file_raw)
         # read data appropriately
@@ -259,12 +303,63 @@ def get_row(row_number: int, referencing_row: Row, referencing_column: Column) -
                 return Row(row_data, referencing_row.data_path)
 
 
+def get_referenced_data_path(data_path: str, referencing_data_path: str) -> str:
+    """ Return the path of a referenced datasource, relative to the referencing datasource. """
+
+    if len(data_path) == 0:
+        return referencing_data_path
+
+    return os.path.join(os.path.dirname(referencing_data_path), data_path)
+
+
+def referenced_data_paths(content: str, relative_to_path: str) -> list:
+    """ Return the path of every datasource that any row reference in some content points to. """
+
+    data_paths = []
+
+    for field in fields(content):
+        if field.has_row_reference():
+            data_path, _, _, _ = parse_row_reference(field.context)
+
+            data_paths.append(get_referenced_data_path(data_path, relative_to_path))
+
+    return data_paths
+
+
+def get_referenced_datasource(data_path: str, referencing_row: Row, referencing_column: Column):
+    """ Return the datasource that a row reference points to, if it can be found and read. """
+
+    if len(data_path) == 0:
+        return referencing_row.datasource
+
+    index = (referencing_row.datasource.index
+             if referencing_row.datasource is not None
+             else None)
+
+    referenced_data_path = get_referenced_data_path(data_path, referencing_row.data_path)
+
+    datasource = (index.datasource(referenced_data_path)
+                  if index is not None
+                  else None)
+
+    if datasource is None:
+        WarningDisplay.referencing_unknown_datasource(
+            WarningContext(os.path.basename(referencing_row.data_path),
+                           row_index=referencing_row.row_index, column=referencing_column.name),
+            referenced_data_path)
+
+    return datasource
+
+
 def get_row_reference(field: TemplateField,
                       in_reference_row: Row,
                       in_reference_column: Column) -> (str, Row, bool):
     """ Return the column and row of data that a template field references.
 
         If a field like 'title #6' is passed, then return 'title' and row number 6.
+        Likewise for a field like 'title #name=Elves' (the first row with 'Elves' in the 'name'
+        column), or 'title factions.csv#6' (row number 6 in another datasource; see
+        parse_row_reference()).
 
         If it is not a reference, return the row passed.
     """
@@ -282,34 +377,66 @@ def get_row_reference(field: TemplateField,
         if field.has_row_reference():
             # it might be, because there's multiple components in the field name
             # we've determined that this is probably a reference to another row
-            # so get the row number
-            row_number = field.context[1:]
-
-            try:
-                row_number = int(row_number)
-            except ValueError:
-                row_number = None
-
-            if row_number is not None:
-                if row_number == reference_row.row_index:
-                    # the row number would lead to the same row that was passed, so we clean up
-                    # the field by removing the number reference, but otherwise leave the row as is
-                    return field.name, reference_row, is_invalid_reference
-
-                reference_row = get_row(row_number, reference_row, in_reference_column)
-
-                if reference_row is None:
-                    is_invalid_reference = True
-                else:
-                    reference_row.row_index = row_number
-
-                    # however, we don't want to provide every column found in this row;
-                    # we *only* want the columns also available in the originating row
-                    reference_row.data = {column: column_content for column, column_content
-                                          in reference_row.data.items()
-                                          if column in in_reference_row.data}
-
-                    reference_column = field.name
+            # so get the row number (or the key of the row) and its datasource
+            data_path, row_number, key_column, key = parse_row_reference(field.context)
+
+            if data_path is not None:
+                is_other_datasource = len(data_path) > 0
+
+                datasource = get_referenced_datasource(
+                    data_path, reference_row, in_reference_column)
+
+                if is_other_datasource and datasource is None:
+                    return reference_column, reference_row, True
+
+                if key_column is not None:
+                    # note that each column is only indexed once, no matter how many rows
+                    # reference a key in it
+                    row_number = (datasource.index.row_index_of(datasource, key_column, key)
+                                  if datasource is not None and datasource.index is not None
+                                  else None)
+
+                    if row_number is None:
+                        WarningDisplay.referencing_unknown_row(
+                            WarningContext(os.path.basename(reference_row.data_path),
+                                           row_index=reference_row.row_index,
+                                           column=in_reference_column.name),
+                            key_column, key)
+
+                        return reference_column, reference_row, True
+
+                if row_number is not None:
+                    if not is_other_datasource and row_number == reference_row.row_index:
+                        # the row number would lead to the same row that was passed, so we clean
+                        # up the field by removing the number reference, but otherwise leave the
+                        # row as is
+                        return field.name, reference_row, is_invalid_reference
+
+                    reference_row = get_row(
+                        row_number, reference_row, in_reference_column, datasource)
+
+                    if reference_row is None:
+                        is_invalid_reference = True
+                    elif is_other_datasource:
+                        reference_row.row_index = row_number
+
+                        # a row in another datasource provides its columns fit for the front of
+                        # a card; all of them, as they are not the columns of the originating row
+                        reference_row = reference_row.front_row()
+
+                        reference_column = field.name
+                    else:
+                        reference_row.row_index = row_number
+
+                        # however, we don't want to provide every column found in this row;
+                        # we *only* want the columns also available in the originating row
+                        reference_row.data = {column: column_content for column, column_content
+                                              in reference_row.data.items()
+                                              if column in in_reference_row.data}
+                        # so the data is no longer a view into the datasource
+                        reference_row.layout = None
+
+                        reference_column = field.name
 
     return reference_column, reference_row, is_invalid_reference
 
@@ -0,0 +1,149 @@
+# coding=utf-8
+
+"""
+This module provides the context of a single build.
+
+A build context owns everything that changes while building; e.g. the warnings and errors
+encountered so far. Each build runs within a context of its own, so that several builds can run
+in the same process (even at the same time, on separate threads) without affecting each other.
+
+A context is activated for the current thread by entering it:
+
+    with BuildContext(is_verbose=True) as context:
+        make(...)
+
+Anything that needs the context during a build (e.g. WarningDisplay) looks up the active context
+of the current thread; if no context has been activated, a shared default context is used.
+"""
+
+import os
+import threading
+
+from collections import OrderedDict
+from functools import wraps
+
+
+class BuildContext:
+    """ Represents the state of a single build. """
+
+    def __init__(self,
+                 is_verbose: bool=False,
+                 is_interactive: bool=True,
+                 engine: str='reference',
+                 should_cache_datasources: bool=False,
+                 profile=None,
+                 trace=None,
+                 memory_report=None,
+                 report=None,
+                 progress=None):
+        # whether to display warnings, or only errors and info
+        self.is_verbose = is_verbose
+        # when not interactive, no question is ever asked (e.g. when building in batches)
+        self.is_interactive = is_interactive
+        # the name of the engine that cards are rendered by (see Engines)
+        self.engine = engine
+        # whether parsed datasources are kept on disk for later builds (see load_datasource())
+        self.should_cache_datasources = should_cache_datasources
+        # the profile that phases of the build are timed by, if any (see BuildProfile)
+        self.profile = profile
+        # the trace that spans of work are recorded on, if any (see BuildTrace)
+        self.trace = trace
+        # the report that memory used by the build is measured by, if any (see BuildMemoryReport)
+        self.memory_report = memory_report
+        # the report that the outcome of the build is recorded in, if any (see BuildReport)
+        self.report = report
+        # the meter that the progress of the build is shown by, if any (see BuildProgress)
+        self.progress = progress
+
+        # every diagnostic raised so far (see Diagnostic), in the order they were first raised
+        self.diagnostics = OrderedDict()
+
+        self.displayed_count = 0
+
+        self.warning_count = 0
+        self.error_count = 0
+
+        # incremented for every warning or error raised; including any that were not displayed
+        self.raised_count = 0
+
+        # every file of the output, mapped to its size and how it came to be there
+        self.output_files = OrderedDict()
+
+    def __enter__(self) -> 'BuildContext':
+        active_contexts().append(self)
+
+        return self
+
+    def __exit__(self, exception_type, exception, traceback) -> None:
+        active_contexts().pop()
+
+    def record_output_file(self, path: str, state: str) -> None:
+        """ Record a file of the output, as it is written.
+
+            The state tells how the file came to be there; i.e. 'written', 'copied', 'overwritten'
+            or 'skipped' (if an identical file already existed).
+        """
+
+        self.output_files[path] = (os.path.getsize(path), state)
+
+    def record_copied_file(self, path: str, was_copied: bool, already_existed: bool) -> None:
+        """ Record a file of the output, as it is copied (see copy_file_if_necessary()). """
+
+        if was_copied:
+            self.record_output_file(path, 'overwritten' if already_existed else 'copied')
+        elif already_existed and path not in self.output_files:
+            # the same file is often copied several times during a build;
+            # only the first attempt counts
+            self.record_output_file(path, 'skipped')
+
+    def output_size(self) -> int:
+        """ Return the total size of every file of the output (in bytes). """
+
+        return sum(size for size, _ in self.output_files.values())
+
+    def derived(self) -> 'BuildContext':
+        """ Return a new context with the same settings, but none of the state. """
+
+        return BuildContext(self.is_verbose, self.is_interactive, self.engine,
+                            self.should_cache_datasources)
+
+    @staticmethod
+    def current() -> 'BuildContext':
+        """ Return the active context of the current thread. """
+
+        contexts = active_contexts()
+
+        return contexts[-1] if len(contexts) > 0 else DEFAULT_CONTEXT
+
+
+# the context used when no other context has been activated; e.g. before a build has started
+DEFAULT_CONTEXT = BuildContext()
+
+_THREAD_STATE = threading.local()
+
+
+def active_contexts() -> list:
+    """ Return the stack of contexts activated on the current thread. """
+
+    if not hasattr(_THREAD_STATE, 'contexts'):
+        _THREAD_STATE.contexts = []
+
+    return _THREAD_STATE.contexts
+
+
+def within_build_context(build_function):
+    """ Run a build function within a context of its own.
+
+        The context can be specified by passing it as the 'context' keyword argument; otherwise a
+        new context is made, carrying over the settings (but not the state) of the active context.
+    """
+
+    @wraps(build_function)
+    def build(*args, context: BuildContext=None, **kwargs):
+        if context is None:
+            context = BuildContext.current().derived()
+
+        with context:
+            return build_function(*args, **kwargs)
+
+    return build
@@ -0,0 +1,651 @@
+# coding=utf-8
+
+"""
+This module provides a columnar store of the rows in a datasource.
+
+Every datasource has a single header; so the columns of a datasource are classified only once
+(e.g. whether a column is excluded, or only intended for the back of a card), instead of once
+for every row. Cells are stored in an array per column, and each row is only a lightweight view
+into those arrays; no dict is made for any row.
+
+Each datasource is loaded only once per build, and the loaded datasource is then shared by
+everything that needs it; i.e. the check for card backs, the automatic template, the rendering
+of each row and any reference to another row. A datasource too large to be held in memory is
+streamed instead; reading it again whenever its rows are needed.
+
+A datasource held in memory can also be kept on disk (as plain JSON, in the cache directory of
+the user or the one specified for rendered cards), already parsed, so that it is only parsed
+again once it changes; i.e. once its size or time of modification changes, and its content has
+actually changed too.
+
+Datasources are read the same way, whatever their format (see reader.py).
+
+Every datasource of a build is also indexed, so that a row can reference rows in any other
+datasource; by row index or by the key it holds in a column (see DatasourceIndex).
+"""
+
+import os
+import sys
+import json
+import bisect
+import hashlib
+import tempfile
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from cards.column import Column, Row, size_identifier_from_columns
+from cards.reader import (
+    DatasourceReader, DatasourceReadError, get_reader, read_stdin, is_stdin_data_path
+)
+from cards.warning import WarningDisplay, WarningContext
+from cards.constants import ColumnDescriptors
+from cards.util import get_user_cache_path
+from cards.version import __version__
+
+# the size (in bytes) of a datasource from which it is streamed instead of held in memory
+STREAMING_THRESHOLD = 64 * 1024 * 1024
+
+# the name of the directory that parsed datasources are kept in (within a cache directory)
+DATASOURCE_CACHE_DIRECTORY = 'datasources'
+
+# bump whenever the layout of a parsed datasource changes
+DATASOURCE_CACHE_FORMAT = 2
+
+
+class ColumnLayout:  # pylint: disable=too-few-public-methods
+    """ Represents the columns of a datasource, as classified from its header. """
+
+    def __init__(self, column_names: list):
+        # the names are interned, so that every comparison with a name is just as cheap
+        self.column_names = [sys.intern(column_name) for column_name in column_names]
+
+        # each column name mapped to the position of its cells; like with a dict made from a row,
+        # any duplicate column keeps the position of its first occurrence, but the cells of its last
+        self.positions = OrderedDict()
+
+        for position, column_name in enumerate(self.column_names):
+            self.positions[column_name] = position
+
+        usable_columns = [column for column in
+                          (Column(column_name) for column_name in self.positions)
+                          if not column.is_excluded()
+                          and not column.is_special()]
+
+        # the columns fit for both the front and back of a card
+        self.both = OrderedDict((column.name, self.positions[column.name])
+                                for column in usable_columns
+                                if not column.is_back_only() and not column.is_front_only())
+
+        # the columns fit for the front of a card; any front-only column takes precedence
+        self.front = OrderedDict(self.both)
+        self.front.update((column.name[:-len(ColumnDescriptors.FRONT_ONLY)],
+                           self.positions[column.name])
+                          for column in usable_columns if column.is_front_only())
+
+        # the columns fit for the back of a card; any back-only column takes precedence
+        self.back = OrderedDict(self.both)
+        self.back.update((column.name[:-len(ColumnDescriptors.BACK_ONLY)],
+                          self.positions[column.name])
+                         for column in usable_columns if column.is_back_only())
+
+
+class RowData(Mapping):
+    """ Provides the cells of a single row in a datasource, by column name. """
+
+    __slots__ = ('columns', 'position', 'positions')
+
+    def __init__(self, columns: list, position: int, positions: dict):
+        self.columns = columns  # the cells of every column
+        self.position = position  # the position of this row in every column
+        self.positions = positions  # each column name mapped to the position of its cells
+
+    def __getitem__(self, column_name: str) -> str:
+        return self.columns[self.positions[column_name]][self.position]
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, column_name) -> bool:
+        return column_name in self.positions
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+
+        if not isinstance(other, Mapping) or len(other) != len(self):
+            return False
+
+        return dict(self.items()) == dict(other.items())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def get(self, column_name: str, default=None) -> str:
+        position = self.positions.get(column_name)
+
+        return self.columns[position][self.position] if position is not None else default
+
+    def values(self):
+        return [self.columns[position][self.position] for position in self.positions.values()]
+
+    def items(self):
+        return [(column_name, self.columns[position][self.position])
+                for column_name, position in self.positions.items()]
+
+    def viewed_as(self, positions: dict) -> 'RowData':
+        """ Return a view of the same row, but only of the specified columns. """
+
+        return RowData(self.columns, self.position, positions)
+
+
+class Datasource:
+    """ Represents the rows of a datasource, stored by column. """
+
+    is_streamed = False
+
+    def __init__(self, data_path: str, column_names: list, size_identifier: str=None):
+        self.data_path = data_path
+
+        # the column names as they are (but stripped of excess whitespace and any size identifier)
+        self.column_names = column_names
+        # the card size identifier of the template column, if any (e.g. '@template:jumbo')
+        self.size_identifier = size_identifier
+
+        self.layout = ColumnLayout(column_names)
+
+        # the cells of every column; one array per column, holding a cell for each stored row
+        self.columns = [[] for _ in self.layout.column_names]
+
+        # the row index of each stored row (e.g. the first row of data is #2)
+        self.row_indices = []
+
+        # the row index of each excluded row; these rows are not stored
+        self.excluded_row_indices = set()
+
+        # the row index of each row that has more cells than there are columns, and how many more
+        self.extra_cells = []
+
+        # the hash of the content, if it can not be read again from the data path (e.g. stdin)
+        self.content_hash = None
+
+        # the index of every datasource in the same build, if any (see DatasourceIndex)
+        self.index = None
+
+    def __len__(self):
+        return len(self.row_indices)
+
+    def estimated_rows(self) -> int:
+        """ Return the number of rows in the datasource; excluded rows not included. """
+
+        return len(self.row_indices)
+
+    def append(self, cells: list, row_index: int) -> None:
+        """ Store a row of cells; any missing cell is stored as None. """
+
+        for position, column in enumerate(self.columns):
+            column.append(cells[position] if position < len(cells) else None)
+
+        self.row_indices.append(row_index)
+
+    def row(self, position: int) -> Row:
+        """ Return the stored row at a position. """
+
+        return Row(RowData(self.columns, position, self.layout.positions),
+                   self.data_path, self.row_indices[position],
+                   layout=self.layout, datasource=self)
+
+    def rows(self):
+        """ Return an iterator for every stored row, in order. """
+
+        return (self.row(position) for position in range(len(self.row_indices)))
+
+    def close(self) -> None:
+        """ Release anything held open for reading the datasource; every row is already held. """
+
+    def row_at(self, row_index: int) -> (Row, bool):
+        """ Return the row at a row index (if any), and whether that row is excluded. """
+
+        if row_index in self.excluded_row_indices:
+            return None, True
+
+        # row indices are always stored in order, so the position can be searched for
+        position = bisect.bisect_left(self.row_indices, row_index)
+
+        if position < len(self.row_indices) and self.row_indices[position] == row_index:
+            return self.row(position), False
+
+        return None, False
+
+
+class StreamingDatasource:
+    """ Represents the rows of a datasource that is too large to be held in memory.
+
+        The rows are read (see DatasourceReader) every time they are needed; i.e. nothing but
+        the column names are kept.
+    """
+
+    is_streamed = True
+
+    def __init__(self,
+                 reader: DatasourceReader,
+                 column_names: list,
+                 size_identifier: str=None):
+        self.reader = reader
+        self.data_path = reader.data_path
+        self.content_hash = reader.content_hash
+
+        # the index of every datasource in the same build, if any (see DatasourceIndex)
+        self.index = None
+
+        self.column_names = column_names
+        self.size_identifier = size_identifier
+
+        self.layout = ColumnLayout(column_names)
+
+        # whether the rows have been read before; warnings are only raised the first time
+        self.is_read = False
+
+    def estimated_rows(self) -> int:
+        """ Return an estimate of the number of rows in the datasource. """
+
+        return self.reader.estimated_rows()
+
+    def close(self) -> None:
+        """ Release anything held open for reading the datasource (see DatasourceReader.close());
+            no rows can be read after.
+        """
+
+        self.reader.close()
+
+    def _row(self, cells: list, row_index: int) -> Row:
+        # a row is held as a datasource of its own, only storing the cells of that single row
+        columns = [[cells[position] if position < len(cells) else None]
+                   for position in range(len(self.layout.column_names))]
+
+        return Row(RowData(columns, 0, self.layout.positions),
+                   self.data_path, row_index,
+                   layout=self.layout, datasource=self)
+
+    def rows(self):
+        """ Return an iterator for every row, in order, as read from the datasource. """
+
+        should_warn = not self.is_read
+
+        self.is_read = True
+
+        column_count = len(self.column_names)
+
+        try:
+            for cells, row_index, is_excluded in self.reader.read_rows():
+                if is_excluded:
+                    continue
+
+                if should_warn and len(cells) > column_count:
+                    WarningDisplay.row_has_extra_cells(
+                        WarningContext(os.path.basename(self.data_path), row_index),
+                        len(cells) - column_count)
+
+                yield self._row(cells, row_index)
+        except DatasourceReadError as error:
+            if should_warn:
+                WarningDisplay.unreadable_datasource_error(
+                    WarningContext(os.path.basename(self.data_path)), str(error))
+
+    def row_at(self, row_index: int) -> (Row, bool):
+        """ Return the row at a row index (if any), and whether that row is excluded. """
+
+        try:
+            cells, is_excluded = self.reader.read_row(row_index)
+        except DatasourceReadError:
+            # any error has already been warned about when reading every row
+            return None, False
+
+        return (self._row(cells, row_index) if cells is not None else None), is_excluded
+
+
+def read_header(reader: DatasourceReader) -> (list, str):
+    """ Return the column names and card size identifier (if any) of a datasource.
+
+        The column names are lower-cased and stripped of excess whitespace and any size identifier.
+    """
+
+    column_names = [column_name.lower().strip() for column_name in reader.read_column_names()]
+
+    size_identifier, column_names = size_identifier_from_columns(column_names)
+
+    return column_names, size_identifier
+
+
+def read_datasource(reader: DatasourceReader) -> Datasource:
+    """ Read every row from a datasource into memory. """
+
+    column_names, size_identifier = read_header(reader)
+
+    datasource = Datasource(reader.data_path, column_names, size_identifier)
+    datasource.content_hash = reader.content_hash
+
+    for cells, row_index, is_excluded in reader.read_rows():
+        if is_excluded:
+            datasource.excluded_row_indices.add(row_index)
+
+            continue
+
+        if len(cells) > len(column_names):
+            datasource.extra_cells.append((row_index, len(cells) - len(column_names)))
+
+        datasource.append(cells, row_index)
+
+    return datasource
+
+
+def warn_extra_cells(datasource: Datasource) -> None:
+    """ Warn about every row of a datasource that has more cells than there are columns. """
+
+    for row_index, extra_cells_count in datasource.extra_cells:
+        WarningDisplay.row_has_extra_cells(
+            WarningContext(os.path.basename(datasource.data_path), row_index),
+            extra_cells_count)
+
+
+def get_content_hash(path: str) -> str:
+    """ Return the hash of the content of a file. """
+
+    content_hash = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
+
+
+def get_datasource_cache_directory(cache_path: str=None) -> str:
+    """ Return the path of the directory that parsed datasources are kept in.
+
+        Parsed datasources are kept with the rendered cards, if a directory is specified for those
+        (see RenderCache), and are then evicted like any rendered card; otherwise they are kept in
+        the cache directory of the user.
+    """
+
+    return os.path.join(cache_path if cache_path is not None else get_user_cache_path(),
+                        DATASOURCE_CACHE_DIRECTORY)
+
+
+def get_datasource_cache_path(data_path: str, cache_directory: str) -> str:
+    """ Return the path of the file that a parsed datasource is kept in. """
+
+    # datasources of the same name in different directories must never share a file
+    path_hash = hashlib.sha256(os.path.abspath(data_path).encode('utf-8')).hexdigest()
+
+    return os.path.join(cache_directory, path_hash + '.json')
+
+
+def read_cached_datasource(data_path: str, cache_directory: str) -> Datasource:
+    """ Return the parsed datasource kept for a path, unless it is missing or out of date. """
+
+    cache_path = get_datasource_cache_path(data_path, cache_directory)
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            entry = json.load(cache_file)
+
+        if (entry['format'] != DATASOURCE_CACHE_FORMAT or
+                entry['version'] != __version__ or
+                entry['data_path'] != os.path.abspath(data_path)):
+            return None
+
+        stat = os.stat(data_path)
+
+        if entry['size'] != stat.st_size:
+            # the content has certainly changed
+            return None
+
+        if entry['modified_at'] != stat.st_mtime_ns:
+            # the content might have changed; e.g. the file might just have been touched
+            if entry['content_hash'] != get_content_hash(data_path):
+                return None
+
+            # the content is the same; so avoid hashing it again next time
+            entry['modified_at'] = stat.st_mtime_ns
+
+            write_cache_entry(cache_path, entry)
+
+        try:
+            # mark the entry as recently used (see RenderCache.evict())
+            os.utime(cache_path, None)
+        except OSError:
+            pass
+
+        datasource = Datasource(data_path, entry['column_names'], entry['size_identifier'])
+
+        if len(entry['columns']) != len(datasource.columns):
+            return None
+
+        datasource.columns = entry['columns']
+        datasource.row_indices = entry['row_indices']
+        datasource.excluded_row_indices = set(entry['excluded_row_indices'])
+        datasource.extra_cells = [(row_index, extra_cells_count)
+                                  for row_index, extra_cells_count in entry['extra_cells']]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        # not kept, or kept in a way that can not be read anymore; in any case, parse it again
+        return None
+
+    return datasource
+
+
+def write_cached_datasource(datasource: Datasource, cache_directory: str) -> None:
+    """ Keep a parsed datasource on disk, along with what is needed to tell whether it changed. """
+
+    try:
+        stat = os.stat(datasource.data_path)
+        content_hash = get_content_hash(datasource.data_path)
+    except OSError:
+        return
+
+    write_cache_entry(get_datasource_cache_path(datasource.data_path, cache_directory), {
+        'format': DATASOURCE_CACHE_FORMAT,
+        'version': __version__,
+        'data_path': os.path.abspath(datasource.data_path),
+        'size': stat.st_size,
+        'modified_at': stat.st_mtime_ns,
+        'content_hash': content_hash,
+        'column_names': datasource.column_names,
+        'size_identifier': datasource.size_identifier,
+        'columns': datasource.columns,
+        'row_indices': datasource.row_indices,
+        'excluded_row_indices': sorted(datasource.excluded_row_indices),
+        'extra_cells': datasource.extra_cells
+    })
+
+
+def write_cache_entry(cache_path: str, entry: dict) -> None:
+    directory = os.path.dirname(cache_path)
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+
+        # write to a temporary file first and then move it in place, so that
+        # any other build reading the entry never sees a partially written file
+        handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+        with os.fdopen(handle, 'w', encoding='utf-8') as cache_file:
+            json.dump(entry, cache_file, separators=(',', ':'))
+
+        os.replace(temporary_path, cache_path)
+    except (OSError, ValueError, TypeError):
+        # a cache is a nice-to-have; never fail a build because of it
+        pass
+
+
+def load_datasource(data_path: str, streaming: bool=None, cache_directory: str=None):
+    """ Return the datasource at a path; either held in memory, or streamed.
+
+        Unless specified, a datasource is streamed only if it is larger than the threshold, or if
+        it is always streamed in its format (e.g. an SQLite database).
+
+        If a cache directory is specified, a datasource held in memory is kept there once parsed,
+        and is read from there for as long as it has not changed. A streamed datasource is never
+        cached.
+
+        A datasource piped through stdin (see read_stdin()) is never cached.
+
+        If the datasource can not be read, None is returned.
+    """
+
+    context = WarningContext(os.path.basename(data_path))
+
+    try:
+        if is_stdin_data_path(data_path):
+            reader = read_stdin(data_path)
+            # there is no file to tell whether the parsed datasource has changed by
+            cache_directory = None
+        else:
+            reader = get_reader(data_path)
+
+        if reader.is_always_streamed:
+            streaming = True
+        elif streaming is None:
+            streaming = os.path.getsize(reader.file_path) > STREAMING_THRESHOLD
+
+        if streaming:
+            try:
+                column_names, size_identifier = read_header(reader)
+            except DatasourceReadError:
+                reader.close()
+
+                raise
+
+            # the reader is kept open for as long as the datasource is used
+            return StreamingDatasource(reader, column_names, size_identifier)
+
+        try:
+            datasource = (read_cached_datasource(data_path, cache_directory)
+                          if cache_directory is not None
+                          else None)
+
+            if datasource is None:
+                datasource = read_datasource(reader)
+
+                if cache_directory is not None:
+                    write_cached_datasource(datasource, cache_directory)
+        finally:
+            # every row is now held in memory; the reader is not needed anymore
+            reader.close()
+    except DatasourceReadError as error:
+        WarningDisplay.unreadable_datasource_error(context, str(error))
+
+        return None
+
+    # warnings are raised whether parsed just now or not
+    warn_extra_cells(datasource)
+
+    return datasource
+
+
+def load_datasources(data_paths: list,
+                     streaming: bool=None,
+                     cache_directory: str=None) -> OrderedDict:
+    """ Return every datasource that can be found and read, loaded only once each, by path. """
+
+    datasources = OrderedDict()
+
+    for data_path in OrderedDict.fromkeys(data_paths):
+        if os.path.isfile(data_path) or is_stdin_data_path(data_path):
+            datasource = load_datasource(data_path, streaming, cache_directory)
+
+            if datasource is not None:
+                datasources[data_path] = datasource
+
+    return datasources
+
+
+class DatasourceIndex:
+    """ Represents every datasource of a build, for looking up rows in any of them.
+
+        A row is looked up by the path of its datasource (relative to the referencing datasource)
+        and either its row index or the value in a key column; e.g. 'factions.csv#4' or
+        'factions.csv#name=Elves'. A datasource that is referenced, but not built (e.g. one
+        only holding shared data), is loaded the first time it is referenced; like any other
+        datasource, only once.
+    """
+
+    def __init__(self, datasources: OrderedDict=None, cache_directory: str=None):
+        # the directory that parsed datasources are kept in, if any (see load_datasource())
+        self.cache_directory = cache_directory
+
+        # every datasource by its absolute path; None if it could not be loaded
+        self.datasources = OrderedDict()
+
+        # the row index of every key in a column of a datasource; each made once first needed
+        self.keys = {}
+
+        # the path of every datasource loaded only because it was referenced
+        self.referenced_data_paths = []
+
+        if datasources is not None:
+            for data_path, datasource in datasources.items():
+                self.add(data_path, datasource)
+
+    @staticmethod
+    def indexed_path(data_path: str) -> str:
+        return os.path.normcase(os.path.abspath(data_path))
+
+    def add(self, data_path: str, datasource) -> None:
+        """ Add a loaded datasource to the index. """
+
+        if datasource is not None:
+            datasource.index = self
+
+        self.datasources[DatasourceIndex.indexed_path(data_path)] = datasource
+
+    def datasource(self, data_path: str):
+        """ Return the datasource at a path, loading it unless already loaded.
+
+            If the datasource can not be found or read, None is returned.
+        """
+
+        indexed_path = DatasourceIndex.indexed_path(data_path)
+
+        if indexed_path not in self.datasources:
+            self.add(data_path, load_datasource(data_path, cache_directory=self.cache_directory)
+                     if os.path.isfile(data_path) else None)
+
+            self.referenced_data_paths.append(data_path)
+
+        return self.datasources[indexed_path]
+
+    def close(self) -> None:
+        """ Close every datasource in the index (see Datasource.close()). """
+
+        for datasource in self.datasources.values():
+            if datasource is not None:
+                datasource.close()
+
+    def row_index_of(self, datasource, key_column: str, key: str) -> int:
+        """ Return the row index of the first row holding a key in a column; None if no row does.
+
+            Every key in the column is indexed the first time any key in it is looked up.
+        """
+
+        indexed_column = (DatasourceIndex.indexed_path(datasource.data_path), key_column)
+
+        keys = self.keys.get(indexed_column)
+
+        if keys is None:
+            keys = {}
+
+            if key_column in datasource.column_names:
+                for row in datasource.rows():
+                    content = row.data.get(key_column)
+
+                    if content is not None:
+                        # the first row holding a key is the one referenced
+                        keys.setdefault(content.strip(), row.row_index)
+
+            self.keys[indexed_column] = keys
+
+        return keys.get(key.strip())
@@ -0,0 +1,228 @@
+# coding=utf-8
+
+"""
+This module provides the engines that cards can be rendered by.
+
+The reference engine renders cards exactly as template.py always has. The fast engine renders
+cards identically, but avoids repeating work that never changes from one card to the next;
+e.g. every definition is resolved only once per build, instead of once for every card.
+
+Both engines must always produce the exact same output, and raise the same warnings; this is
+verified by rendering every test and example project (and a number of generated projects) with
+both engines and comparing the results (see test/test_engine.py).
+"""
+
+import re
+
+from cards.template import (
+    Template, TemplateRenderData, fill_card_fragment, fill_include_fields, fill_empty_fields,
+    fill_image_fields, fill_date_fields, fill_partial_definition,
+    resolve_column_content, resolve_column_field
+)
+
+from cards.column import Row, get_column_contentd, get_definition_contentd
+from cards.resource import transformed_image_paths
+from cards.constants import TemplateFields
+
+# any character that has a special meaning in a pattern
+PATTERN_CHARACTERS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+
+class Engines:  # pylint: disable=too-few-public-methods
+    """ Provides the names of every available engine. """
+
+    REFERENCE = 'reference'
+    FAST = 'fast'
+
+    ALL = [REFERENCE, FAST]
+
+
+class ReferenceEngine:  # pylint: disable=too-few-public-methods
+    """ Renders cards using the reference implementation (see template.py). """
+
+    name = Engines.REFERENCE
+
+    @staticmethod
+    def fill_card_fragment(template: Template,
+                           row: Row,
+                           definitions: dict) -> (str, TemplateRenderData):
+        return fill_card_fragment(template, row, definitions)
+
+
+class FastEngine:
+    """ Renders cards exactly like the reference engine, but resolves each definition only once.
+
+        The resolution of a definition only depends on the definitions themselves; never on the
+        card being rendered. Any other work is only skipped when it would certainly do nothing;
+        e.g. filling a field that does not occur anywhere in the template.
+    """
+
+    name = Engines.FAST
+
+    def __init__(self):
+        self.definitions = None
+
+        # every definition resolved so far, mapped to its resolved content and resolution data
+        self.resolved_definitions = {}
+
+        # the compiled pattern of every field filled so far
+        self.field_patterns = {}
+
+    def resolved_definition(self, definition: str, definitions: dict) -> tuple:
+        """ Return the resolved content and resolution data of a definition. """
+
+        if definitions is not self.definitions:
+            # resolutions only hold for the definitions they were resolved in
+            self.definitions = definitions
+            self.resolved_definitions = {}
+
+        if definition not in self.resolved_definitions:
+            self.resolved_definitions[definition] = get_definition_contentd(
+                definition, in_definitions=definitions,
+                content_resolver=resolve_column_content, field_resolver=resolve_column_field)
+
+        return self.resolved_definitions[definition]
+
+    def fill_each(self,
+                  field_inner_content: str,
+                  field_value: str,
+                  template: Template) -> int:
+        """ Populate all matching template fields in the template (see template.fill_each()). """
+
+        if (field_inner_content not in template.content and
+                PATTERN_CHARACTERS.search(field_inner_content) is None):
+            # the field can not possibly occur in the template;
+            # note that the inner content is a pattern, so this only holds when it is literal
+            return 0
+
+        search = self.field_patterns.get(field_inner_content)
+
+        if search is None:
+            search = re.compile(r'{{\s*' + field_inner_content + r'\s*}}')
+
+            self.field_patterns[field_inner_content] = search
+
+        template.content, occurences = search.subn(
+            field_value if field_value is not None else '', template.content)
+
+        return occurences
+
+    def fill_definitions(self,
+                         definitions: dict,
+                         template: Template) -> set:
+        """ Populate all definition fields in the template (see template.fill_definitions()). """
+
+        referenced_definitions = []
+
+        for definition in definitions:
+            resolved_definition_value, resolution_data = self.resolved_definition(
+                definition, definitions)
+
+            definite_occurences = self.fill_each(definition, resolved_definition_value, template)
+
+            if definite_occurences > 0:
+                referenced_definitions.append(definition)
+                referenced_definitions.extend(
+                    list(resolution_data.definition_references))
+
+        for definition in definitions:
+            if (definition not in template.content and
+                    PATTERN_CHARACTERS.search(definition) is None):
+                # a partial definition can only occur where the definition itself does
+                continue
+
+            resolved_definition_value, _ = self.resolved_definition(definition, definitions)
+
+            partial_occurences = fill_partial_definition(
+                definition, resolved_definition_value, template)
+
+            if partial_occurences > 0:
+                referenced_definitions.append(definition)
+
+        return set(referenced_definitions)
+
+    def fill_template(self,
+                      template: Template,
+                      row: Row,
+                      definitions: dict) -> TemplateRenderData:
+        """ Populate all template fields in a template (see template.fill_template()). """
+
+        stripped_styles = fill_include_fields(template)
+
+        fill_empty_fields(template)
+
+        image_paths_from_template = fill_image_fields(template)
+        image_paths_from_template = transformed_image_paths(
+            image_paths_from_template, template.path)
+
+        unused_columns = []
+
+        column_references_in_data = []
+        discovered_definition_refs = []
+
+        for column in row.data:
+            field_content, resolution_data = get_column_contentd(
+                column, row, definitions,
+                content_resolver=resolve_column_content,
+                field_resolver=resolve_column_field)
+
+            occurences = self.fill_each(column, field_content, template)
+
+            if occurences == 0:
+                unused_columns.append(column)
+            else:
+                column_references_in_data.extend(list(resolution_data.column_references))
+                discovered_definition_refs.extend(list(resolution_data.definition_references))
+
+        image_paths_from_datasource = fill_image_fields(template)
+        image_paths_from_datasource = transformed_image_paths(
+            image_paths_from_datasource, row.data_path)
+
+        discovered_definition_refs.extend(
+            self.fill_definitions(definitions, template))
+
+        fill_date_fields(template)
+
+        unknown_fields = [field.inner_content for field in template
+                          if (field.inner_content != TemplateFields.CARDS_TOTAL and
+                              field.inner_content != TemplateFields.CARDS_TOTAL_IN_CONTEXT)]
+
+        column_references = set(column_references_in_data)
+
+        unused_columns = list(set(unused_columns) - column_references)
+
+        return TemplateRenderData(
+            image_paths=set(image_paths_from_template + image_paths_from_datasource),
+            unknown_fields=set(unknown_fields),
+            unused_fields=set(unused_columns),
+            referenced_definitions=set(discovered_definition_refs),
+            embedded_styles=stripped_styles)
+
+    def fill_card_fragment(self,
+                           template: Template,
+                           row: Row,
+                           definitions: dict) -> (str, TemplateRenderData):
+        """ Return the contents of a card, leaving index fields as is
+            (see template.fill_card_fragment()).
+        """
+
+        render_data = self.fill_template(template, row, definitions)
+
+        self.fill_each(TemplateFields.CARD_ROW_INDEX, str(row.row_index), template)
+        self.fill_each(TemplateFields.CARD_TEMPLATE_PATH, template.path, template)
+
+        render_data.unknown_fields -= {TemplateFields.CARD_INDEX,
+                                       TemplateFields.CARD_ROW_INDEX,
+                                       TemplateFields.CARD_COPY_INDEX,
+                                       TemplateFields.CARD_TEMPLATE_PATH}
+
+        return template.content, render_data
+
+
+def create_engine(name: str):
+    """ Return a new engine by name; the reference engine, if the name is unknown. """
+
+    if name == Engines.FAST:
+        return FastEngine()
+
+    return ReferenceEngine()
@@ -0,0 +1,655 @@
+# coding=utf-8
+
+"""
+This module provides functions for laying out resolved cards on pages.
+
+Building cards happens in two stages: first, every card is resolved from its datasource into
+a card fragment (see ResolvedCards), and then those fragments are laid out on pages. Only the
+latter stage depends on options like card size, backs, page breaks or page sections, so
+keeping the resolved cards around makes it possible to re-run the layout on its own.
+
+When the output is written to a stream, the stages can also be run at once instead; laying out
+each card as soon as it is resolved (see PageLayout.add_card()), so that no card is kept.
+"""
+
+import os
+import html
+import math
+import json
+
+from cards.template import Template, fill_each, fill_card_index, deferred_total
+from cards.templatefield import TemplateField
+
+from cards.constants import TemplateFields, CardSizes, CardSize, DateField
+from cards.warning import WarningDisplay, WarningContext
+from cards.reader import is_stdin_data_path
+
+from cards.util import create_directories_if_necessary
+
+from cards.version import __version__
+
+# bump whenever the serialized format of resolved cards changes
+RESOLVED_CARDS_FORMAT = 3
+
+
+class ResolvedCard:  # pylint: disable=too-few-public-methods
+    """ Represents a card that has been resolved from a row in a datasource. """
+
+    def __init__(self,
+                 row_index: int,
+                 count: int,
+                 front: str,
+                 back: str=None):
+        self.row_index = row_index  # the row index of the card in its datasource
+        self.count = count  # the number of copies of the card
+        self.front = front  # the card fragment, with any index fields left unresolved
+        self.back = back  # the back fragment, if any
+
+
+class ResolvedDatasource:  # pylint: disable=too-few-public-methods
+    """ Represents all cards that have been resolved from a single datasource. """
+
+    def __init__(self,
+                 context: str,
+                 data_path: str,
+                 size_identifier: str=None,
+                 has_backs: bool=False,
+                 cards: list=None):
+        self.context = context
+        self.data_path = data_path
+        self.size_identifier = size_identifier  # the card size specified by the datasource, if any
+        self.has_backs = has_backs  # whether each card has a back fragment
+        self.cards = cards if cards is not None else []
+        # the number of cards (and copies) that were laid out as soon as they were resolved,
+        # instead of being kept (see resolve_cards())
+        self.cards_laid_out = 0
+        self.cards_laid_out_unique = 0
+
+    def card_size(self, default_card_size: CardSize) -> CardSize:
+        """ Return the size of the cards in this datasource. """
+
+        card_size = CardSizes.get_card_size(self.size_identifier)
+
+        return card_size if card_size is not None else default_card_size
+
+    def cards_total(self) -> int:
+        """ Return the total number of cards, including copies. """
+
+        return sum(card.count for card in self.cards) + self.cards_laid_out
+
+    def cards_total_unique(self) -> int:
+        """ Return the total number of unique cards; i.e. not counting copies. """
+
+        return len(self.cards) + self.cards_laid_out_unique
+
+
+class ResolvedCards:
+    """ Represents every card resolved during a build, and anything needed to lay them out. """
+
+    def __init__(self):
+        self.datasources = []
+        # whether any datasource specifies card backs (even if backs were not rendered)
+        self.contains_backs = False
+        # whether back fragments were rendered at all
+        self.backs_rendered = False
+        self.is_preview = False
+        self.definitions = {}
+        self.referenced_definitions = set()
+        # ordered lists of (template path, style, position) and (context path, image paths)
+        self.embedded_styles = []
+        self.image_paths = []
+        # the paths used to resolve the cards, mapped to their (size, modification time)
+        self.inputs = {}
+        self.data_paths = []
+        self.definitions_path = None
+        self.date = DateField.TODAY.isoformat()
+        # the index and count of the shard that these cards were resolved for, if any
+        self.shard = None
+
+    def cards_total_unique(self) -> int:
+        """ Return the total number of unique cards; i.e. not counting copies. """
+
+        return sum(datasource.cards_total_unique() for datasource in self.datasources)
+
+    def record_inputs(self, paths: list) -> None:
+        """ Record the current state of each path that the resolved cards depend on. """
+
+        self.inputs = {path: input_state(path) for path in paths if path is not None}
+
+    def is_current(self,
+                   data_paths: list,
+                   definitions_path: str,
+                   is_preview: bool,
+                   should_disable_backs: bool) -> bool:
+        """ Determine whether the resolved cards are still valid for a build. """
+
+        if any(is_stdin_data_path(data_path) for data_path in data_paths):
+            # whatever was piped through stdin is gone; so there is no telling whether it changed
+            return False
+
+        if (self.data_paths != list(data_paths) or
+                self.definitions_path != definitions_path or
+                self.date != DateField.TODAY.isoformat()):
+            return False
+
+        if self.is_preview and not is_preview:
+            # preview builds can be laid out from a full build, but not the other way around
+            return False
+
+        if not should_disable_backs and not self.backs_rendered:
+            # the backs are needed, but were never resolved
+            return False
+
+        return all(input_state(path) == state for path, state in self.inputs.items())
+
+    def to_dict(self) -> dict:
+        return {
+            'format': RESOLVED_CARDS_FORMAT,
+            'program_version': __version__,
+            'date': self.date,
+            'data_paths': self.data_paths,
+            'definitions_path': self.definitions_path,
+            'inputs': self.inputs,
+            'is_preview': self.is_preview,
+            'contains_backs': self.contains_backs,
+            'backs_rendered': self.backs_rendered,
+            'shard': self.shard,
+            'definitions': self.definitions,
+            'referenced_definitions': sorted(self.referenced_definitions),
+            'embedded_styles': self.embedded_styles,
+            'image_paths': self.image_paths,
+            'datasources': [{
+                'context': datasource.context,
+                'path': datasource.data_path,
+                'size': datasource.size_identifier,
+                'backs': datasource.has_backs,
+                'cards': [[card.row_index, card.count, card.front, card.back]
+                          for card in datasource.cards]
+            } for datasource in self.datasources]
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'ResolvedCards':
+        resolved_cards = ResolvedCards()
+
+        resolved_cards.date = data['date']
+        resolved_cards.data_paths = data['data_paths']
+        resolved_cards.definitions_path = data['definitions_path']
+        resolved_cards.inputs = {path: tuple(state) if state is not None else None
+                                 for path, state in data['inputs'].items()}
+        resolved_cards.is_preview = data['is_preview']
+        resolved_cards.contains_backs = data['contains_backs']
+        resolved_cards.backs_rendered = data['backs_rendered']
+        resolved_cards.shard = tuple(data['shard']) if data['shard'] is not None else None
+        resolved_cards.definitions = data['definitions']
+        resolved_cards.referenced_definitions = set(data['referenced_definitions'])
+        resolved_cards.embedded_styles = [tuple(style) for style in data['embedded_styles']]
+        resolved_cards.image_paths = [tuple(paths) for paths in data['image_paths']]
+        resolved_cards.datasources = [ResolvedDatasource(
+            datasource['context'], datasource['path'],
+            datasource['size'], datasource['backs'],
+            [ResolvedCard(*card) for card in datasource['cards']]
+        ) for datasource in data['datasources']]
+
+        return resolved_cards
+
+    def save(self, path: str) -> None:
+        """ Write the resolved cards to a file. """
+
+        create_directories_if_necessary(os.path.dirname(path))
+
+        with open(path, 'w') as resolved_file:
+            json.dump(self.to_dict(), resolved_file, separators=(',', ':'))
+
+    @staticmethod
+    def load(path: str) -> 'ResolvedCards':
+        """ Return resolved cards previously written to a file, if possible. """
+
+        try:
+            with open(path) as resolved_file:
+                data = json.load(resolved_file)
+        except (IOError, ValueError):
+            return None
+
+        if (data.get('format') != RESOLVED_CARDS_FORMAT or
+                data.get('program_version') != __version__):
+            return None
+
+        return ResolvedCards.from_dict(data)
+
+
+def input_state(path: str) -> tuple:
+    """ Return the size and modification time of a file, or None if it does not exist. """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get_resolved_cards_path(output_path: str, output_filename: str) -> str:
+    """ Return the path where the resolved cards of an output file are kept. """
+
+    return os.path.join(output_path, '.cards', '{0}.json'.format(output_filename))
+
+
+def get_section_name(contexts: list) -> str:
+    section_name = ''
+
+    for context in contexts:
+        if len(section_name) > 0:
+            section_name += ', '
+
+        # note that a name can be anything; e.g. '<stdin>'
+        section_name += html.escape(os.path.splitext(context)[0], quote=False)
+
+    return section_name
+
+
+def get_section(name: str,
+                section_template: str,
+                is_card_backs: bool=False,
+                is_filler: bool=False) -> str:
+    """ Populate a section with a name. """
+
+    template = Template(section_template)
+
+    section_class = 'ui-section do-not-print'
+
+    if is_card_backs:
+        section_class = '{0} {1}'.format(section_class, 'page-backs')
+
+    if is_filler:
+        section_class = '{0} {1}'.format(section_class, 'filler')
+
+    fill_each('_section_class', section_class, template)
+    fill_each('_datasource_name', name, template)
+
+    return template.content + '\n'
+
+
+def get_page(page_number: int,
+             cards: str,
+             page_template: str,
+             section_template: str,
+             contexts: list,
+             is_card_backs: bool=False,
+             is_filler: bool=False,
+             exclude_section: bool=False) -> str:
+    """ Populate a page with cards. """
+
+    template = Template(page_template)
+
+    page_class = 'page'
+
+    if is_card_backs:
+        page_class = '{0} {1}'.format(page_class, 'page-backs')
+
+    if is_filler:
+        page_class = '{0} {1}'.format(page_class, 'filler')
+
+    fill_each('_page_class', page_class, template)
+    fill_each(TemplateFields.PAGE_NUMBER, str(page_number), template)
+    fill_each(TemplateFields.CARDS, cards, template, indenting=True)
+
+    page = template.content + '\n'
+
+    if not exclude_section and contexts is not None:
+        section_name = get_section_name(contexts)
+
+        if is_card_backs:
+            section_name = '{0} - backs'.format(section_name)
+
+        section = get_section(section_name, section_template, is_card_backs, is_filler)
+
+        page = section + page
+
+    return page
+
+
+def get_sized_card(card_template: str,
+                   size_class: str,
+                   content: str) -> str:
+    """ Populate and return a card in a given size with the specified content. """
+
+    template = Template(card_template)
+
+    fill_each(TemplateFields.CARD_SIZE, size_class, template)
+    fill_each(TemplateFields.CARD_CONTENT, content, template, indenting=True)
+
+    return template.content + '\n'
+
+
+class PageLayout:
+    """ Lays out cards on pages, keeping card backs in sync for two-sided printing. """
+
+    def __init__(self,
+                 card_template: str,
+                 page_template: str,
+                 page_filler_template: str,
+                 section_template: str,
+                 default_card_size: CardSize,
+                 force_page_breaks: bool=False,
+                 should_disable_backs: bool=False,
+                 should_disable_page_sections: bool=False,
+                 pages_contain_backs: bool=False,
+                 is_preview: bool=False,
+                 page_writer=None):
+        self.card_template = card_template
+        self.page_template = page_template
+        self.page_filler_template = page_filler_template
+        self.section_template = section_template
+        self.default_card_size = default_card_size
+        self.force_page_breaks = force_page_breaks
+        self.should_disable_backs = should_disable_backs
+        self.should_disable_page_sections = should_disable_page_sections
+        # only lay out 1 of each card
+        self.is_preview = is_preview
+        self.pages_contain_backs = False
+
+        self.keep_pages_in_sync(pages_contain_backs)
+
+        # all generated pages; unless each page is passed on to a writer as soon as it is generated
+        self.pages = []
+        self.page_writer = page_writer
+        # the number of pages passed on to the writer
+        self.pages_written = 0
+
+        # buffer that will contain at most max_cards_per_page amount of cards
+        self.cards = ''
+        # buffer that will contain at most max_cards_per_page amount of card backs
+        self.backs = ''
+        # buffer of a row of backs that is filled in reverse to support double-sided printing
+        self.backs_row = ''
+
+        # incremented each time a card is generated, but reset to 0 for each page
+        self.cards_on_page = 0
+        # incremented each time a card is generated
+        self.cards_total = 0
+        # incremented for each unique card (i.e. not incremented for copies/duplicates)
+        self.cards_total_unique = 0
+        # the total number of cards laid out from the current datasource, including copies;
+        # or a stand-in, if not known before laying out the cards (see deferred_total())
+        self.cards_total_in_context = 0
+        # the name of the total number of cards in the current datasource, if deferred
+        self.deferred_total_in_context = None
+        # the number of cards laid out from the current datasource so far, including copies
+        self.cards_in_context = 0
+        # the number of datasources that cards have been laid out from
+        self.datasources_total = 0
+        # totals that were not known up front, by name (see deferred_total())
+        self.deferred_totals = {}
+        # the datasource that cards are currently laid out from, if any
+        self.datasource = None
+        # whether filler pages were added to keep pages in sync, while laying out the datasource
+        self.contains_filler_pages = False
+
+        self.contexts_per_page = []
+
+        self.card_size = None
+        self.disable_backs = should_disable_backs
+        self.cards_per_row = 0
+        self.max_cards_per_page = 0
+        self.empty_back = None
+
+        self.previous_context = None
+
+    @property
+    def pages_total(self) -> int:
+        return self.pages_written + len(self.pages)
+
+    def keep_pages_in_sync(self, pages_contain_backs: bool) -> None:
+        """ Specify whether any datasource contains card backs; if so, then every datasource has
+            to keep pages in sync (for two-sided printing).
+        """
+
+        self.pages_contain_backs = pages_contain_backs and not self.should_disable_backs
+
+    def add_page(self,
+                 cards: str,
+                 is_card_backs: bool=False,
+                 is_filler: bool=False) -> None:
+        """ Add a page of cards; or pass it on to the writer, if any. """
+
+        page = Template(get_page(
+            self.pages_total + 1, cards,
+            self.page_filler_template if is_filler else self.page_template,
+            self.section_template, self.contexts_per_page,
+            is_card_backs=is_card_backs, is_filler=is_filler,
+            exclude_section=self.should_disable_page_sections))
+
+        # note that a page holding cards from the previous datasource (i.e. any cards still waiting
+        # to be put on a page) is counted along with the current datasource
+        fill_each(TemplateFields.CARDS_TOTAL_IN_CONTEXT,
+                  str(self.cards_total_in_context),
+                  page)
+
+        if self.page_writer is not None:
+            self.page_writer(page.content)
+
+            self.pages_written += 1
+        else:
+            self.pages.append(page.content)
+
+    def break_page(self) -> bool:
+        """ Add any remaining cards (and their backs) to new pages.
+
+            Return True if a filler page was added to keep pages in sync, False otherwise.
+        """
+
+        self.add_page(self.cards)
+
+        if not self.disable_backs:
+            cards_on_last_row = self.cards_on_page % self.cards_per_row
+
+            if cards_on_last_row != 0:
+                # less than cards_per_row cards were added to the current line, so
+                # we have to add additional blank filler cards to ensure correct layout
+                remaining_backs = self.cards_per_row - cards_on_last_row
+
+                while remaining_backs > 0:
+                    # keep adding empty filler card backs until we've filled a row
+                    self.backs_row = self.empty_back + self.backs_row
+
+                    remaining_backs -= 1
+
+            self.backs += self.backs_row
+
+            self.backs_row = ''
+
+            # fill another page with the backs
+            self.add_page(self.backs, is_card_backs=True)
+
+            self.backs = ''
+
+        has_filler_page = False
+
+        if self.pages_contain_backs and self.disable_backs:
+            # we know some pages with backs have been added, and we know that this
+            # datasource does not contain any card backs, so in order to keep
+            # two-sided printing in sync, we need to add a filler page
+
+            # the filler page counts as a page full of backs, but contains content
+            # that will not be printed (not even a footer)
+            self.add_page('', is_card_backs=True, is_filler=True)
+
+            has_filler_page = True
+
+        # reset to prepare for the next page
+        self.cards_on_page = 0
+        self.cards = ''
+
+        return has_filler_page
+
+    def add_datasource(self,
+                       datasource: ResolvedDatasource,
+                       is_last: bool=False) -> None:
+        """ Lay out all cards resolved from a datasource. """
+
+        self.begin_datasource(datasource, cards_total_in_context=sum(
+            min(card.count, 1) if self.is_preview else card.count for card in datasource.cards))
+
+        for card in datasource.cards:
+            self.add_card(card)
+
+        self.end_datasource(is_last)
+
+    def begin_datasource(self,
+                         datasource: ResolvedDatasource,
+                         cards_total_in_context: int=None) -> None:
+        """ Begin laying out cards resolved from a datasource (see add_card()).
+
+            Unless specified, the total number of cards in the datasource is deferred.
+        """
+
+        context = datasource.context
+
+        self.datasource = datasource
+        self.datasources_total += 1
+
+        # every page added from here on is populated with the total number of cards in this
+        # datasource; so it has to be known (or stood in for) before laying out any of them
+        if cards_total_in_context is not None:
+            self.deferred_total_in_context = None
+            self.cards_total_in_context = cards_total_in_context
+        else:
+            self.deferred_total_in_context = 'cards-in-context-{0}'.format(self.datasources_total)
+            self.cards_total_in_context = deferred_total(self.deferred_total_in_context)
+
+        self.cards_in_context = 0
+
+        card_size = datasource.card_size(self.default_card_size)
+
+        if card_size != self.card_size:
+            if self.cards_on_page > 0:
+                # card sizing is different for this datasource, so any remaining cards
+                # must be added to a new page at this point
+                if self.break_page():
+                    WarningDisplay.datasource_contains_filler_pages(
+                        WarningContext(self.previous_context))
+
+            # we're finished with the current datasource, and we'll be starting a new page
+            # so we reset any saved contexts
+            self.contexts_per_page = []
+
+        self.contexts_per_page.append(context)
+
+        self.card_size = card_size
+        self.disable_backs = self.should_disable_backs or not datasource.has_backs
+
+        self.contains_filler_pages = False
+
+        card_width, card_height = card_size.size_in_inches
+        page_width, page_height = CardSizes.get_page_size().size_in_inches
+
+        self.cards_per_row = math.floor(page_width / card_width)
+        self.max_cards_per_page = math.floor(page_height / card_height) * self.cards_per_row
+
+        if not self.disable_backs:
+            # empty backs may be necessary to fill in empty spots on a page to ensure
+            # that the layout remains correct
+            # note that we're using a completely empty template, except for the size class field
+            self.empty_back = get_sized_card(
+                '<div class="card {0}"></div>'.format(
+                    str(TemplateField(name=TemplateFields.CARD_SIZE))),
+                size_class=card_size.style, content='')
+
+    def add_card(self, card: ResolvedCard) -> None:
+        """ Lay out a card (and its copies) from the current datasource. """
+
+        context = self.datasource.context
+        card_size = self.card_size
+
+        # this is also the shared index for any instance of this card
+        self.cards_total_unique += 1
+
+        count = min(card.count, 1) if self.is_preview else card.count
+
+        for _ in range(count):
+            card_index = self.cards_total + 1
+
+            card_content = fill_card_index(
+                Template(card.front), card_index, self.cards_total_unique)
+
+            self.cards += get_sized_card(
+                self.card_template, size_class=card_size.style, content=card_content)
+
+            self.cards_on_page += 1
+            self.cards_total += 1
+            self.cards_in_context += 1
+
+            if not self.disable_backs:
+                back_content = fill_card_index(
+                    Template(card.back), card_index, self.cards_total_unique)
+
+                # card backs are prepended rather than appended to
+                # ensure correct layout when printing doublesided
+                self.backs_row = get_sized_card(
+                    self.card_template,
+                    size_class=card_size.style, content=back_content) + self.backs_row
+
+                if self.cards_on_page % self.cards_per_row == 0:
+                    # a line has been filled- append the line of card backs
+                    # to the page in the right order
+                    self.backs += self.backs_row
+
+                    # reset to prepare for the next line
+                    self.backs_row = ''
+
+            if self.cards_on_page == self.max_cards_per_page:
+                # add another page full of cards (and backs)
+                if self.break_page():
+                    self.contains_filler_pages = True
+
+                # we're not necesarilly done with the current context, but any other context
+                # should be cleared at this point
+                self.contexts_per_page = [context]
+
+    def end_datasource(self, is_last: bool=False) -> None:
+        """ Finish laying out cards from the current datasource. """
+
+        context = self.datasource.context
+
+        if (self.force_page_breaks or is_last) and self.cards_on_page > 0:
+            # in case we're forcing pagebreaks for each datasource, or we're on the last datasource
+            # and there's still cards remaining, then do a pagebreak and fill those into a new page
+            if self.break_page():
+                self.contains_filler_pages = True
+
+            # we're finished with this context
+            self.contexts_per_page = []
+
+        if self.contains_filler_pages:
+            WarningDisplay.datasource_contains_filler_pages(
+                WarningContext(context))
+
+        if self.deferred_total_in_context is not None:
+            self.deferred_totals[self.deferred_total_in_context] = self.cards_in_context
+
+        self.previous_context = context
+        self.datasource = None
+
+    def totals(self) -> dict:
+        """ Return the total number of pages and cards, along with any other total that was
+            deferred (see deferred_total()).
+        """
+
+        totals = {'pages': self.pages_total, 'cards': self.cards_total}
+        totals.update(self.deferred_totals)
+
+        return totals
+
+
+def layout_pages(datasources: list, page_layout: PageLayout) -> (str, int, int):
+    """ Lay out every card resolved from a list of datasources on pages.
+
+        Return the pages, the total number of pages and the total number of cards.
+    """
+
+    for datasource_index, datasource in enumerate(datasources):
+        page_layout.add_datasource(
+            datasource, is_last=datasource_index == len(datasources) - 1)
+
+    return ''.join(page_layout.pages), page_layout.pages_total, page_layout.cards_total
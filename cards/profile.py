@@ -0,0 +1,396 @@
+# coding=utf-8
+
+"""
+This module provides functions for profiling and tracing the phases of a build.
+
+A build is profiled by activating a build context that carries a profile:
+
+    with BuildContext(profile=BuildProfile()) as context:
+        make(...)
+
+Each phase of the build is then timed (both wall and CPU time) as it runs:
+
+    with phase(Phases.LAYOUT):
+        layout_pages(...)
+
+Phases can be nested; the time of a phase never includes the time spent in any phase nested
+within it. When the active context carries no profile (or trace), phases cost next to nothing.
+
+A build is traced by activating a build context that carries a trace. Every phase, along with
+any other span of work (e.g. rendering a single card), is then recorded as an event on a
+timeline that can be saved in the Chrome trace event format (see chrome://tracing):
+
+    with span('cards.csv:#2', 'card', row_index=2):
+        get_card_fragment(...)
+
+Similarly, a build context can carry a memory report, in which case the peak and retained memory
+of each phase (and each datasource) is measured; see BuildMemoryReport.
+"""
+
+import os
+import json
+import time
+import threading
+import cProfile
+import tracemalloc
+
+from collections import OrderedDict
+
+from cards.context import BuildContext
+
+
+class Phases:  # pylint: disable=too-few-public-methods
+    """ Represents the phases of a build. """
+
+    DISCOVERY = 'datasource discovery'
+    DEFINITIONS = 'definitions'
+    RESOLVE = 'card resolution'
+    TEMPLATES = 'template loading'
+    RENDER_FRONT = 'card rendering (front)'
+    RENDER_BACK = 'card rendering (back)'
+    LAYOUT = 'page assembly'
+    FILL_INDEX = 'fill_index'
+    WRITE = 'output write'
+    RESOURCES = 'resource copy'
+    UNUSED_RESOURCES = 'unused-resource scan'
+
+    # the phases captured by a render profile, if any
+    RENDER = [RENDER_FRONT, RENDER_BACK]
+
+
+class PhaseTime:  # pylint: disable=too-few-public-methods
+    """ Represents the time spent in a phase, across every time it ran. """
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.count = 0
+
+
+class BuildProfile:
+    """ Represents the time spent in each phase of a build.
+
+        If a render profile path is specified, the card rendering phases are also profiled
+        using cProfile, and the statistics can be saved to that path (see save_render_profile()).
+    """
+
+    def __init__(self, render_profile_path: str=None):
+        self.render_profile_path = render_profile_path
+        self.render_profiler = (cProfile.Profile()
+                                if render_profile_path is not None
+                                else None)
+
+        self.phases = OrderedDict()
+
+        # each running phase, as a list of its name, start times and time spent in nested phases
+        self.running_phases = []
+
+        self.wall_time_started = time.perf_counter()
+        self.cpu_time_started = time.process_time()
+
+    def begin(self, name: str) -> None:
+        if self.render_profiler is not None and name in Phases.RENDER:
+            self.render_profiler.enable()
+
+        self.running_phases.append([name, time.perf_counter(), time.process_time(), 0.0, 0.0])
+
+    def end(self) -> None:
+        wall_time_ended = time.perf_counter()
+        cpu_time_ended = time.process_time()
+
+        name, wall_time_started, cpu_time_started, nested_wall_time, nested_cpu_time = (
+            self.running_phases.pop())
+
+        if self.render_profiler is not None and name in Phases.RENDER:
+            self.render_profiler.disable()
+
+        wall_time = wall_time_ended - wall_time_started
+        cpu_time = cpu_time_ended - cpu_time_started
+
+        if len(self.running_phases) > 0:
+            # exclude this phase from the time of the phase it is nested within
+            self.running_phases[-1][3] += wall_time
+            self.running_phases[-1][4] += cpu_time
+
+        phase_time = self.phases.get(name)
+
+        if phase_time is None:
+            phase_time = PhaseTime()
+
+            self.phases[name] = phase_time
+
+        phase_time.wall_time += wall_time - nested_wall_time
+        phase_time.cpu_time += cpu_time - nested_cpu_time
+        phase_time.count += 1
+
+    def total_time(self) -> (float, float):
+        """ Return the wall and CPU time spent since the profile began. """
+
+        return (time.perf_counter() - self.wall_time_started,
+                time.process_time() - self.cpu_time_started)
+
+    def save_render_profile(self) -> bool:
+        """ Save the statistics of the render profile, if any.
+
+            Return True if the statistics were saved, False otherwise.
+        """
+
+        if self.render_profiler is None:
+            return False
+
+        self.render_profiler.dump_stats(self.render_profile_path)
+
+        return True
+
+
+class BuildTrace:
+    """ Represents a timeline of the spans of work done during a build. """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self.events = []
+
+        self.time_started = time.perf_counter()
+
+    def add_span(self,
+                 name: str,
+                 category: str,
+                 time_started: float,
+                 time_ended: float,
+                 details: dict=None) -> None:
+        self.events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',  # a complete event; i.e. both its start and its duration
+            'ts': (time_started - self.time_started) * 1000000,
+            'dur': (time_ended - time_started) * 1000000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': details if details is not None else {}
+        })
+
+    def slowest(self, category: str, detail: str, count: int=5) -> list:
+        """ Return the slowest values of a detail among all spans of a category.
+
+            The time of each value is the sum of all spans with that value; the slowest values
+            are returned first, as a list of the value, time in seconds and number of spans.
+        """
+
+        totals = {}
+
+        for event in self.events:
+            if event['cat'] != category or detail not in event['args']:
+                continue
+
+            value = event['args'][detail]
+
+            duration, spans = totals.get(value, (0, 0))
+
+            totals[value] = (duration + event['dur'], spans + 1)
+
+        slowest_values = sorted(totals.items(), key=lambda total: total[1][0], reverse=True)
+
+        return [(value, duration / 1000000, spans)
+                for value, (duration, spans) in slowest_values[:count]]
+
+    def save(self) -> None:
+        with open(self.path, 'w') as trace_file:
+            # details are usually strings or numbers, but anything else is written as a string
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, trace_file,
+                      default=str)
+
+
+class MemoryUsage:  # pylint: disable=too-few-public-methods
+    """ Represents the memory used by a phase (or datasource), across every time it ran. """
+
+    def __init__(self):
+        # the most memory in use at any time during the phase
+        self.peak_size = 0
+        # the memory still in use when the phase ended, compared to when it began
+        self.retained_size = 0
+        self.count = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'peak_size': self.peak_size,
+            'retained_size': self.retained_size,
+            'count': self.count
+        }
+
+
+class BuildMemoryReport:
+    """ Represents the memory used by each phase, and each datasource, of a build.
+
+        Memory is traced using tracemalloc from the moment the report is made; note that
+        tracing memory slows down a build considerably.
+
+        The peak of a phase is only exact on Python 3.9 and later; on earlier versions, the peak
+        of a phase is the highest peak of the build so far.
+    """
+
+    def __init__(self, top_allocation_count: int=10):
+        self.phases = OrderedDict()
+        self.datasources = OrderedDict()
+
+        # each running phase, as a list of its usages, memory in use when it began and its peak
+        self.running_phases = []
+
+        self.top_allocation_count = top_allocation_count
+        # the sites that allocated most of the memory still in use at the end of the phase
+        # that peaked the highest; as a list of filename, line number, size and number of blocks
+        self.top_allocations = []
+        self.top_allocations_phase = None
+
+        self.peak_size = 0
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def begin(self, name: str, category: str='phase') -> None:
+        usages = self.phases if category == 'phase' else self.datasources
+
+        usage = usages.get(name)
+
+        if usage is None:
+            usage = MemoryUsage()
+
+            usages[name] = usage
+
+        current_size, peak_size = tracemalloc.get_traced_memory()
+
+        if len(self.running_phases) > 0:
+            # keep the peak of the phase this phase is nested within, before starting over
+            running_phase = self.running_phases[-1]
+            running_phase[3] = max(running_phase[3], peak_size)
+
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        self.running_phases.append([name, usage, current_size, current_size])
+
+    def end(self) -> None:
+        current_size, peak_size = tracemalloc.get_traced_memory()
+
+        name, usage, initial_size, nested_peak_size = self.running_phases.pop()
+
+        peak_size = max(peak_size, nested_peak_size)
+
+        usage.peak_size = max(usage.peak_size, peak_size)
+        usage.retained_size += current_size - initial_size
+        usage.count += 1
+
+        if len(self.running_phases) > 0:
+            running_phase = self.running_phases[-1]
+            running_phase[3] = max(running_phase[3], peak_size)
+        elif peak_size > self.peak_size:
+            # only the outermost phases are considered, as taking a snapshot is rather slow
+            self.peak_size = peak_size
+
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                # leave out the allocations made by tracing itself
+                tracemalloc.Filter(False, tracemalloc.__file__)])
+
+            self.top_allocations = [
+                (statistic.traceback[0].filename, statistic.traceback[0].lineno,
+                 statistic.size, statistic.count)
+                for statistic in snapshot.statistics('lineno')[:self.top_allocation_count]]
+            self.top_allocations_phase = name
+
+    def to_dict(self) -> dict:
+        return {
+            'peak_size': self.peak_size,
+            'phases': {name: usage.to_dict() for name, usage in self.phases.items()},
+            'datasources': {name: usage.to_dict() for name, usage in self.datasources.items()},
+            'top_allocations_phase': self.top_allocations_phase,
+            'top_allocations': [{'filename': filename, 'lineno': lineno,
+                                 'size': size, 'count': count}
+                                for filename, lineno, size, count in self.top_allocations]
+        }
+
+
+class TimedSpan:  # pylint: disable=too-few-public-methods
+    """ Represents a span of work being timed by a profile, a trace or a memory report
+        (or any of these at once).
+    """
+
+    def __init__(self,
+                 name: str,
+                 category: str,
+                 details: dict=None,
+                 profile: BuildProfile=None,
+                 trace: BuildTrace=None,
+                 memory_report: BuildMemoryReport=None):
+        self.name = name
+        self.category = category
+        self.details = details
+        self.profile = profile
+        self.trace = trace
+        self.memory_report = memory_report
+        self.time_started = 0.0
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.profile.begin(self.name)
+
+        if self.memory_report is not None:
+            # datasources are told apart by their path; several can have the same name
+            self.memory_report.begin((self.details or {}).get('data_path', self.name),
+                                     self.category)
+
+        self.time_started = time.perf_counter()
+
+    def __exit__(self, exception_type, exception, traceback):
+        if self.trace is not None:
+            self.trace.add_span(self.name, self.category,
+                                self.time_started, time.perf_counter(), self.details)
+
+        if self.memory_report is not None:
+            self.memory_report.end()
+
+        if self.profile is not None:
+            self.profile.end()
+
+
+class UntimedPhase:  # pylint: disable=too-few-public-methods
+    """ Represents a phase that is not being timed. """
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exception_type, exception, traceback):
+        pass
+
+
+UNTIMED_PHASE = UntimedPhase()
+
+
+def phase(name: str):
+    """ Return a context manager that times a phase, if the active build context is profiled,
+        traced or reporting memory.
+    """
+
+    context = BuildContext.current()
+
+    if context.profile is None and context.trace is None and context.memory_report is None:
+        return UNTIMED_PHASE
+
+    return TimedSpan(name, 'phase', None, context.profile, context.trace, context.memory_report)
+
+
+def span(name: str, category: str, **details):
+    """ Return a context manager that records a span of work, if the active build context
+        is traced.
+
+        The memory used by datasource spans is also measured, if the active build context
+        is reporting memory.
+    """
+
+    context = BuildContext.current()
+
+    memory_report = context.memory_report if category == 'datasource' else None
+
+    if context.trace is None and memory_report is None:
+        return UNTIMED_PHASE
+
+    return TimedSpan(name, category, details, None, context.trace, memory_report)
@@ -0,0 +1,132 @@
+# coding=utf-8
+
+"""
+This module provides a progress meter for long builds.
+
+The meter reports the number of cards rendered so far, the current datasource, the rate at which
+cards are rendered and an estimate of the time remaining. The total number of cards is known ahead
+for datasources that are read in full; for streamed datasources, it is only an estimate (shown
+as '~').
+
+On a terminal, the meter is redrawn on a single line; otherwise (e.g. in CI logs), a line is
+printed every so often.
+
+Updates are rate-limited, so the meter costs next to nothing per card.
+"""
+
+import os
+import sys
+import time
+
+
+class BuildProgress:
+    """ Represents the progress of resolving cards during a build. """
+
+    def __init__(self,
+                 stream=None,
+                 redraw_interval: float=0.1,
+                 log_interval: float=5):
+        self.stream = stream if stream is not None else sys.stdout
+
+        # when not on a terminal, the meter can not be redrawn; so log it instead
+        self.is_redrawn = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.interval = redraw_interval if self.is_redrawn else log_interval
+
+        self.cards_total = 0
+        self.cards_done = 0
+
+        # whether the total is only an estimate (e.g. when any datasource is streamed)
+        self.is_estimate = False
+
+        self.context = None
+
+        self.time_started = 0.0
+        self.time_updated = 0.0
+
+        # the length of the line currently drawn, if any
+        self.line_length = 0
+
+    def begin(self, cards_total: int, is_estimate: bool=False) -> None:
+        self.cards_total = cards_total
+        self.cards_done = 0
+
+        self.is_estimate = is_estimate
+
+        self.time_started = time.perf_counter()
+        self.time_updated = self.time_started
+
+    def advance(self, context: str, cards: int=1) -> None:
+        """ Count a number of cards as done, and show the progress if it is time to do so. """
+
+        self.cards_done += cards
+        self.context = context
+
+        now = time.perf_counter()
+
+        if now - self.time_updated >= self.interval:
+            self.time_updated = now
+
+            self.show(now)
+
+    def describe(self, now: float) -> str:
+        elapsed_time = now - self.time_started
+
+        rate = self.cards_done / elapsed_time if elapsed_time > 0 else 0
+
+        # the total might be an estimate; never let it seem like there's less than nothing left
+        cards_total = max(self.cards_total, self.cards_done)
+
+        percentage = self.cards_done / cards_total * 100 if cards_total > 0 else 100
+
+        remaining_time = ((cards_total - self.cards_done) / rate
+                          if rate > 0 else 0)
+
+        return ('[-] Rendering {0}: {1}/{2}{3} cards ({4:.0f}%), {5:.0f} cards/s, '
+                'ETA {6:.0f}s'.format(self.context, self.cards_done,
+                                      '~' if self.is_estimate else '', cards_total,
+                                      percentage, rate, remaining_time))
+
+    def show(self, now: float) -> None:
+        line = self.describe(now)
+
+        if self.is_redrawn:
+            # pad with spaces to erase any leftovers of a longer line
+            self.stream.write('\r' + line.ljust(self.line_length))
+
+            self.line_length = len(line)
+        else:
+            self.stream.write(line + '\n')
+
+        self.stream.flush()
+
+    def clear(self) -> None:
+        """ Erase the meter, if drawn; e.g. before printing anything else. """
+
+        if self.line_length > 0:
+            self.stream.write('\r' + ' ' * self.line_length + '\r')
+            self.stream.flush()
+
+            self.line_length = 0
+
+    def finish(self) -> None:
+        self.clear()
+
+
+def estimate_rows(data_paths: list) -> int:
+    """ Return an estimate of the number of rows in all datasources.
+
+        Each line (except the first) is counted as a row; rows that span several lines, or that
+        are excluded, are counted as well.
+    """
+
+    rows = 0
+
+    for data_path in data_paths:
+        if not os.path.isfile(data_path):
+            continue
+
+        with open(data_path, 'rb') as data_file:
+            # don't count the column names
+            rows += max(0, sum(1 for _ in data_file) - 1)
+
+    return rows
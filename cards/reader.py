@@ -0,0 +1,440 @@
+# coding=utf-8
+
+"""
+This module provides the readers that datasources are read by; one for each format.
+
+A reader only provides the column names of a datasource, each of its rows (as a list of cells,
+along with the row index and whether the row is excluded) and any single row by its row index.
+Everything else (e.g. keeping rows in memory, classifying columns or resolving references) is
+left to the datasource (see datasource.py); so a new format only needs a reader of its own,
+registered in READERS.
+
+Row indices are the same in every format: the first row of data is always #2, as if the column
+names were on the first row of a sheet (which they are, in a CSV file).
+
+A datasource can also be piped through stdin (in either CSV or JSON Lines); see read_stdin().
+"""
+
+import os
+import sys
+import csv
+import json
+import sqlite3
+import hashlib
+import tempfile
+
+from collections import OrderedDict
+
+from cards.column import Row
+from cards.util import FileWrapper
+from cards.progress import estimate_rows
+
+
+# the name of a datasource read from stdin; i.e. the name given as '-' on the command line
+STDIN_NAME = '<stdin>'
+
+
+class DatasourceReadError(Exception):
+    """ Raised when a datasource can not be read. """
+
+
+class DatasourceReader:
+    """ Reads the rows of a datasource in a particular format. """
+
+    # the extensions of the datasources that can be read (e.g. '.csv')
+    extensions = ()
+    # whether datasources in this format are found when looking for datasources in a directory
+    is_discoverable = False
+    # whether datasources in this format are always streamed; i.e. never held in memory
+    is_always_streamed = False
+
+    def __init__(self, data_path: str, file_path: str=None):
+        self.data_path = data_path
+        # the file that is actually read; usually the data path itself, but not for stdin
+        self.file_path = file_path if file_path is not None else data_path
+        # the hash of the content, if it can not be read again from the data path (e.g. stdin)
+        self.content_hash = None
+
+    def read_column_names(self) -> list:
+        """ Return the column names, as they are. """
+
+        raise NotImplementedError
+
+    def read_rows(self):
+        """ Return an iterator for every row, in order, as a list of cells along with its
+            row index and whether the row is excluded.
+        """
+
+        raise NotImplementedError
+
+    def read_row(self, row_index: int) -> (list, bool):
+        """ Return the cells of the row at a row index (if any), and whether that row is excluded.
+
+            Every row before it is read as well; a reader that can do better, should.
+        """
+
+        for cells, record_row_index, is_excluded in self.read_rows():
+            if record_row_index == row_index:
+                return (None, True) if is_excluded else (cells, False)
+
+            if record_row_index > row_index:
+                # row indices only increase; so the row can not be found any later
+                break
+
+        return None, False
+
+    def estimated_rows(self) -> int:
+        """ Return an estimate of the number of rows (see estimate_rows()). """
+
+        return estimate_rows([self.file_path])
+
+    def close(self) -> None:
+        """ Release anything held open for reading (e.g. a connection); nothing is read after. """
+
+
+class CsvReader(DatasourceReader):
+    """ Reads a datasource from a CSV file. """
+
+    extensions = ('.csv',)
+    is_discoverable = True
+
+    def read_column_names(self) -> list:
+        with open(self.file_path) as data_file:
+            for cells in csv.reader(data_file):
+                if len(cells) > 0:
+                    return cells
+
+        return []
+
+    def read_rows(self):
+        """ Return an iterator for every row, in order (see DatasourceReader.read_rows()).
+
+            Rows are counted like a DictReader would count them; i.e. blank lines are skipped,
+            and a row spanning several lines only counts once.
+        """
+
+        with open(self.file_path) as data_file:
+            # wrap the file stream to retain access to unparsed lines
+            data_file = FileWrapper(data_file)
+
+            # since the column names counts as a row, and most editors
+            # do not use a zero-based row index, the first row == 2
+            row_index = 0
+
+            for cells in csv.reader(data_file):
+                if len(cells) == 0:
+                    continue
+
+                row_index += 1
+
+                if row_index == 1:
+                    # skip the column names
+                    continue
+
+                # note that excluded rows are still counted; otherwise references would be offset
+                yield cells, row_index, Row.is_excluded(data_file.raw_line)
+
+
+def cell_from_value(value) -> str:
+    """ Return a value (e.g. a number) as a cell of text, like it would be in a CSV file. """
+
+    if value is None:
+        return ''
+
+    if isinstance(value, str):
+        return value
+
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    # e.g. a list or an object
+    return json.dumps(value)
+
+
+class JsonLinesReader(DatasourceReader):
+    """ Reads a datasource from a JSON Lines file; i.e. a JSON object on each line.
+
+        The column names are the keys of the first object; any other key is treated like an
+        extra cell in a CSV file. A line starting with '#' is an excluded row, like in a CSV file;
+        as is an object whose first value starts with '#'.
+    """
+
+    extensions = ('.jsonl', '.ndjson')
+    is_discoverable = True
+
+    def read_objects(self):
+        """ Return an iterator for every line, in order, as an object (None if excluded)
+            along with its line number.
+        """
+
+        with open(self.file_path) as data_file:
+            for line_number, line in enumerate(data_file, start=1):
+                if len(line.strip()) == 0:
+                    continue
+
+                if Row.is_excluded(line):
+                    yield None, line_number
+
+                    continue
+
+                try:
+                    entry = json.loads(line, object_pairs_hook=OrderedDict)
+                except ValueError:
+                    entry = None
+
+                if not isinstance(entry, dict):
+                    raise DatasourceReadError(
+                        'line {0} is not a JSON object'.format(line_number))
+
+                yield entry, line_number
+
+    def read_column_names(self) -> list:
+        for entry, _ in self.read_objects():
+            if entry is not None:
+                return list(entry.keys())
+
+        return []
+
+    def read_rows(self):
+        keys = None
+
+        # like in a CSV file, the first row is #2
+        row_index = 1
+
+        for entry, _ in self.read_objects():
+            row_index += 1
+
+            if entry is None:
+                yield [], row_index, True
+
+                continue
+
+            if keys is None:
+                keys = list(entry.keys())
+
+            # a key missing from an object is an empty cell; sparse objects are common
+            cells = [cell_from_value(entry.get(key)) for key in keys]
+            # any key not among the column names is an extra cell
+            cells.extend(cell_from_value(value) for key, value in entry.items()
+                         if key not in keys)
+
+            yield cells, row_index, len(cells) > 0 and Row.is_excluded(cells[0])
+
+    def estimated_rows(self) -> int:
+        # note that there is no line with column names
+        return estimate_rows([self.file_path]) + 1
+
+
+class SqliteReader(DatasourceReader):
+    """ Reads a datasource from a table (or view) in an SQLite database.
+
+        The table is the one named like the database (e.g. the table 'cards' in 'cards.db'),
+        or the only table (or view) in the database.
+
+        The row index of a row in a table is its rowid + 1; this lets any row be looked up by
+        its index, instead of reading every row before it. The rows of a view (or a table
+        without rowids) are simply counted instead. Like in a CSV file, a row is excluded if
+        its first value starts with '#'.
+    """
+
+    extensions = ('.sqlite', '.db')
+    # rows are always read through a cursor
+    is_always_streamed = True
+
+    def __init__(self, data_path: str):
+        super().__init__(data_path)
+
+        self.connection = None
+
+        try:
+            # never change the database; e.g. by creating it if it is not a database
+            self.connection = sqlite3.connect('file:{0}?mode=ro'.format(
+                os.path.abspath(data_path).replace('?', '%3f').replace('#', '%23')), uri=True)
+
+            tables = self.connection.execute(
+                'SELECT name, type FROM sqlite_master '
+                'WHERE type IN (\'table\', \'view\') AND name NOT LIKE \'sqlite_%\' '
+                'ORDER BY name').fetchall()
+        except sqlite3.Error as error:
+            self.close()
+
+            raise DatasourceReadError(str(error))
+
+        name = os.path.splitext(os.path.basename(data_path))[0]
+
+        matching_tables = [table for table in tables if table[0].lower() == name.lower()]
+
+        if len(matching_tables) == 0 and len(tables) == 1:
+            matching_tables = tables
+
+        if len(matching_tables) != 1:
+            self.close()
+
+            raise DatasourceReadError(
+                'no table named \'{0}\' (and not just a single table)'.format(name))
+
+        self.table_name, table_type = matching_tables[0]
+
+        self.has_rowid = table_type == 'table'
+
+        if self.has_rowid:
+            try:
+                self.connection.execute('SELECT rowid FROM {0} LIMIT 0'.format(
+                    self.quoted_table_name()))
+            except sqlite3.OperationalError:
+                # a table made 'WITHOUT ROWID'
+                self.has_rowid = False
+
+    def quoted_table_name(self) -> str:
+        return '"{0}"'.format(self.table_name.replace('"', '""'))
+
+    def select(self) -> str:
+        """ Return a statement that selects the row index and every column of each row. """
+
+        if not self.has_rowid:
+            # these rows are counted as they are read instead
+            return 'SELECT NULL, * FROM {0}'.format(self.quoted_table_name())
+
+        return 'SELECT rowid + 1, * FROM {0}'.format(self.quoted_table_name())
+
+    def read_column_names(self) -> list:
+        cursor = self.connection.execute(
+            'SELECT * FROM {0} LIMIT 0'.format(self.quoted_table_name()))
+
+        return [description[0] for description in cursor.description]
+
+    @staticmethod
+    def cells(values: tuple) -> (list, bool):
+        cells = [cell_from_value(value) for value in values]
+
+        return cells, len(cells) > 0 and Row.is_excluded(cells[0])
+
+    def read_rows(self):
+        cursor = self.connection.execute(self.select() + (
+            ' ORDER BY rowid' if self.has_rowid else ''))
+
+        # like in a CSV file, the first row is #2
+        for position, values in enumerate(cursor, start=2):
+            cells, is_excluded = SqliteReader.cells(values[1:])
+
+            yield cells, values[0] if values[0] is not None else position, is_excluded
+
+    def read_row(self, row_index: int) -> (list, bool):
+        if not self.has_rowid:
+            values = self.connection.execute(
+                self.select() + ' LIMIT 1 OFFSET ?', (row_index - 2,)).fetchone()
+        else:
+            # the rowid is always indexed
+            values = self.connection.execute(
+                self.select() + ' WHERE rowid = ?', (row_index - 1,)).fetchone()
+
+        if values is None:
+            return None, False
+
+        cells, is_excluded = SqliteReader.cells(values[1:])
+
+        return (None, True) if is_excluded else (cells, False)
+
+    def estimated_rows(self) -> int:
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM {0}'.format(self.quoted_table_name())).fetchone()[0]
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+
+            self.connection = None
+
+
+# every available reader; the first reader with a matching extension reads a datasource,
+# and any datasource with an unknown extension is read as CSV
+READERS = [CsvReader, JsonLinesReader, SqliteReader]
+
+
+def get_reader(data_path: str) -> DatasourceReader:
+    """ Return a reader for a datasource, depending on its extension. """
+
+    extension = os.path.splitext(data_path)[1].lower()
+
+    for reader in READERS:
+        if extension in reader.extensions:
+            return reader(data_path)
+
+    return CsvReader(data_path)
+
+
+def has_datasource_extension(data_path: str) -> bool:
+    """ Determine whether a path has the extension of a format that any reader reads. """
+
+    extension = os.path.splitext(data_path)[1].lower()
+
+    return any(extension in reader.extensions for reader in READERS)
+
+
+def is_discoverable_datasource(name: str) -> bool:
+    """ Determine whether a file should be found when looking for datasources in a directory. """
+
+    extension = os.path.splitext(name)[1].lower()
+
+    return any(extension in reader.extensions for reader in READERS if reader.is_discoverable)
+
+
+def get_stdin_data_path(base_path: str=None) -> str:
+    """ Return the path that a datasource read from stdin is known by.
+
+        The datasource is not actually found there; but any relative path in it (e.g. to a
+        template or an image) is resolved against the base path, as if it was.
+    """
+
+    return os.path.join(base_path if base_path is not None else '', STDIN_NAME)
+
+
+def is_stdin_data_path(data_path: str) -> bool:
+    """ Determine whether a datasource is read from stdin (see get_stdin_data_path()). """
+
+    return os.path.basename(data_path) == STDIN_NAME
+
+
+def read_stdin(data_path: str, stdin=None) -> DatasourceReader:
+    """ Return a reader for a datasource piped through stdin.
+
+        Since stdin can only be read once, it is spooled to a temporary file as it is read; that
+        file is removed again once the reader is no longer used. The format is told by the content:
+        JSON Lines if it begins with '{', and CSV otherwise.
+    """
+
+    stdin = stdin if stdin is not None else sys.stdin
+
+    spool_directory = tempfile.TemporaryDirectory(prefix='cards-')
+
+    file_path = os.path.join(spool_directory.name, STDIN_NAME)
+
+    content_hash = hashlib.sha256()
+
+    first_character = None
+
+    with open(file_path, 'w') as spool_file:
+        # spooled in small chunks; piping a large datasource should take no more memory than
+        # piping a small one
+        for chunk in iter(lambda: stdin.read(64 * 1024), ''):
+            if first_character is None and len(chunk.strip()) > 0:
+                first_character = chunk.strip()[0]
+
+            content_hash.update(chunk.encode('utf-8'))
+
+            spool_file.write(chunk)
+
+    reader_type = JsonLinesReader if first_character == '{' else CsvReader
+
+    reader = reader_type(data_path, file_path)
+    # keep the spooled file for as long as the reader is used
+    reader.spool_directory = spool_directory
+    reader.content_hash = content_hash.hexdigest()
+
+    return reader
@@ -0,0 +1,127 @@
+# coding=utf-8
+
+"""
+This module provides a machine-readable report of a build.
+
+A build is reported by activating a build context that carries a report:
+
+    with BuildContext(report=BuildReport('build.json')) as context:
+        make(...)
+
+    context.report.save()
+
+The report is saved as JSON, and includes the cards resolved from each datasource, the outcome of
+each output file, any warnings and errors (by kind), render cache statistics and every file of the
+output, along with the number of bytes written. If the build was profiled or had its memory
+measured, the time and memory used by each phase is included as well.
+"""
+
+import json
+import datetime
+
+from cards.context import BuildContext
+from cards.version import __version__
+
+
+class BuildReport:
+    """ Represents the outcome of a build, to be saved as a machine-readable report. """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self.date = datetime.datetime.now()
+        self.time_in_seconds = None
+
+        self.datasources = []
+        self.cards_total_unique = 0
+        self.variants = []
+        self.render_cache = None
+
+    def record_resolved_cards(self, resolved_cards) -> None:
+        """ Record the cards resolved from each datasource (see ResolvedCards). """
+
+        self.datasources = [{
+            'context': datasource.context,
+            'data_path': datasource.data_path,
+            'cards_total': datasource.cards_total(),
+            'cards_total_unique': datasource.cards_total_unique()
+        } for datasource in resolved_cards.datasources]
+
+        self.cards_total_unique = resolved_cards.cards_total_unique()
+
+    def record_variants(self, variant_results: list) -> None:
+        """ Record the outcome of each output file (see make_output()). """
+
+        # note that pages are only reported per output file; cards from several datasources
+        # can share the same page
+        self.variants = [{
+            'output_path': output_filepath,
+            'pages_total': pages_total,
+            'cards_total': cards_total,
+            'cards_total_unique': cards_total_unique
+        } for output_filepath, pages_total, cards_total, cards_total_unique in variant_results]
+
+    def record_render_cache(self, render_cache) -> None:
+        """ Record the statistics of a render cache (see RenderCache). """
+
+        self.render_cache = {
+            'path': render_cache.path,
+            'hits': render_cache.hits,
+            'misses': render_cache.misses,
+            'stores': render_cache.stores,
+            'evictions': render_cache.evictions,
+            'hit_rate': render_cache.hit_rate()
+        }
+
+    def to_dict(self, context: BuildContext) -> dict:
+        diagnostics = {}
+
+        for diagnostic in context.diagnostics.values():
+            kind = diagnostics.setdefault(diagnostic.kind, {
+                'severity': diagnostic.severity,
+                'count': 0
+            })
+
+            kind['count'] += diagnostic.times_raised
+
+        resources = {}
+
+        for _, state in context.output_files.values():
+            resources[state] = resources.get(state, 0) + 1
+
+        profile = context.profile
+
+        phases = ({name: {'wall_time': phase_time.wall_time,
+                          'cpu_time': phase_time.cpu_time,
+                          'count': phase_time.count}
+                   for name, phase_time in profile.phases.items()}
+                  if profile is not None else None)
+
+        return {
+            'version': __version__,
+            'date': self.date.isoformat(),
+            'time_in_seconds': self.time_in_seconds,
+            'cards_total_unique': self.cards_total_unique,
+            'datasources': self.datasources,
+            'variants': self.variants,
+            'errors': context.error_count,
+            'warnings': context.warning_count,
+            'diagnostics': diagnostics,
+            'render_cache': self.render_cache,
+            'output': {
+                'size': context.output_size(),
+                'files': [{'path': path, 'size': size, 'state': state}
+                          for path, (size, state) in context.output_files.items()],
+                'states': resources
+            },
+            'phases': phases,
+            'memory': (context.memory_report.to_dict()
+                       if context.memory_report is not None
+                       else None)
+        }
+
+    def save(self) -> None:
+        """ Save the report of the active build context. """
+
+        with open(self.path, 'w') as report_file:
+            json.dump(self.to_dict(BuildContext.current()), report_file, indent=2)
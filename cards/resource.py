@@ -11,6 +11,8 @@ from typing import List
 
 from cards.util import is_url, copy_file_if_necessary, create_directories_if_necessary
 from cards.warning import WarningDisplay, WarningContext
+from cards.context import BuildContext
+from cards.profile import span
 
 
 def supported_image_types() -> tuple:
@@ -120,12 +122,17 @@ def copy_images_to_output_directory(
         relative_destination_path = os.path.join(
             output_path, resource_path)
 
-        # make sure any missing directories are created as needed
-        create_directories_if_necessary(
-            os.path.dirname(relative_destination_path))
+        # each copy is traced on its own, so that a slow copy can be told apart from the others
+        with span(relative_source_path, 'resource', datasource=context):
+            # make sure any missing directories are created as needed
+            create_directories_if_necessary(
+                os.path.dirname(relative_destination_path))
 
-        resource_was_copied, resource_already_existed = copy_file_if_necessary(
-            relative_source_path, relative_destination_path)
+            resource_was_copied, resource_already_existed = copy_file_if_necessary(
+                relative_source_path, relative_destination_path)
+
+        BuildContext.current().record_copied_file(
+            relative_destination_path, resource_was_copied, resource_already_existed)
 
         resource_was_overwritten = resource_already_existed and resource_was_copied
         resource_was_duplicate = resource_already_existed and not resource_was_copied
@@ -0,0 +1,130 @@
+# coding=utf-8
+
+"""
+This module provides functions for building cards in shards.
+
+A sharded build splits the cards of a project into a number of shards that can be resolved
+independently; e.g. by separate processes or machines. Each card is assigned to a shard by the
+position of its row across all datasources, so every shard can determine its own cards without
+any coordination. A shard outputs its resolved cards (the shard manifest) along with
+any resources they need, and all shards are then merged into the final output.
+"""
+
+import os
+import re
+
+from cards.layout import ResolvedCards, ResolvedDatasource
+from cards.resource import get_resource_path
+
+SHARD_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d+)\s*$')
+
+
+def parse_shard(shard: str) -> tuple:
+    """ Return the index and count of a shard specified as 'i/N', or None if invalid. """
+
+    match = SHARD_PATTERN.match(shard) if shard is not None else None
+
+    if match is None:
+        return None
+
+    shard_index, shard_count = int(match.group(1)), int(match.group(2))
+
+    if shard_count < 1 or shard_index < 1 or shard_index > shard_count:
+        return None
+
+    return shard_index, shard_count
+
+
+def is_in_shard(row_sequence: int, shard: tuple) -> bool:
+    """ Determine whether the card at a row sequence (counting from 1) belongs to a shard. """
+
+    shard_index, shard_count = shard
+
+    return (row_sequence - 1) % shard_count == shard_index - 1
+
+
+def get_shard_path(output_path: str, shard: tuple) -> str:
+    """ Return the path where the manifest of a shard is kept. """
+
+    return os.path.join(output_path, '.cards', 'shard-{0}-of-{1}.json'.format(*shard))
+
+
+def find_shard_paths(path: str) -> list:
+    """ Return the paths of all shard manifests found at a path.
+
+        The path can either be a manifest, or the output path of a shard build.
+    """
+
+    if os.path.isfile(path):
+        return [path]
+
+    for directory_path in [os.path.join(path, 'generated', '.cards'),
+                           os.path.join(path, '.cards')]:
+        if os.path.isdir(directory_path):
+            return sorted(os.path.join(directory_path, filename)
+                          for filename in os.listdir(directory_path)
+                          if filename.startswith('shard-') and filename.endswith('.json'))
+
+    return []
+
+
+def merge_shards(shards: list) -> ResolvedCards:
+    """ Return the resolved cards of all shards, merged as if resolved in a single build.
+
+        Each shard is a pair of resolved cards and the path to the manifest they were loaded from.
+    """
+
+    merged_cards = ResolvedCards()
+
+    first_shard, _ = shards[0]
+
+    merged_cards.data_paths = first_shard.data_paths
+    merged_cards.definitions_path = first_shard.definitions_path
+    merged_cards.definitions = first_shard.definitions
+    merged_cards.date = first_shard.date
+    merged_cards.is_preview = first_shard.is_preview
+    merged_cards.contains_backs = any(shard.contains_backs for shard, _ in shards)
+    merged_cards.backs_rendered = all(shard.backs_rendered for shard, _ in shards)
+
+    embedded_styles = {}
+    context_image_paths = {}
+
+    for shard, shard_path in shards:
+        merged_cards.referenced_definitions |= shard.referenced_definitions
+        merged_cards.inputs.update(shard.inputs)
+
+        for style_index, (template_path, style, position) in enumerate(shard.embedded_styles):
+            if (template_path not in embedded_styles or
+                    position < embedded_styles[template_path][2]):
+                embedded_styles[template_path] = (style, style_index, position)
+
+        # the resources of each shard have been copied next to its manifest
+        resources_path = os.path.dirname(os.path.dirname(shard_path))
+
+        for context_path, image_paths in shard.image_paths:
+            context_image_paths.setdefault(context_path, set()).update(
+                os.path.join(resources_path, get_resource_path(os.path.basename(image_path)))
+                for image_path in image_paths)
+
+    # keep styles in the order they would have been met by a single build
+    merged_cards.embedded_styles = sorted(
+        [(template_path, style, position)
+         for template_path, (style, _, position) in embedded_styles.items()],
+        key=lambda embedded_style: (embedded_style[2],
+                                    embedded_styles[embedded_style[0]][1]))
+
+    merged_cards.image_paths = [(context_path, list(image_paths))
+                                for context_path, image_paths in context_image_paths.items()]
+
+    for datasource_index, datasource in enumerate(first_shard.datasources):
+        cards = []
+
+        for shard, _ in shards:
+            cards.extend(shard.datasources[datasource_index].cards)
+
+        merged_cards.datasources.append(ResolvedDatasource(
+            datasource.context, datasource.data_path,
+            datasource.size_identifier, datasource.has_backs,
+            sorted(cards, key=lambda card: card.row_index)))
+
+    return merged_cards
@@ -6,6 +6,7 @@ This module provides functions for working with templates and rendering them.
 
 import os
 import re
+import json
 import datetime
 
 
@@ -613,8 +614,35 @@ def fill_index(index: str,
     fill_each('_header', header, template, indenting=True)
 
     fill_each(TemplateFields.PAGES, pages, template, indenting=True)
-    fill_each(TemplateFields.CARDS_TOTAL, str(cards_total), template)
-    fill_each(TemplateFields.PAGES_TOTAL, str(pages_total), template)
+
+    render_data = fill_index_fields(template, pages_total, cards_total, definitions)
+
+    return template.content, render_data
+
+
+def deferred_total(name: str) -> str:
+    """ Return an element that stands in for a total that is not known until every page has been
+        written; the element is populated once it is (see IndexWriter).
+    """
+
+    return '<span class="deferred-total" data-total="{0}"></span>'.format(name)
+
+
+def fill_index_fields(template: Template,
+                      pages_total: int,
+                      cards_total: int,
+                      definitions: dict) -> TemplateRenderData:
+    """ Populate the fields of an index template that can also occur on its pages.
+
+        Any total that is not specified is deferred (see deferred_total()).
+    """
+
+    fill_each(TemplateFields.CARDS_TOTAL,
+              str(cards_total) if cards_total is not None else deferred_total('cards'),
+              template)
+    fill_each(TemplateFields.PAGES_TOTAL,
+              str(pages_total) if pages_total is not None else deferred_total('pages'),
+              template)
     fill_each(TemplateFields.PROGRAM_VERSION, __version__, template)
 
     # note that most of these fields could potentially be filled already when first getting the
@@ -667,11 +695,134 @@ def fill_index(index: str,
     # fill any image fields that might have appeared by populating the metadata fields
     image_paths_from_index = fill_image_fields(template)
 
-    return template.content, TemplateRenderData(
+    return TemplateRenderData(
         image_paths=set(image_paths_from_index),
         referenced_definitions=referenced_definitions)
 
 
+class IndexWriter:
+    """ Writes an index template to a stream, populated one page at a time as pages are laid out.
+
+        What is written is the same as the index populated by fill_index(), but only a single page
+        is held in memory at any time.
+
+        The total number of pages and cards is rarely known before every page has been laid out;
+        unless specified up front, totals are deferred (see deferred_total()) and populated by
+        a trailer written after the pages. Likewise, styles that are not specified up front
+        (e.g. because cards are still being resolved) are written in the trailer.
+    """
+
+    # stands in for the pages while the rest of the index is populated
+    PAGES_PLACEHOLDER = '\x00pages\x00'
+
+    # populates every deferred total; the trailer is loaded after every page holding them
+    TOTALS_SCRIPT = ('<script type="text/javascript">\n'
+                     '  (function (totals) {{\n'
+                     '    var fields = document.getElementsByClassName("deferred-total");\n'
+                     '\n'
+                     '    for (var i = 0; i < fields.length; i++) {{\n'
+                     '      fields[i].textContent = totals[fields[i].getAttribute("data-total")];\n'
+                     '    }}\n'
+                     '  }})({0});\n'
+                     '</script>')
+
+    def __init__(self,
+                 stream,
+                 index: str,
+                 style: str,
+                 header: str,
+                 pages_total: int,
+                 cards_total: int,
+                 definitions: dict):
+        self.stream = stream
+        self.pages_total = pages_total
+        self.cards_total = cards_total
+        self.definitions = definitions
+
+        content, self.render_data = fill_index(
+            index, style if style is not None else '<!-- styles follow the pages -->',
+            IndexWriter.PAGES_PLACEHOLDER, header, pages_total, cards_total, definitions)
+
+        self.head, self.tail = content.split(IndexWriter.PAGES_PLACEHOLDER, 1)
+
+        # pages are indented to where the pages field began (see get_padded_string())
+        self.padding = ' ' * (len(self.head) - (self.head.rfind('\n') + 1))
+
+        # whether the last line written has ended; if so, the next line is indented
+        self.is_line_ended = False
+        # indented pages are stripped of trailing whitespace; but only at the very end
+        self.trailing_whitespace = ''
+
+    def begin(self) -> None:
+        """ Write everything that comes before the pages. """
+
+        self.stream.write(self.head)
+
+    def write_page(self, page: str) -> None:
+        """ Write a page, populating any index fields on it. """
+
+        if len(self.padding) == 0:
+            self.write_content(page)
+
+            return
+
+        content = self.trailing_whitespace
+
+        for line in page.splitlines(keepends=True):
+            if self.is_line_ended:
+                content += self.padding
+
+            content += line
+
+            self.is_line_ended = line.splitlines()[0] != line
+
+        stripped_content = content.rstrip()
+
+        self.trailing_whitespace = content[len(stripped_content):]
+
+        if len(stripped_content) > 0:
+            self.write_content(stripped_content)
+
+    def write_content(self, content: str) -> None:
+        template = Template(str(TemplateField(name=TemplateFields.PAGES)))
+
+        # populated as the pages field; i.e. exactly like fill_index() does it
+        fill_each(TemplateFields.PAGES, content, template)
+
+        render_data = fill_index_fields(
+            template, self.pages_total, self.cards_total, self.definitions)
+
+        self.render_data.image_paths |= render_data.image_paths
+        self.render_data.referenced_definitions |= render_data.referenced_definitions
+
+        self.stream.write(template.content)
+
+    def end(self, style: str=None, totals: dict=None) -> TemplateRenderData:
+        """ Write everything that comes after the pages; including a trailer with any styles or
+            totals (e.g. {'pages': 2, 'cards': 18}) that were not known up front.
+
+            Return the render data of the index as a whole.
+        """
+
+        trailer = []
+
+        if style is not None and len(style) > 0:
+            trailer.append(style)
+
+        if totals is not None and len(totals) > 0:
+            trailer.append(IndexWriter.TOTALS_SCRIPT.format(json.dumps(totals, sort_keys=True)))
+
+        if len(trailer) > 0:
+            # indented like the pages
+            self.stream.write('\n\n' + '\n'.join(
+                self.padding + line if len(line) > 0 else line
+                for line in '\n\n'.join(trailer).splitlines()))
+
+        self.stream.write(self.tail)
+
+        return self.render_data
+
+
 def fill_template(template: Template,
                   row: Row,
                   definitions: dict) -> TemplateRenderData:
@@ -779,12 +930,14 @@ def fill_empty_fields(template: Template) -> None:
     fill_each('', '', template)
 
 
-def fill_card(template: Template,
-              row: Row,
-              card_index: int,
-              card_copy_index: int,
-              definitions: dict) -> (str, TemplateRenderData):
-    """ Return the contents of a card using the specified template. """
+def fill_card_fragment(template: Template,
+                       row: Row,
+                       definitions: dict) -> (str, TemplateRenderData):
+    """ Return the contents of a card using the specified template, leaving index fields as is.
+
+        The resulting fragment is the same for every copy of a card; only the index fields
+        differ between copies (see fill_card_index).
+    """
 
     # attempt to fill all fields discovered in the template using the data for this card
     render_data = fill_template(template, row, definitions)
@@ -795,11 +948,6 @@ def fill_card(template: Template,
     # fill all template path fields (usually used for error templates)
     fill_each(TemplateFields.CARD_TEMPLATE_PATH, template.path, template)
 
-    # fill all card index fields
-    fill_each(TemplateFields.CARD_INDEX, str(card_index), template)
-
-    fill_each(TemplateFields.CARD_COPY_INDEX, str(card_copy_index), template)
-
     # card data might contain the following fields, but they would not have been rendered
     # during fill_template(), so make sure to remove them from the missing list if necessary
     except_fields = {TemplateFields.CARD_INDEX,
@@ -811,3 +959,64 @@ def fill_card(template: Template,
     render_data.unknown_fields -= except_fields
 
     return template.content, render_data
+
+
+def fill_card_index(template: Template,
+                    card_index: int,
+                    card_copy_index: int) -> str:
+    """ Populate the index fields of a card fragment and return its contents. """
+
+    # fill all card index fields
+    fill_each(TemplateFields.CARD_INDEX, str(card_index), template)
+
+    fill_each(TemplateFields.CARD_COPY_INDEX, str(card_copy_index), template)
+
+    return template.content
+
+
+def fill_card(template: Template,
+              row: Row,
+              card_index: int,
+              card_copy_index: int,
+              definitions: dict) -> (str, TemplateRenderData):
+    """ Return the contents of a card using the specified template. """
+
+    _, render_data = fill_card_fragment(template, row, definitions)
+
+    return fill_card_index(template, card_index, card_copy_index), render_data
+
+
+def included_paths(content: str, relative_to_path: str=None) -> List[str]:
+    """ Return the paths of all files that would be included by any include fields in content.
+
+        Nested includes are followed; note that, like in fill_include_fields, any path is
+        resolved relative to the originating path rather than the including file.
+    """
+
+    paths = []
+
+    pending_contents = [content]
+
+    while len(pending_contents) > 0:
+        for field in fields(pending_contents.pop(), with_name_like='include|inline'):
+            if field.context is None:
+                continue
+
+            include_path = dequote(field.context).strip()
+
+            if len(include_path) == 0:
+                continue
+
+            if not os.path.isabs(include_path) and relative_to_path is not None:
+                include_path = os.path.join(os.path.dirname(relative_to_path), include_path)
+
+            if include_path in paths:
+                continue
+
+            paths.append(include_path)
+
+            if os.path.isfile(include_path):
+                with open(include_path) as include_file:
+                    pending_contents.append(include_file.read())
+
+    return paths
@@ -35,7 +35,8 @@ class TemplateField:  # pylint: disable=too-few-public-methods
     def has_row_reference(self) -> bool:
         """ Determine whether a field holds a row reference. """
 
-        return (self.context.startswith('#')
+        # e.g. '#6', '#name=Elves' or 'factions.csv#6' (see parse_row_reference())
+        return (parse_row_reference(self.context)[0] is not None
                 if self.context is not None
                 else False)
 
@@ -75,3 +76,51 @@ def fields(content: str,
 
         if satisfies_filter:
             yield field
+
+
+def parse_row_reference(context: str) -> (str, int, str, str):
+    """ Return the datasource path, row index, key column and key of a row reference.
+
+        A row is referenced either by its row index (e.g. '#6') or by the key it holds in a column
+        (e.g. '#name=Elves'), and optionally in another datasource (e.g. 'factions.csv#6').
+        The datasource path is empty for a row in the same datasource.
+
+        If the context is not a row reference, the datasource path is None; e.g. for 'note #3'
+        or 'https://example.com/a#b=c', as the text before '#' is not the path of a datasource.
+    """
+
+    data_path, separator, row_reference = context.partition('#')
+
+    if len(separator) == 0:
+        return None, None, None, None
+
+    data_path = data_path.strip()
+
+    if len(data_path) > 0 and not is_datasource_path(data_path):
+        return None, None, None, None
+
+    try:
+        return data_path, int(row_reference), None, None
+    except ValueError:
+        pass
+
+    key_column, separator, key = row_reference.partition('=')
+
+    key_column = key_column.lower().strip()
+
+    if len(separator) == 0 or len(key_column) == 0:
+        return None, None, None, None
+
+    return data_path, None, key_column, key.strip()
+
+
+def is_datasource_path(data_path: str) -> bool:
+    """ Determine whether a path, as written in a row reference, can lead to a datasource;
+        i.e. it holds no whitespace and ends with the extension of a known format.
+    """
+
+    # the readers depend on this module (through column.py); so they are imported only here
+    from cards.reader import has_datasource_extension
+
+    return (not any(character.isspace() for character in data_path) and
+            has_datasource_extension(data_path))
@@ -0,0 +1,149 @@
+# coding=utf-8
+
+"""
+This module provides a check for newer versions of cards.py.
+
+The check never delays a command: it runs in the background, and only once a day at most.
+Its outcome is kept on disk, so that a newer version is still announced by later commands;
+even if the check did not finish before the command that started it.
+
+The check can be disabled entirely (e.g. on build agents without network access) by setting
+the CARDS_NO_UPDATE_CHECK environment variable.
+"""
+
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+
+from cards.constants import VERSION_PATTERN
+from cards.util import version_key, get_user_cache_path
+from cards.version import __version__
+
+# the environment variable that disables the check when set (to anything but '0')
+UPDATE_CHECK_VARIABLE = 'CARDS_NO_UPDATE_CHECK'
+
+UPDATE_CHECK_URL = 'https://raw.githubusercontent.com/jhauberg/cards.py/master/cards/version.py'
+
+# the least amount of time between checks (in seconds)
+UPDATE_CHECK_INTERVAL = 24 * 60 * 60
+
+
+def is_update_check_disabled() -> bool:
+    value = os.environ.get(UPDATE_CHECK_VARIABLE, '').strip()
+
+    return len(value) > 0 and value.lower() not in ['0', 'false', 'no']
+
+
+def get_update_check_path() -> str:
+    """ Return the path of the file that the outcome of the latest check is kept in. """
+
+    return os.path.join(get_user_cache_path(), 'update.json')
+
+
+def fetch_latest_version(timeout: float=5) -> str:
+    """ Return the identifier of the latest version available remotely, if it can be found. """
+
+    from urllib.request import urlopen
+
+    try:
+        with urlopen(UPDATE_CHECK_URL, timeout=timeout) as response:
+            # we're certain this file is UTF8, so we'll decode it right away
+            response_body = response.read().decode('utf8')
+    except (OSError, ValueError):
+        # fail silently; e.g. when offline, or timed out
+        return None
+
+    matches = re.search(VERSION_PATTERN, response_body, re.M)
+
+    return matches.group(1) if matches else None
+
+
+class UpdateCheck:
+    """ Represents a check for a newer version, running in the background. """
+
+    def __init__(self, path: str, interval: float=UPDATE_CHECK_INTERVAL):
+        self.path = path
+        self.interval = interval
+
+        self.thread = None
+
+    def read(self) -> dict:
+        """ Return the outcome of the latest check, if any. """
+
+        try:
+            with open(self.path) as update_file:
+                outcome = json.load(update_file)
+        except (IOError, ValueError):
+            return {}
+
+        return outcome if isinstance(outcome, dict) else {}
+
+    def write(self, latest_version: str, checked_at: float) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            # write to a temporary file first, so that the outcome is never read half-written
+            with tempfile.NamedTemporaryFile(
+                    'w', dir=os.path.dirname(self.path), delete=False) as update_file:
+                json.dump({'latest_version': latest_version,
+                           'checked_at': checked_at}, update_file)
+
+            os.replace(update_file.name, self.path)
+        except OSError:
+            # fail silently; e.g. when the cache directory is read-only
+            pass
+
+    def is_due(self, now: float=None) -> bool:
+        """ Determine whether enough time has passed since the latest check to check again. """
+
+        now = now if now is not None else time.time()
+
+        checked_at = self.read().get('checked_at')
+
+        if not isinstance(checked_at, (int, float)):
+            return True
+
+        # note that a check seemingly made in the future is also due; the clock may be off
+        return not 0 <= now - checked_at < self.interval
+
+    def run(self) -> None:
+        # the outcome is kept even if the check failed, so that it is not retried on every command
+        self.write(fetch_latest_version(), time.time())
+
+    def start(self) -> None:
+        """ Start checking in the background, if it is time to do so. """
+
+        if self.is_due():
+            # a daemon thread never keeps the program from exiting
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def newer_version(self) -> str:
+        """ Return the identifier of a newer version, if one is known to be available.
+
+            Never waits for a check that is still running; the outcome of the latest finished
+            check is used instead.
+        """
+
+        latest_version = self.read().get('latest_version')
+
+        if (isinstance(latest_version, str) and
+                version_key(__version__) < version_key(latest_version)):
+            return latest_version
+
+        return None
+
+
+def start_update_check() -> UpdateCheck:
+    """ Start checking for a newer version in the background, unless disabled. """
+
+    if is_update_check_disabled():
+        return None
+
+    update_check = UpdateCheck(get_update_check_path())
+    update_check.start()
+
+    return update_check
@@ -5,6 +5,7 @@ This module provides utility functions for common file, path, data and string op
 """
 
 import os
+import re
 import sys
 import math
 import subprocess
@@ -71,16 +72,19 @@ def directory_size(directory_path: str) -> int:
     return size_in_bytes
 
 
-def first(iterable):
-    """ Return the first object in an iterable, if any. """
+def get_user_cache_path() -> str:
+    """ Return the path of the directory that cards.py keeps files in between commands. """
 
-    return next(iterable, None)
+    cache_path = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
 
+    return os.path.join(cache_path, 'cards.py')
 
-def most_common(objects: list) -> object:
-    """ Return the object that occurs most frequently in a list of objects. """
 
-    return max(set(objects), key=objects.count)
+def first(iterable):
+    """ Return the first object in an iterable, if any. """
+
+    return next(iterable, None)
 
 
 def lower_first_row(rows):
@@ -89,6 +93,28 @@ def lower_first_row(rows):
     return itertools.chain([next(rows).lower()], rows)
 
 
+def version_key(version_identifier: str) -> tuple:
+    """ Return a key that orders version identifiers by precedence; e.g. '0.6.10' > '0.6.9'.
+
+        Any pre-release (e.g. '0.7.0b1') is ordered before its release (e.g. '0.7.0').
+    """
+
+    match = re.match(r'\s*v?(\d+(?:\.\d+)*)(.*)', version_identifier)
+
+    if match is None:
+        return (), 0, version_identifier
+
+    numbers = [int(number) for number in match.group(1).split('.')]
+
+    # trailing zeroes do not matter; e.g. '1.0' is the same version as '1.0.0'
+    while len(numbers) > 1 and numbers[-1] == 0:
+        numbers.pop()
+
+    pre_release = match.group(2).strip()
+
+    return tuple(numbers), 0 if len(pre_release) > 0 else 1, pre_release
+
+
 def dequote(string: str) -> str:
     """ Return string by removing surrounding double or single quotes. """
 
@@ -0,0 +1,148 @@
+# coding=utf-8
+
+"""
+This module provides functions for reading build variants.
+
+A variant is a set of layout options (e.g. card size or whether to render backs) that produces
+a single output file. Every variant of a build is laid out from the same resolved cards, so
+several outputs can be made without parsing or rendering any card more than once.
+
+Variants are specified in a datasource-like file; for example:
+
+    output-file,datasources,card-size,preview,disable-backs
+    index.html,,,,
+    proof.html,,,yes,
+    fronts.html,,,,yes
+    tokens.html,tokens.csv,token,,
+
+Any option left empty uses the value specified on the command-line instead.
+"""
+
+import os
+import csv
+
+from cards.column import Row
+from cards.warning import WarningDisplay, WarningContext
+
+from cards.util import FileWrapper, lower_first_row
+
+
+class VariantColumns:  # pylint: disable=too-few-public-methods
+    """ Column names for variants. """
+
+    OUTPUT_FILE = 'output-file'
+    DATASOURCES = 'datasources'
+    CARD_SIZE = 'card-size'
+    PREVIEW = 'preview'
+    DISABLE_BACKS = 'disable-backs'
+    FORCE_PAGE_BREAKS = 'force-page-breaks'
+    DISABLE_PAGE_SECTIONS = 'disable-page-sections'
+
+
+class BuildVariant:  # pylint: disable=too-few-public-methods
+    """ Represents the options for laying out resolved cards into a single output file. """
+
+    def __init__(self,
+                 output_filename: str,
+                 datasources: list=None,
+                 default_card_size_identifier: str='standard',
+                 force_page_breaks: bool=False,
+                 should_disable_backs: bool=False,
+                 should_disable_page_sections: bool=False,
+                 is_preview: bool=False):
+        self.output_filename = output_filename
+        # the names or paths of the datasources to include; all datasources if None
+        self.datasources = datasources
+        self.default_card_size_identifier = default_card_size_identifier
+        self.force_page_breaks = force_page_breaks
+        self.should_disable_backs = should_disable_backs
+        self.should_disable_page_sections = should_disable_page_sections
+        self.is_preview = is_preview
+
+    def includes(self, context: str, data_path: str) -> bool:
+        """ Determine whether the cards of a datasource should be included in this variant. """
+
+        return (self.datasources is None or
+                context in self.datasources or
+                data_path in self.datasources)
+
+
+def is_enabled(value: str) -> bool:
+    """ Determine whether an option value enables the option. """
+
+    return value.strip().lower() in ['yes', 'y', 'true', '1', 'x']
+
+
+def get_variants_from_file(path: str, default_variant: BuildVariant) -> list:
+    """ Return a list of all variants found in file.
+
+        Any option not specified by a variant is taken from the default variant.
+    """
+
+    variants = []
+
+    if not os.path.isfile(path):
+        WarningDisplay.bad_variants_file_error(path)
+
+        return variants
+
+    context = os.path.basename(path)
+
+    with open(path) as data_file_raw:
+        data_file = FileWrapper(data_file_raw)
+        data = csv.DictReader(lower_first_row(data_file))
+
+        data.fieldnames = [column_name.strip() for column_name in data.fieldnames]
+
+        row_index = 1
+
+        for row in data:
+            row_index += 1
+
+            if Row.is_excluded(data_file.raw_line):
+                continue
+
+            def option(column: str) -> str:
+                value = row.get(column, None)
+
+                return value.strip() if value is not None and len(value.strip()) > 0 else None
+
+            output_filename = option(VariantColumns.OUTPUT_FILE)
+
+            if output_filename is None:
+                WarningDisplay.missing_variant_output_file(
+                    WarningContext(context, row_index))
+
+                continue
+
+            datasources = option(VariantColumns.DATASOURCES)
+            card_size = option(VariantColumns.CARD_SIZE)
+            preview = option(VariantColumns.PREVIEW)
+            disable_backs = option(VariantColumns.DISABLE_BACKS)
+            force_page_breaks = option(VariantColumns.FORCE_PAGE_BREAKS)
+            disable_page_sections = option(VariantColumns.DISABLE_PAGE_SECTIONS)
+
+            variants.append(BuildVariant(
+                output_filename,
+                datasources.split() if datasources is not None else default_variant.datasources,
+                card_size if card_size is not None
+                else default_variant.default_card_size_identifier,
+                is_enabled(force_page_breaks) if force_page_breaks is not None
+                else default_variant.force_page_breaks,
+                is_enabled(disable_backs) if disable_backs is not None
+                else default_variant.should_disable_backs,
+                is_enabled(disable_page_sections) if disable_page_sections is not None
+                else default_variant.should_disable_page_sections,
+                is_enabled(preview) if preview is not None
+                else default_variant.is_preview))
+
+    return variants
+
+
+def get_variants(path: str, default_variant: BuildVariant) -> list:
+    """ Return a list of all variants found in file, or just the default variant if no file. """
+
+    if path is None:
+        return [default_variant]
+
+    return get_variants_from_file(path, default_variant)
@@ -1,6 +1,9 @@
 # coding=utf-8
 
+import json
+
 from cards.constants import Columns
+from cards.context import BuildContext
 
 from cards.util import terminal_supports_color
 
@@ -20,6 +23,18 @@ class WarningContext:  # pylint: disable=too-few-public-methods
         self.card_copy_index = card_copy_index
         self.column = column
 
+    def fields(self) -> tuple:
+        return self.name, self.row_index, self.card_index, self.card_copy_index, self.column
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'row_index': self.row_index,
+            'card_index': self.card_index,
+            'card_copy_index': self.card_copy_index,
+            'column': self.column
+        }
+
     def __repr__(self):
         return str(self)
 
@@ -46,96 +61,233 @@ class WarningContext:  # pylint: disable=too-few-public-methods
         return ''
 
 
-def warn(message: str,
+class Severity:  # pylint: disable=too-few-public-methods
+    """ Represents the severity of a diagnostic. """
+
+    ERROR = 'error'
+    WARNING = 'warning'
+    INFO = 'info'
+
+
+class Diagnostic:  # pylint: disable=too-few-public-methods
+    """ Represents a warning, error or info raised during a build.
+
+        A diagnostic only keeps its kind, context and arguments; the message is not formatted
+        until it is actually displayed (or exported).
+
+        Messages are format strings that refer to their arguments by position, and can apply
+        colors using the named fields {color}, {underline}, {normal} and {normal_underline}.
+    """
+
+    __slots__ = ['kind', 'severity', 'message', 'args', 'context', 'cards_affected',
+                 'times_raised', 'is_displayed']
+
+    def __init__(self,
+                 kind: str,
+                 severity: str,
+                 message: str,
+                 args: tuple=(),
+                 context: WarningContext=None,
+                 cards_affected: int=None):
+        self.kind = kind
+        self.severity = severity
+        self.message = message
+        self.args = args
+        self.context = context
+        self.cards_affected = cards_affected
+        self.times_raised = 0
+        self.is_displayed = False
+
+    def formatted_message(self, is_colored: bool=False) -> str:
+        """ Return the message of the diagnostic, with all arguments applied. """
+
+        if is_colored:
+            if self.severity == Severity.ERROR:
+                color = WarningDisplay.apply_error_color
+                underline = WarningDisplay.apply_error_color_underlined
+            elif self.severity == Severity.WARNING:
+                color = WarningDisplay.apply_warning_color
+                underline = WarningDisplay.apply_warning_color_underlined
+            else:
+                color = WarningDisplay.apply_info_color
+                underline = WarningDisplay.apply_info_color_underlined
+
+            message = self.message.format(
+                *self.args,
+                color=color, underline=underline,
+                normal=WarningDisplay.apply_normal_color,
+                normal_underline=WarningDisplay.apply_normal_color_underlined)
+        else:
+            message = self.message.format(
+                *self.args,
+                color='', underline='', normal='', normal_underline='')
+
+        if self.cards_affected is not None and self.cards_affected > 1:
+            message = '{1} ({0} cards)'.format(self.cards_affected, message)
+
+        return message
+
+    def __str__(self):
+        if self.severity == Severity.ERROR:
+            message_context = '[!]'
+            color = WarningDisplay.apply_error_color
+        elif self.severity == Severity.WARNING:
+            message_context = '[?]'
+            color = WarningDisplay.apply_warning_color
+        else:
+            message_context = '[-]'
+            color = WarningDisplay.apply_info_color
+
+        message = self.formatted_message(is_colored=True)
+        message = '{0} {1}'.format(self.context, message) if self.context is not None else message
+        message = '{0} {1}'.format(message_context, message)
+
+        return color + message + WarningDisplay.apply_normal_color
+
+    def to_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'severity': self.severity,
+            'message': self.formatted_message(),
+            'context': self.context.to_dict() if self.context is not None else None,
+            'args': list(self.args),
+            'cards_affected': self.cards_affected,
+            'times_raised': self.times_raised
+        }
+
+
+def raise_diagnostic(kind: str,
+                     severity: str,
+                     message: str,
+                     args: tuple,
+                     in_context: WarningContext=None,
+                     cards_affected: int=None) -> Diagnostic:
+    """ Record a diagnostic in the active build context.
+
+        Diagnostics are deduplicated on their kind, context and arguments; raising the same
+        diagnostic again returns the diagnostic that was recorded the first time.
+    """
+
+    if cards_affected is not None and cards_affected < 2:
+        # only a count of more than one card is ever shown
+        cards_affected = None
+
+    key = (kind, message,
+           tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args),
+           in_context.fields() if in_context is not None else None,
+           cards_affected)
+
+    diagnostics = BuildContext.current().diagnostics
+
+    diagnostic = diagnostics.get(key)
+
+    if diagnostic is None:
+        diagnostic = Diagnostic(kind, severity, message, args, in_context, cards_affected)
+
+        diagnostics[key] = diagnostic
+
+    diagnostic.times_raised += 1
+
+    return diagnostic
+
+
+def warn(kind: str,
+         message: str,
+         *args,
          in_context: WarningContext=None,
          cards_affected: int=None,
          as_error=False) -> None:
     """ Display a command-line warning message, optionally within a context. """
 
-    color = (WarningDisplay.apply_error_color if as_error
-             else WarningDisplay.apply_warning_color)
+    context = BuildContext.current()
 
-    message_context = '[{0}]'.format('!' if as_error else '?')
+    context.raised_count += 1
 
-    if cards_affected is not None and cards_affected > 1:
-        message = '{1} ({0} cards)'.format(cards_affected, message)
+    diagnostic = raise_diagnostic(kind, Severity.ERROR if as_error else Severity.WARNING,
+                                  message, args, in_context, cards_affected)
 
-    if display(message, message_context, in_context, apply_color=color, force_verbosity=as_error):
+    if display(diagnostic, force_verbosity=as_error):
         # only trigger an increment if the message was shown (or should have been, if verbose)
         if as_error:
-            WarningDisplay.error_count += 1
+            context.error_count += 1
         else:
-            WarningDisplay.warning_count += 1
+            context.warning_count += 1
 
 
-def info(message: str, in_context: WarningContext=None) -> None:
+def info(kind: str,
+         message: str,
+         *args,
+         in_context: WarningContext=None) -> None:
     """ Display a command-line info message, optionally within a context. """
 
-    message_context = '[-]'
-
-    color = WarningDisplay.apply_info_color
+    diagnostic = raise_diagnostic(kind, Severity.INFO, message, args, in_context)
 
-    display(message, message_context, in_context, apply_color=color, force_verbosity=True)
+    display(diagnostic, force_verbosity=True)
 
 
-def display(message: str,
-            message_context: str=None,
-            in_context: WarningContext=None,
-            apply_color: str='',
+def display(diagnostic: Diagnostic,
             force_verbosity: bool=False) -> bool:
-    """ Display a command-line message.
+    """ Display a diagnostic as a command-line message.
 
         Return True if the message was displayed (or should have been, if verbose).
         Return False otherwise.
 
-        The message can be optionally colored and will be properly color-terminated on print.
-
         The message will only display if verbosity is toggled, and the same message will only ever
         be displayed once.
     """
 
-    message = '{0} {1}'.format(in_context, message) if in_context is not None else message
-    message = '{0} {1}'.format(message_context, message) if message_context is not None else message
+    if diagnostic.is_displayed:
+        return False
 
-    message = apply_color + message + WarningDisplay.apply_normal_color
+    context = BuildContext.current()
 
-    times_displayed = WarningDisplay.messages.get(message, 0)
+    if context.is_verbose or force_verbosity:
+        if context.progress is not None:
+            # make room for the message
+            context.progress.clear()
 
-    if times_displayed < 1:
-        if WarningDisplay.is_verbose or force_verbosity:
-            # only print warnings if verbose flag is enabled, or verbosity is forced
-            # (e.g. for errors or info)
-            print(message)
+        # only print warnings if verbose flag is enabled, or verbosity is forced
+        # (e.g. for errors or info)
+        print(diagnostic)
 
-            WarningDisplay.messages[message] = times_displayed + 1
+        diagnostic.is_displayed = True
 
-        # but do return that it would have been printed
-        return True
+        context.displayed_count += 1
 
-    return False
+    # but do return that it would have been printed
+    return True
+
+
+def save_diagnostics(path: str) -> None:
+    """ Save every diagnostic raised in the active build context as JSON Lines.
+
+        Each line holds a single diagnostic; including any that were not displayed.
+    """
+
+    with open(path, 'w', encoding='utf-8') as diagnostics_file:
+        for diagnostic in BuildContext.current().diagnostics.values():
+            # arguments are usually strings or numbers, but anything else is written as a string
+            diagnostics_file.write(json.dumps(diagnostic.to_dict(), default=str))
+            diagnostics_file.write('\n')
 
 
 class WarningDisplay:
-    """ Provides functions for conveniently displaying and tracking warning/error messages. """
+    """ Provides functions for conveniently displaying and tracking warning/error messages.
 
-    messages = {}
+        Any messages and counts are tracked by the active build context (see BuildContext).
+    """
 
     @staticmethod
     def has_displayed_messages() -> bool:
-        return len(WarningDisplay.messages) > 0
+        return BuildContext.current().displayed_count > 0
 
     @staticmethod
     def has_encountered_errors() -> bool:
-        return WarningDisplay.error_count > 0
+        return BuildContext.current().error_count > 0
 
     @staticmethod
     def has_encountered_warnings() -> bool:
-        return WarningDisplay.warning_count > 0
-
-    warning_count = 0
-    error_count = 0
-
-    is_verbose = False
+        return BuildContext.current().warning_count > 0
 
     # lots of colors defined here: http://stackoverflow.com/a/21786287/144433
 
@@ -150,63 +302,68 @@ class WarningDisplay:
 
     @staticmethod
     def newer_version_available(new_version_identifier: str) -> None:
-        display('A newer version is available ({0})'
-                .format(new_version_identifier),
-                apply_color=WarningDisplay.apply_info_color,
-                force_verbosity=True)
+        # not a diagnostic of the build; always shown as is
+        print(WarningDisplay.apply_info_color +
+              'A newer version is available ({0})'.format(new_version_identifier) +
+              WarningDisplay.apply_normal_color)
 
     @staticmethod
     def could_not_make_new_project_error(at_destination_path: str,
                                          already_exists: bool=False,
                                          reason: str=None) -> None:
         if already_exists:
-            warn('Could not create empty project at: {0}\'{1}\'{2}; the directory already exists'
-                 .format(WarningDisplay.apply_error_color_underlined, at_destination_path,
-                         WarningDisplay.apply_error_color),
+            warn('could_not_make_new_project_error',
+                 'Could not create empty project at: {underline}\'{0}\'{color}; '
+                 'the directory already exists',
+                 at_destination_path,
                  as_error=True)
         else:
             if reason is not None and len(reason) > 0:
-                warn('Could not create empty project at: {0}\'{1}\'{2}. {3}'
-                     .format(WarningDisplay.apply_error_color_underlined, at_destination_path,
-                             WarningDisplay.apply_error_color, reason),
+                warn('could_not_make_new_project_error',
+                     'Could not create empty project at: {underline}\'{0}\'{color}. {1}',
+                     at_destination_path, reason,
                      as_error=True)
             else:
-                warn('Could not create empty project at: {0}\'{1}\'{2}'
-                     .format(WarningDisplay.apply_error_color_underlined, at_destination_path,
-                             WarningDisplay.apply_error_color),
+                warn('could_not_make_new_project_error',
+                     'Could not create empty project at: {underline}\'{0}\'{color}',
+                     at_destination_path,
                      as_error=True)
 
     @staticmethod
     def no_datasources() -> None:
-        warn('Specify at least one datasource (or a directory with datasources)',
+        warn('no_datasources',
+             'Specify at least one datasource (or a directory with datasources)',
              as_error=True)
 
     @staticmethod
     def unused_resources(resource_filenames: list, in_resource_dir: str) -> None:
-        warn('Unused resources were found (in {0}\'{1}\'{2}): {3}'
-             .format(WarningDisplay.apply_normal_color_underlined, in_resource_dir,
-                     WarningDisplay.apply_normal_color, resource_filenames))
+        warn('unused_resources',
+             'Unused resources were found (in {normal_underline}\'{0}\'{normal}): {1}',
+             in_resource_dir, resource_filenames)
 
     @staticmethod
     def unused_resources_were_cleaned(resource_filenames: list, in_resource_dir: str) -> None:
-        warn('Unused resources were found and removed (in {0}\'{1}\'{2}): {3}'
-             .format(WarningDisplay.apply_normal_color_underlined, in_resource_dir,
-                     WarningDisplay.apply_normal_color, resource_filenames))
+        warn('unused_resources_were_cleaned',
+             'Unused resources were found and removed '
+             '(in {normal_underline}\'{0}\'{normal}): {1}',
+             in_resource_dir, resource_filenames)
 
     @staticmethod
     def resource_was_overwritten(context: WarningContext,
                                  resource_path: str,
                                  relative_source_path: str) -> None:
-        warn('The resource \'{0}\' was overwritten by \'{1}\''
-             .format(resource_path, relative_source_path),
+        warn('resource_was_overwritten',
+             'The resource \'{0}\' was overwritten by \'{1}\'',
+             resource_path, relative_source_path,
              in_context=context)
 
     @staticmethod
     def potential_ambiguous_references(context: WarningContext,
                                        ambiguous_references: list) -> None:
-        warn('You have ambiguous references that could refer to '
-             'both a column or a definition: {0}'
-             .format(ambiguous_references),
+        warn('potential_ambiguous_references',
+             'You have ambiguous references that could refer to '
+             'both a column or a definition: {0}',
+             ambiguous_references,
              in_context=context)
 
     @staticmethod
@@ -215,9 +372,10 @@ class WarningDisplay:
                                         result: str) -> None:
         truncated_result = (result if len(result) < 18 else result[:18] + '…')
 
-        warn('A reference named \'{0}\' could refer to both a column or a definition; '
-             'the column data \'{1}\' was used'
-             .format(reference, truncated_result),
+        warn('ambiguous_reference_used_column',
+             'A reference named \'{0}\' could refer to both a column or a definition; '
+             'the column data \'{1}\' was used',
+             reference, truncated_result,
              in_context=context)
 
     @staticmethod
@@ -226,148 +384,224 @@ class WarningDisplay:
                                             result: str) -> None:
         truncated_result = (result if len(result) < 18 else result[:18] + '…')
 
-        warn('A reference named \'{0}\' could refer to both a column or a definition; '
-             'the definition data \'{1}\' was used'
-             .format(reference, truncated_result),
+        warn('ambiguous_reference_used_definition',
+             'A reference named \'{0}\' could refer to both a column or a definition; '
+             'the definition data \'{1}\' was used',
+             reference, truncated_result,
              in_context=context)
 
     @staticmethod
     def unresolved_infinite_definition_reference(context: WarningContext, definition: str) -> None:
-        warn('The field \'{0}\' was not resolved; '
-             'it is referencing its own definition and would cause infinite recursion'
-             .format(definition),
+        warn('unresolved_infinite_definition_reference',
+             'The field \'{0}\' was not resolved; '
+             'it is referencing its own definition and would cause infinite recursion',
+             definition,
              in_context=context)
 
     @staticmethod
     def unresolved_infinite_column_reference(context: WarningContext, column: str) -> None:
-        warn('The field \'{0}\' was not resolved; '
-             'it is referencing its own column and would cause infinite recursion'
-             .format(column),
+        warn('unresolved_infinite_column_reference',
+             'The field \'{0}\' was not resolved; '
+             'it is referencing its own column and would cause infinite recursion',
+             column,
              in_context=context)
 
     @staticmethod
     def unresolved_reference(context: WarningContext, reference: str) -> None:
-        warn('The field \'{0}\' could not be resolved'
-             .format(reference),
+        warn('unresolved_reference',
+             'The field \'{0}\' could not be resolved',
+             reference,
              in_context=context)
 
     @staticmethod
     def unknown_size_specification(context: WarningContext,
                                    size_specification: str) -> None:
-        warn('The size specification \'{0}\' has not been defined; '
-             'the image might not display as expected'
-             .format(size_specification),
+        warn('unknown_size_specification',
+             'The size specification \'{0}\' has not been defined; '
+             'the image might not display as expected',
+             size_specification,
              in_context=context)
 
     @staticmethod
     def invalid_width_specification(context: WarningContext,
                                     width: int) -> None:
-        warn('An image cannot have a width of \'{0}\'; '
-             'the image will be displayed at its intrinsic size'
-             .format(width),
+        warn('invalid_width_specification',
+             'An image cannot have a width of \'{0}\'; '
+             'the image will be displayed at its intrinsic size',
+             width,
              in_context=context)
 
     @staticmethod
     def invalid_height_specification(context: WarningContext,
                                      height: int) -> None:
-        warn('An image cannot have a height of \'{0}\'; '
-             'the image will be displayed at its intrinsic size'
-             .format(height),
+        warn('invalid_height_specification',
+             'An image cannot have a height of \'{0}\'; '
+             'the image will be displayed at its intrinsic size',
+             height,
              in_context=context)
 
     @staticmethod
     def unresolved_image_reference_error(image_reference: str,
                                          closest_resolution_value: str) -> None:
-        warn('An image reference could not be resolved: \'{0}\'; '
-             'was it supposed to be: \'{1}\'?'
-             .format(image_reference, closest_resolution_value),
+        warn('unresolved_image_reference_error',
+             'An image reference could not be resolved: \'{0}\'; '
+             'was it supposed to be: \'{1}\'?',
+             image_reference, closest_resolution_value,
              as_error=True)
 
     @staticmethod
     def included_file_not_found_error(context: WarningContext,
                                       included_file_path: str) -> None:
-        warn('An included file was not found: {0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_error_color_underlined, included_file_path,
-                     WarningDisplay.apply_error_color),
+        warn('included_file_not_found_error',
+             'An included file was not found: {underline}\'{0}\'{color}',
+             included_file_path,
              in_context=context,
              as_error=True)
 
     @staticmethod
     def include_should_specify_file(context: WarningContext, is_inline: bool=False) -> None:
-        warn('{0} fields should specify a file path'
-             .format('Inline' if is_inline else 'Include'),
+        warn('include_should_specify_file',
+             '{0} fields should specify a file path',
+             'Inline' if is_inline else 'Include',
              in_context=context)
 
     @staticmethod
     def preview_enabled_info() -> None:
-        info('Preview is enabled; only 1 of each card will be rendered')
+        info('preview_enabled_info',
+             'Preview is enabled; only 1 of each card will be rendered')
+
+    @staticmethod
+    def layout_only_info() -> None:
+        info('layout_only_info',
+             'Only laying out pages; using cards resolved by a previous build')
+
+    @staticmethod
+    def layout_only_not_possible_info() -> None:
+        info('layout_only_not_possible_info',
+             'Cards have changed since the previous build (or were never resolved); '
+             'resolving all cards again')
 
     @staticmethod
     def image_not_copied(context: WarningContext,
                          image_path: str) -> None:
-        warn('An image was not copied to the output directory: {0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_warning_color_underlined, image_path,
-                     WarningDisplay.apply_warning_color),
+        warn('image_not_copied',
+             'An image was not copied to the output directory: {underline}\'{0}\'{color}',
+             image_path,
              in_context=context)
 
     @staticmethod
     def missing_image_error(context: WarningContext,
                             image_path: str) -> None:
-        warn('One or more cards contain an image reference that does not exist: {0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_error_color_underlined, image_path,
-                     WarningDisplay.apply_error_color),
+        warn('missing_image_error',
+             'One or more cards contain an image reference that does not exist: '
+             '{underline}\'{0}\'{color}',
+             image_path,
              in_context=context,
              as_error=True)
 
     @staticmethod
     def bad_definitions_file_error(definitions_path: str) -> None:
-        warn('No definitions file was found at: {0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_error_color_underlined, definitions_path,
-                     WarningDisplay.apply_error_color),
+        warn('bad_definitions_file_error',
+             'No definitions file was found at: {underline}\'{0}\'{color}',
+             definitions_path,
+             as_error=True)
+
+    @staticmethod
+    def bad_variants_file_error(variants_path: str) -> None:
+        warn('bad_variants_file_error',
+             'No variants file was found at: {underline}\'{0}\'{color}',
+             variants_path,
+             as_error=True)
+
+    @staticmethod
+    def missing_variant_output_file(context: WarningContext) -> None:
+        warn('missing_variant_output_file',
+             'The variant did not specify an output file; it will not be built',
+             in_context=context)
+
+    @staticmethod
+    def unknown_variant_datasources(output_filename: str, datasources: list) -> None:
+        warn('unknown_variant_datasources',
+             'The variant \'{0}\' includes datasources that were not built: {1}',
+             output_filename, datasources)
+
+    @staticmethod
+    def bad_shard_error(shard_path: str) -> None:
+        warn('bad_shard_error',
+             'No shard was found at: {underline}\'{0}\'{color}',
+             shard_path,
+             as_error=True)
+
+    @staticmethod
+    def mismatched_shard_error(shard_path: str) -> None:
+        warn('mismatched_shard_error',
+             'The shard at {underline}\'{0}\'{color} was not built from the same datasources '
+             'or shard count as the other shards; nothing will be merged',
+             shard_path,
+             as_error=True)
+
+    @staticmethod
+    def missing_shards_error(missing_shards: list) -> None:
+        warn('missing_shards_error',
+             'Some shards are either missing or duplicated ({0}); nothing will be merged',
+             missing_shards,
+             as_error=True)
+
+    @staticmethod
+    def invalid_shard_error(shard: str) -> None:
+        warn('invalid_shard_error',
+             'The shard \'{0}\' is invalid (should be specified as \'i/N\'; e.g. \'1/4\'); '
+             'nothing will be built',
+             shard,
              as_error=True)
 
     @staticmethod
     def bad_header_file_error(header_path: str) -> None:
-        warn('No header template was found at: {0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_error_color_underlined, header_path,
-                     WarningDisplay.apply_error_color),
+        warn('bad_header_file_error',
+             'No header template was found at: {underline}\'{0}\'{color}',
+             header_path,
              as_error=True)
 
     @staticmethod
     def using_automatically_found_definitions_info(definitions_path: str) -> None:
-        info('No definitions have been specified; using definitions automatically found at: '
-             '{0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_info_color_underlined, definitions_path,
-                     WarningDisplay.apply_info_color))
+        info('using_automatically_found_definitions_info',
+             'No definitions have been specified; using definitions automatically found at: '
+             '{underline}\'{0}\'{color}',
+             definitions_path)
 
     @staticmethod
     def assume_backs_info(context: WarningContext) -> None:
-        info('Card backs will be generated since the ' +
+        info('assume_backs_info',
+             'Card backs will be generated since the ' +
              '\'' + Columns.TEMPLATE_BACK + '\' column has been set '
              '(you can disable card backs by specifying the --disable-backs option)',
              in_context=context)
 
     @staticmethod
     def no_backs_info(context: WarningContext) -> None:
-        info('Card backs will not be generated since the '
+        info('no_backs_info',
+             'Card backs will not be generated since the '
              '\'' + Columns.TEMPLATE_BACK + '\' column has not been set',
              in_context=context)
 
     @staticmethod
     def indeterminable_count(context: WarningContext) -> None:
-        warn('The card provided an indeterminable count and was skipped',
+        warn('indeterminable_count',
+             'The card provided an indeterminable count and was skipped',
              in_context=context)
 
     @staticmethod
     def missing_default_template(context: WarningContext) -> None:
-        warn('A template was not provided and auto-templating is not enabled; '
+        warn('missing_default_template',
+             'A template was not provided and auto-templating is not enabled; '
              'cards will not be generated correctly',
              in_context=context)
 
     @staticmethod
     def missing_template_error(context: WarningContext,
                                cards_affected: int) -> None:
-        warn('The card did not provide a template',
+        warn('missing_template_error',
+             'The card did not provide a template',
              in_context=context, cards_affected=cards_affected,
              as_error=True)
 
@@ -376,26 +610,28 @@ class WarningDisplay:
                        template_path: str,
                        cards_affected: int,
                        is_back_template: bool=False) -> None:
-        warning = ('The card provided a back template that appears to be empty: {0}\'{1}\'{2}'
+        warning = ('The card provided a back template that appears to be empty: '
+                   '{underline}\'{0}\'{color}'
                    if is_back_template else
-                   'The card provided a template that appears to be empty: {0}\'{1}\'{2}; '
-                   'using an auto-template instead')
+                   'The card provided a template that appears to be empty: '
+                   '{underline}\'{0}\'{color}; using an auto-template instead')
 
-        warn(warning.format(WarningDisplay.apply_warning_color_underlined, template_path,
-                            WarningDisplay.apply_warning_color),
+        warn('empty_template', warning, template_path,
              in_context=context, cards_affected=cards_affected)
 
     @staticmethod
     def using_auto_template(context: WarningContext,
                             cards_affected: int) -> None:
-        warn('The card did not provide a template; using an auto-template instead',
+        warn('using_auto_template',
+             'The card did not provide a template; using an auto-template instead',
              in_context=context, cards_affected=cards_affected)
 
     @staticmethod
     def fields_in_styles(context: WarningContext, fields: list) -> None:
-        warn('The template embeds a style that contains fields that might not be '
-             'resolved properly: {0}'
-             .format(fields),
+        warn('fields_in_styles',
+             'The template embeds a style that contains fields that might not be '
+             'resolved properly: {0}',
+             fields,
              in_context=context)
 
     @staticmethod
@@ -419,7 +655,7 @@ class WarningDisplay:
                    'The template ({0}) contains a field that is not present for this card, '
                    'or could not be resolved: \'{1}\'')
 
-        warn(msg.format(template_path, unknown_fields),
+        warn('unknown_fields_in_template', msg, template_path, unknown_fields,
              in_context=context, cards_affected=cards_affected)
 
     @staticmethod
@@ -438,7 +674,7 @@ class WarningDisplay:
                        if is_back_template else
                        'The card has an unused column: \'{0}\'')
 
-        warn(warning.format(missing_fields),
+        warn('missing_fields_in_template', warning, missing_fields,
              in_context=context, cards_affected=cards_affected)
 
     @staticmethod
@@ -450,7 +686,7 @@ class WarningDisplay:
 
             warning = 'You have an unused definition: \'{0}\''
 
-        warn(warning.format(unused_definitions))
+        warn('unused_definitions', warning, unused_definitions)
 
     @staticmethod
     def invalid_columns_error(context: WarningContext,
@@ -462,16 +698,25 @@ class WarningDisplay:
 
             warning = 'Skipping datasource; a column name is invalid: {0}'
 
-        warn(warning.format(invalid_columns),
+        warn('invalid_columns_error', warning, invalid_columns,
              in_context=context,
              as_error=True)
 
     @staticmethod
     def bad_data_path_error(context: WarningContext,
                             data_path: str) -> None:
-        warn('The datasource could not be found at: {0}\'{1}\'{2}'
-             .format(WarningDisplay.apply_error_color_underlined, data_path,
-                     WarningDisplay.apply_error_color),
+        warn('bad_data_path_error',
+             'The datasource could not be found at: {underline}\'{0}\'{color}',
+             data_path,
+             in_context=context,
+             as_error=True)
+
+    @staticmethod
+    def unreadable_datasource_error(context: WarningContext,
+                                    reason: str) -> None:
+        warn('unreadable_datasource_error',
+             'Skipping datasource; it could not be read: {0}',
+             reason,
              in_context=context,
              as_error=True)
 
@@ -480,12 +725,13 @@ class WarningDisplay:
                                 template_path: str,
                                 cards_affected: int,
                                 is_back: bool=False) -> None:
-        warning = ('The card provided a back template that could not be opened: {0}\'{1}\'{2}'
+        warning = ('The card provided a back template that could not be opened: '
+                   '{underline}\'{0}\'{color}'
                    if is_back else
-                   'The card provided a template that could not be opened: {0}\'{1}\'{2}')
+                   'The card provided a template that could not be opened: '
+                   '{underline}\'{0}\'{color}')
 
-        warn(warning.format(WarningDisplay.apply_error_color_underlined, template_path,
-                            WarningDisplay.apply_error_color),
+        warn('bad_template_path_error', warning, template_path,
              in_context=context, cards_affected=cards_affected,
              as_error=True)
 
@@ -493,10 +739,16 @@ class WarningDisplay:
     def abort_unusually_high_count(context: WarningContext,
                                    count: int) -> bool:
         # arbitrarily determined amount- but if the count is really high it might just be an error
-        warn('The card has specified a high count: {0}. '
-             'Are you sure you want to continue?'.format(count),
+        warn('abort_unusually_high_count',
+             'The card has specified a high count: {0}. '
+             'Are you sure you want to continue?',
+             count,
              in_context=context)
 
+        if not BuildContext.current().is_interactive:
+            # nobody to ask; assume that the count is intended
+            return False
+
         answer = input('(Y)es or (n)o?').strip().lower()
 
         if answer == 'n' or answer == 'no':
@@ -507,36 +759,89 @@ class WarningDisplay:
     @staticmethod
     def bad_card_size(context: WarningContext,
                       size_identifier: str) -> None:
-        warn('The card size \'{0}\' is invalid; defaulting to \'standard\''
-             .format(size_identifier),
+        warn('bad_card_size',
+             'The card size \'{0}\' is invalid; defaulting to \'standard\'',
+             size_identifier,
              in_context=context)
 
+    @staticmethod
+    def bad_cache_size(size: str) -> None:
+        warn('bad_cache_size',
+             'The cache size \'{0}\' is invalid (should be a number of megabytes); '
+             'using the default size instead',
+             size)
+
+    @staticmethod
+    def bad_engine(engine: str, engines: list) -> None:
+        warn('bad_engine',
+             'The engine \'{0}\' is unknown (should be any of {1}); '
+             'using the reference engine instead',
+             engine, engines)
+
+    @staticmethod
+    def bad_jobs(jobs: str) -> None:
+        warn('bad_jobs',
+             'The number of jobs \'{0}\' is invalid (should be a number); '
+             'using the number of processors instead',
+             jobs)
+
     @staticmethod
     def card_was_skipped_intentionally_info(context: WarningContext) -> None:
-        info('The card was skipped (count was 0)',
+        info('card_was_skipped_intentionally_info',
+             'The card was skipped (count was 0)',
+             in_context=context)
+
+    @staticmethod
+    def row_has_extra_cells(context: WarningContext, extra_cells_count: int) -> None:
+        warn('row_has_extra_cells',
+             'The row has more cells than there are columns ({0} extra); these are ignored',
+             extra_cells_count,
              in_context=context)
 
     @staticmethod
     def referencing_excluded_row(context: WarningContext,
                                  referenced_row_number: int) -> None:
-        warn('The column contains a field that references an excluded row (#{0})'
-             .format(referenced_row_number),
+        warn('referencing_excluded_row',
+             'The column contains a field that references an excluded row (#{0})',
+             referenced_row_number,
              in_context=context)
 
     @staticmethod
     def referencing_row_out_of_bounds(context: WarningContext,
                                       referenced_row_number: int) -> None:
-        warn('The column contains a field that references a row that is out of bounds (#{0})'
-             .format(referenced_row_number),
+        warn('referencing_row_out_of_bounds',
+             'The column contains a field that references a row that is out of bounds (#{0})',
+             referenced_row_number,
+             in_context=context)
+
+    @staticmethod
+    def referencing_unknown_row(context: WarningContext,
+                                key_column: str,
+                                key: str) -> None:
+        warn('referencing_unknown_row',
+             'The column contains a field that references a row that can not be found '
+             '(no row has \'{1}\' in the column \'{0}\')',
+             key_column, key,
+             in_context=context)
+
+    @staticmethod
+    def referencing_unknown_datasource(context: WarningContext,
+                                       datasource_path: str) -> None:
+        warn('referencing_unknown_datasource',
+             'The column contains a field that references a datasource that can not be found '
+             'or read: \'{0}\'',
+             datasource_path,
              in_context=context)
 
     @staticmethod
     def referencing_row_header(context: WarningContext) -> None:
-        warn('The column contains a field that references the header row (did you mean #2?)',
+        warn('referencing_row_header',
+             'The column contains a field that references the header row (did you mean #2?)',
              in_context=context)
 
     @staticmethod
     def datasource_contains_filler_pages(context: WarningContext) -> None:
-        warn('Other datasources contain cards backs, but this one does not; filler pages were '
+        warn('datasource_contains_filler_pages',
+             'Other datasources contain cards backs, but this one does not; filler pages were '
              'inserted as necessary to keep all pages synchronized for two-sided printing',
              in_context=context)
@@ -0,0 +1,42 @@
+# coding=utf-8
+
+import unittest
+
+from cards.autotemplate import FieldTypeCounter, AutoTemplate, sampled, template_from_rows
+
+
+class UnreadDatasource:  # pylint: disable=too-few-public-methods
+    data_path = 'cards.csv'
+    column_names = ['title']
+    is_streamed = False
+
+    def rows(self):
+        raise AssertionError('the rows should not have been read')
+
+
+class AutoTemplateTest(unittest.TestCase):
+    def test_most_common_field_type(self):
+        counter = FieldTypeCounter(['@count', 'rank', 'title', '(note)'])
+
+        for row in [{'@count': '1', 'rank': '1', 'title': 'A', '(note)': '2'},
+                    {'@count': '1', 'rank': 'B', 'title': '3', '(note)': '4'},
+                    {'@count': '1', 'rank': '2', 'title': '', '(note)': '5'}]:
+            counter.add(row)
+
+        # special and excluded columns are not counted; and a tie goes to the type met first
+        self.assertEqual(list(counter.field_types().items()),
+                         [('rank', 'number'), ('title', 'title')])
+
+        self.assertEqual(template_from_rows(['title'], [{'title': ''}]), None)
+
+    def test_sample_is_bounded_and_repeatable(self):
+        sample = sampled(iter(range(1000)), 10)
+
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(sample, sampled(iter(range(1000)), 10))
+        self.assertEqual(sampled(iter(range(5)), 10), list(range(5)))
+
+    def test_template_is_only_made_when_needed(self):
+        default_template = AutoTemplate(UnreadDatasource(), is_disabled=True)
+
+        self.assertIsNone(default_template.content())
@@ -0,0 +1,81 @@
+# coding=utf-8
+
+import os
+import re
+import sys
+import stat
+import tempfile
+import subprocess
+import unittest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_project(project_path: str, cards_count: int) -> None:
+    """ Make a project of a single datasource with a number of cards. """
+
+    os.makedirs(project_path)
+
+    with open(os.path.join(project_path, 'cards.csv'), 'w') as data_file:
+        data_file.write('@count,text\n{0},card\n'.format(cards_count))
+
+
+class BatchTest(unittest.TestCase):
+    def test_projects_are_built_separately(self):
+        with tempfile.TemporaryDirectory() as directory_path:
+            small_project_path = os.path.join(directory_path, 'small')
+            large_project_path = os.path.join(directory_path, 'large')
+            broken_project_path = os.path.join(directory_path, 'broken')
+            missing_project_path = os.path.join(directory_path, 'missing')
+
+            make_project(small_project_path, 2)
+            make_project(large_project_path, 3)
+
+            os.makedirs(broken_project_path)
+
+            with open(os.path.join(broken_project_path, 'cards.jsonl'), 'w') as data_file:
+                data_file.write('not a JSON object\n')
+
+            # anything opening the output (e.g. in a browser) leaves a trace instead
+            bin_path = os.path.join(directory_path, 'bin')
+            opened_path = os.path.join(directory_path, 'opened')
+
+            os.makedirs(bin_path)
+
+            for name in ['xdg-open', 'open']:
+                opener_path = os.path.join(bin_path, name)
+
+                with open(opener_path, 'w') as opener_file:
+                    opener_file.write('#!/bin/sh\ntouch "{0}"\n'.format(opened_path))
+
+                os.chmod(opener_path, os.stat(opener_path).st_mode | stat.S_IEXEC)
+
+            environment = dict(os.environ, CARDS_NO_UPDATE_CHECK='1',
+                               PATH=bin_path + os.pathsep + os.environ.get('PATH', ''))
+
+            # a single worker builds every project; nothing may be carried over between them
+            # note that a question asked on stdin would fail on its end, instead of waiting
+            process = subprocess.run(
+                [sys.executable, '-m', 'cards', 'batch',
+                 small_project_path, large_project_path,
+                 broken_project_path, missing_project_path, '--jobs=1'],
+                cwd=ROOT_PATH, env=environment, stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                universal_newlines=True, timeout=60)
+
+            self.assertEqual(process.returncode, 1)
+
+            cards_totals = {project_path: int(cards_total) for project_path, cards_total
+                            in re.findall(r'^\[-\] (.+): (\d+) cards? on',
+                                          process.stdout, re.MULTILINE)}
+
+            self.assertEqual(cards_totals, {small_project_path: 2, large_project_path: 3})
+
+            self.assertIn('[!] {0}: 0 cards'.format(broken_project_path), process.stdout)
+            self.assertIn('[!] {0}: failed (no project directory was found)\n\n[!] Built'
+                          .format(missing_project_path), process.stdout)
+            self.assertIn('Built 2 of 4 projects', process.stdout)
+
+            self.assertFalse(os.path.exists(missing_project_path))
+            self.assertFalse(os.path.exists(opened_path))
+            self.assertNotIn('(Y)es or (n)o?', process.stdout)
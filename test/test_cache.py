@@ -0,0 +1,111 @@
+# coding=utf-8
+
+import os
+import time
+import tempfile
+import unittest
+
+from cards.cache import RenderCache
+from cards.column import Row
+
+
+class RenderCacheTest(unittest.TestCase):
+    def test_store_and_lookup(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            cache = RenderCache(cache_path)
+
+            key = cache.key('some', 'components')
+
+            self.assertIsNone(cache.get(key))
+
+            cache.put(key, {'content': 'card'})
+
+            self.assertEqual(cache.get(key), {'content': 'card'})
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(cache.misses, 1)
+
+            # any other process sharing the directory should see the same entry
+            self.assertEqual(RenderCache(cache_path).get(key), {'content': 'card'})
+
+    def test_card_key(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            cache = RenderCache(cache_path)
+
+            definitions_key = cache.definitions_key({'a': 'b'})
+
+            row = Row({'title': 'A'}, row_index=2)
+
+            key = cache.card_key('{{ title }}', None, row, definitions_key)
+
+            self.assertEqual(key, cache.card_key('{{ title }}', None, row, definitions_key))
+            self.assertNotEqual(key, cache.card_key('{{ title }}!', None, row, definitions_key))
+            self.assertNotEqual(key, cache.card_key('{{ title }}', None,
+                                                    Row({'title': 'B'}, row_index=2),
+                                                    definitions_key))
+            self.assertNotEqual(key, cache.card_key('{{ title }}', None, row,
+                                                    cache.definitions_key({'a': 'c'})))
+
+    def test_card_key_is_the_same_in_any_checkout(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            cache = RenderCache(cache_path)
+
+            keys = []
+
+            for checkout_path in ['/checkout-a', '/elsewhere/checkout-b']:
+                row = Row({'title': 'A'}, os.path.join(checkout_path, 'cards.csv'), row_index=2)
+
+                keys.append(cache.card_key('{{ title }}', os.path.join(checkout_path, 't.html'),
+                                           row, ''))
+
+            self.assertEqual(keys[0], keys[1])
+
+            # a row that has moved is still the same card; unless the card mentions its row index
+            for template_content in ['{{ title }}', '{{ title }} {{ _card_row_index }}']:
+                keys = [cache.card_key(template_content, '/checkout-a/t.html',
+                                       Row({'title': 'A'}, '/checkout-a/cards.csv',
+                                           row_index=row_index), '')
+                        for row_index in [2, 3]]
+
+                self.assertEqual(keys[0] == keys[1], '_card_row_index' not in template_content)
+
+    def test_card_key_follows_includes(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            include_path = os.path.join(cache_path, 'include.html')
+
+            with open(include_path, 'w') as include_file:
+                include_file.write('one')
+
+            template_path = os.path.join(cache_path, 'template.html')
+            template_content = '{{ include \'include.html\' }}'
+
+            row = Row({}, row_index=2)
+
+            key = RenderCache(cache_path).card_key(template_content, template_path, row, '')
+
+            with open(include_path, 'w') as include_file:
+                include_file.write('two')
+
+            self.assertNotEqual(
+                key, RenderCache(cache_path).card_key(template_content, template_path, row, ''))
+
+    def test_evict_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            cache = RenderCache(cache_path)
+
+            cache.put('aa1', {'content': 'x' * 100})
+            cache.put('aa2', {'content': 'x' * 100})
+
+            # make the first entry the most recently used
+            old = time.time() - 100
+
+            os.utime(cache.entry_path('aa2'), (old, old))
+
+            cache.get('aa1')
+
+            cache.max_size = cache.size() - 1
+
+            cache.evict()
+
+            self.assertIsNotNone(cache.get('aa1'))
+            self.assertIsNone(cache.get('aa2'))
+            self.assertEqual(cache.evictions, 1)
@@ -0,0 +1,47 @@
+# coding=utf-8
+
+import threading
+import unittest
+
+from cards.context import BuildContext, within_build_context
+from cards.warning import WarningDisplay, WarningContext
+
+
+class BuildContextTest(unittest.TestCase):
+    def test_contexts_are_isolated_between_threads(self):
+        contexts = [BuildContext(), BuildContext()]
+
+        def build(context: BuildContext, warnings: int):
+            with context:
+                for row_index in range(warnings):
+                    WarningDisplay.indeterminable_count(WarningContext('cards.csv', row_index))
+
+        threads = [threading.Thread(target=build, args=(context, (i + 1) * 50))
+                   for i, context in enumerate(contexts)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(contexts[0].warning_count, 50)
+        self.assertEqual(contexts[1].warning_count, 100)
+        self.assertEqual(BuildContext.current().warning_count, 0)
+
+    def test_build_runs_within_context_of_its_own(self):
+        @within_build_context
+        def build():
+            WarningDisplay.indeterminable_count(WarningContext('cards.csv'))
+
+            return BuildContext.current()
+
+        first_context = build()
+        second_context = build()
+
+        self.assertIsNot(first_context, second_context)
+        self.assertEqual(second_context.warning_count, 1)
+
+        context = BuildContext()
+
+        self.assertIs(build(context=context), context)
@@ -0,0 +1,278 @@
+# coding=utf-8
+
+import io
+import os
+import csv
+import json
+import sqlite3
+import tempfile
+import unittest
+
+from collections import OrderedDict
+
+from cards.column import (
+    Row, Column, get_row_reference, parse_row_reference, referenced_data_paths
+)
+from cards.templatefield import fields
+from cards.reader import CsvReader, read_stdin, get_stdin_data_path
+from cards.datasource import (
+    DatasourceIndex, read_datasource, load_datasource, load_datasources, get_datasource_cache_path
+)
+
+DATASOURCE = ('@count,title,text@front-only,text@back-only,(note),text\n'
+              '2,A,front,back,,both\n'
+              '\n'
+              '#1,Excluded,,,,\n'
+              '1,"B\n(on two lines)",,,,\n'
+              '1,C\n')
+
+
+class DatasourceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        self.data_path = os.path.join(self.directory.name, 'cards.csv')
+
+        with open(self.data_path, 'w') as data_file:
+            data_file.write(DATASOURCE)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rows_are_counted_like_dict_reader(self):
+        datasource = read_datasource(CsvReader(self.data_path))
+
+        self.assertEqual(datasource.row_indices, [2, 4, 5])
+        self.assertEqual(datasource.excluded_row_indices, {3})
+
+        rows = [dict(row) for row in csv.DictReader(io.StringIO(DATASOURCE))
+                if not row['@count'].startswith('#')]
+
+        self.assertEqual([dict(row.data) for row in datasource.rows()], rows)
+
+    def test_front_and_back_rows(self):
+        datasource = read_datasource(CsvReader(self.data_path))
+
+        row = datasource.row(0)
+
+        self.assertEqual(row.data.get('title'), 'A')
+        self.assertIn('(note)', row.data)
+
+        # the front and back of a row must be the same whether or not its columns are classified
+        for view, reference in [(row.front_row(), Row(dict(row.data)).front_row()),
+                                (row.back_row(), Row(dict(row.data)).back_row())]:
+            self.assertEqual(list(view.data.items()), list(reference.data.items()))
+            self.assertEqual(view.data, reference.data)
+            self.assertEqual(view.row_index, 2)
+
+        self.assertEqual(row.front_row().data['text'], 'front')
+        self.assertEqual(row.back_row().data['text'], 'back')
+
+    def test_streaming_datasource_is_read_like_any_other(self):
+        datasource = load_datasource(self.data_path, streaming=False)
+        streaming_datasource = load_datasource(self.data_path, streaming=True)
+
+        self.assertEqual(streaming_datasource.column_names, datasource.column_names)
+
+        self.assertEqual([(row.row_index, dict(row.data)) for row in datasource.rows()],
+                         [(row.row_index, dict(row.data)) for row in streaming_datasource.rows()])
+
+        for loaded_datasource in [datasource, streaming_datasource]:
+            row, is_excluded = loaded_datasource.row_at(4)
+
+            self.assertFalse(is_excluded)
+            self.assertEqual(row.data['title'], 'B\n(on two lines)')
+
+            self.assertEqual(loaded_datasource.row_at(3), (None, True))
+            self.assertEqual(loaded_datasource.row_at(6), (None, False))
+
+    def test_json_lines_datasource_is_read_like_any_other(self):
+        data_path = os.path.join(self.directory.name, 'cards.jsonl')
+
+        with open(data_path, 'w') as data_file:
+            for row in csv.reader(io.StringIO(DATASOURCE)):
+                if len(row) == 0:
+                    data_file.write('\n')
+                elif row[0].startswith('#'):
+                    data_file.write('# excluded\n')
+                elif row[0] != '@count':
+                    keys = ['@count', 'title', 'text@front-only', 'text@back-only', '(note)']
+
+                    # the last column is not in the first object; but its key is
+                    data_file.write(json.dumps(
+                        dict(list(zip(keys, [int(row[0])] + row[1:])) +
+                             [('text', row[5] if len(row) > 5 else None)])) + '\n')
+
+        for streaming in [False, True]:
+            datasource = load_datasource(self.data_path, streaming=streaming)
+            json_datasource = load_datasource(data_path, streaming=streaming)
+
+            self.assertEqual(json_datasource.column_names, datasource.column_names)
+
+            # note that a missing cell is the same as an empty cell when rendered
+            self.assertEqual([(row.row_index, [content or '' for content in row.data.values()])
+                              for row in json_datasource.rows()],
+                             [(row.row_index, [content or '' for content in row.data.values()])
+                              for row in datasource.rows()])
+
+            self.assertEqual(json_datasource.row_at(3), (None, True))
+
+    def test_stdin_datasource_is_read_like_any_other(self):
+        datasource = read_datasource(CsvReader(self.data_path))
+
+        stdin_data_path = get_stdin_data_path(self.directory.name)
+
+        stdin_datasource = read_datasource(read_stdin(stdin_data_path, io.StringIO(DATASOURCE)))
+
+        self.assertEqual(stdin_datasource.data_path, stdin_data_path)
+        self.assertIsNotNone(stdin_datasource.content_hash)
+
+        self.assertEqual([(row.row_index, dict(row.data)) for row in stdin_datasource.rows()],
+                         [(row.row_index, dict(row.data)) for row in datasource.rows()])
+
+        # the format is told by the content
+        reader = read_stdin(stdin_data_path, io.StringIO('\n{"title": "A"}\n{"title": "B"}\n'))
+
+        self.assertEqual([cells for cells, _, _ in reader.read_rows()], [['A'], ['B']])
+
+    def test_context_holding_a_hash_is_not_always_a_row_reference(self):
+        for context in ['note #3', 'https://example.com/a#b=c', 'cards#4', 'my cards.csv#4']:
+            self.assertEqual(parse_row_reference(context), (None, None, None, None))
+
+        self.assertTrue(next(fields('{{ title sub/factions.jsonl#4 }}')).has_row_reference())
+
+        content = '{{ text note #3 }} {{ link https://example.com/a#b=c }}'
+
+        self.assertFalse(any(field.has_row_reference() for field in fields(content)))
+        self.assertEqual(referenced_data_paths(content, self.data_path), [])
+
+    def test_rows_are_referenced_across_datasources(self):
+        self.assertEqual(parse_row_reference('#4'), ('', 4, None, None))
+        self.assertEqual(parse_row_reference('factions.csv#Name= Elves'),
+                         ('factions.csv', None, 'name', 'Elves'))
+        self.assertEqual(parse_row_reference('factions.csv'), (None, None, None, None))
+        self.assertEqual(parse_row_reference('#elves'), (None, None, None, None))
+
+        factions_path = os.path.join(self.directory.name, 'factions.csv')
+
+        with open(factions_path, 'w') as data_file:
+            data_file.write('id,name\norcs,Orcs\n#elves,Excluded\nelves,Elves\n')
+
+        # only the cards are built; the factions are loaded once first referenced
+        index = DatasourceIndex(load_datasources([self.data_path]))
+
+        row = index.datasource(self.data_path).row(0).front_row()
+
+        def referenced_row(field: str) -> Row:
+            _, reference_row, is_invalid_reference = get_row_reference(
+                next(fields(field)), row, Column('text'))
+
+            return reference_row if not is_invalid_reference else None
+
+        self.assertEqual(referenced_row('{{ name factions.csv#id=elves }}').data['name'], 'Elves')
+        self.assertEqual(referenced_row('{{ name factions.csv#2 }}').data['name'], 'Orcs')
+        self.assertEqual(referenced_row('{{ title #title=C }}').row_index, 5)
+
+        self.assertIsNone(referenced_row('{{ name factions.csv#id=dwarves }}'))
+        self.assertIsNone(referenced_row('{{ name factions.csv#3 }}'))
+        self.assertIsNone(referenced_row('{{ name nowhere.csv#2 }}'))
+
+        self.assertIs(index.datasource(factions_path), index.datasource(factions_path))
+        self.assertEqual(index.referenced_data_paths, [factions_path,
+                                                       os.path.join(self.directory.name,
+                                                                    'nowhere.csv')])
+
+    def test_json_lines_object_missing_a_key_has_an_empty_cell(self):
+        data_path = os.path.join(self.directory.name, 'cards.jsonl')
+
+        with open(data_path, 'w') as data_file:
+            data_file.write('{"Name": "A", "@template": "t.html", "@count": 2}\n'
+                            '{"Name": "B", "@template": "t.html"}\n')
+
+        for streaming in [False, True]:
+            rows = list(load_datasource(data_path, streaming=streaming).rows())
+
+            self.assertEqual([row.data['@count'] for row in rows], ['2', ''])
+            self.assertEqual([row.is_prototype() for row in rows], [False, False])
+            self.assertEqual([row.determine_count()[0] for row in rows], [2, 1])
+
+    def test_cached_datasource_is_parsed_again_once_changed(self):
+        with tempfile.TemporaryDirectory() as directory_path, \
+                tempfile.TemporaryDirectory() as cache_directory:
+            data_path = os.path.join(directory_path, 'cards.csv')
+
+            with open(data_path, 'w') as data_file:
+                data_file.write('title\nA\n')
+
+            self.assertEqual(load_datasource(data_path, cache_directory=cache_directory)
+                             .row(0).data['title'], 'A')
+
+            cache_path = get_datasource_cache_path(data_path, cache_directory)
+
+            # kept as plain data, and never next to the datasource
+            with open(cache_path) as cache_file:
+                self.assertEqual(json.load(cache_file)['columns'], [['A']])
+
+            self.assertEqual(os.listdir(directory_path), ['cards.csv'])
+
+            modified_at = os.stat(data_path).st_mtime_ns
+
+            # same size, but not the same content
+            with open(data_path, 'w') as data_file:
+                data_file.write('title\nB\n')
+
+            os.utime(data_path, ns=(modified_at + 1000000000, modified_at + 1000000000))
+
+            self.assertEqual(load_datasource(data_path, cache_directory=cache_directory)
+                             .row(0).data['title'], 'B')
+
+    def test_sqlite_datasource_is_read_like_any_other(self):
+        with tempfile.TemporaryDirectory() as directory_path:
+            data_path = os.path.join(directory_path, 'cards.db')
+
+            connection = sqlite3.connect(data_path)
+            connection.execute('CREATE TABLE cards ("@Count", title, "(note)")')
+            connection.executemany('INSERT INTO cards VALUES (?, ?, ?)',
+                                   [(2, 'A', None), ('#1', 'Excluded', None), (1, 'C', 'x')])
+            connection.execute('CREATE VIEW sorted AS SELECT * FROM cards ORDER BY title DESC')
+            connection.commit()
+            connection.close()
+
+            datasource = load_datasource(data_path)
+
+            self.assertEqual(datasource.column_names, ['@count', 'title', '(note)'])
+            self.assertEqual([(row.row_index, dict(row.data)) for row in datasource.rows()],
+                             [(2, {'@count': '2', 'title': 'A', '(note)': ''}),
+                              (4, {'@count': '1', 'title': 'C', '(note)': 'x'})])
+
+            self.assertEqual(datasource.row_at(4)[0].data['title'], 'C')
+            self.assertEqual(datasource.row_at(3), (None, True))
+            self.assertEqual(datasource.row_at(5), (None, False))
+
+            # once closed, the database is not held open anymore; e.g. so that it can be moved
+            datasource.close()
+
+            self.assertIsNone(datasource.reader.connection)
+
+            # otherwise, the table (or view) named like the database is used
+            os.rename(data_path, os.path.join(directory_path, 'sorted.db'))
+
+            datasource = load_datasource(os.path.join(directory_path, 'sorted.db'))
+
+            # the rows of a view are counted in the order of the view
+            self.assertEqual([(row.row_index, row.data['title']) for row in datasource.rows()],
+                             [(3, 'C'), (4, 'A')])
+            self.assertEqual(datasource.row_at(2), (None, True))
+            self.assertEqual(datasource.row_at(4)[0].data['title'], 'A')
+
+            # closed along with every other datasource in the same build
+            index = DatasourceIndex(OrderedDict([(datasource.data_path, datasource)]))
+            index.close()
+
+            self.assertIsNone(datasource.reader.connection)
+
+            # a database with several tables, but none named like the database, can not be read
+            os.rename(os.path.join(directory_path, 'sorted.db'),
+                      os.path.join(directory_path, 'other.db'))
+
+            self.assertIsNone(load_datasource(os.path.join(directory_path, 'other.db')))
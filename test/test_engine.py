@@ -0,0 +1,85 @@
+# coding=utf-8
+
+import io
+import os
+import json
+import tempfile
+import unittest
+
+from contextlib import redirect_stdout
+
+from benchmarks.corpus import CorpusSpecification, generate_project
+
+from cards.cards import make
+from cards.context import BuildContext
+from cards.engine import Engines
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# every project under test/ and example/, as datasources and definitions;
+# note that test/image-field/cards.csv is left out, as it never finishes building (with any engine)
+PROJECTS = [
+    (['test/template/cards.csv'], None),
+    (['test/template/cards-no-template.csv'], None),
+    (['test/template/cards-with-unused-fields.csv'], None),
+    (['test/template/cards-with-defs.csv'], 'test/template/defs.csv'),
+    (['test/template-field/cards.csv'], None),
+    (['test/image-field/cards-with-defs.csv'], 'test/image-field/defs.csv'),
+    (['test/count/cards.csv'], None),
+    (['test/count/cards-no-count.csv'], None),
+    (['example/love-letter/cards.csv'], None),
+    (['example/love-letter-templated/cards.csv'], None),
+    (['example/love-letter-templated/cards.csv', 'test/template/cards.csv'], None)
+]
+
+
+def build(data_paths: list, definitions_path: str, output_path: str, engine: str) -> (str, set):
+    """ Build a project with an engine, and return its output and every diagnostic raised. """
+
+    context = BuildContext(is_interactive=False, engine=engine)
+
+    with redirect_stdout(io.StringIO()):
+        variant_results = make(data_paths, definitions_path=definitions_path,
+                               output_path=output_path, output_filename='index.html',
+                               open_output=False, context=context)
+
+    output_filepath = variant_results[0][0]
+
+    with open(output_filepath) as output_file:
+        output = output_file.read()
+
+    # the same diagnostic may be raised a different number of times by each engine
+    diagnostics = {json.dumps(dict(diagnostic.to_dict(), times_raised=None), sort_keys=True)
+                   for diagnostic in context.diagnostics.values()}
+
+    return output, diagnostics
+
+
+class EngineTest(unittest.TestCase):
+    def assertIdenticalBuilds(self, data_paths: list, definitions_path: str=None):
+        with tempfile.TemporaryDirectory() as output_path:
+            builds = [build(data_paths, definitions_path, os.path.join(output_path, engine), engine)
+                      for engine in Engines.ALL]
+
+        reference_output, reference_diagnostics = builds[0]
+
+        for output, diagnostics in builds[1:]:
+            self.assertEqual(output, reference_output)
+            self.assertEqual(diagnostics, reference_diagnostics)
+
+    def test_projects_render_identically(self):
+        for data_paths, definitions_path in PROJECTS:
+            with self.subTest(data_paths=data_paths):
+                self.assertIdenticalBuilds(
+                    [os.path.join(ROOT_PATH, data_path) for data_path in data_paths],
+                    os.path.join(ROOT_PATH, definitions_path)
+                    if definitions_path is not None else None)
+
+    def test_generated_projects_render_identically(self):
+        for seed in range(3):
+            specification = CorpusSpecification(
+                rows=20, columns=2, counts=(0, 1, 2), definitions=4, definition_depth=2,
+                includes=1, references=2, images=1, datasources=2, seed=seed)
+
+            with self.subTest(seed=seed), tempfile.TemporaryDirectory() as project_path:
+                self.assertIdenticalBuilds(*generate_project(specification, project_path))
@@ -0,0 +1,214 @@
+# coding=utf-8
+
+import io
+import os
+import re
+import sys
+import tempfile
+import unittest
+import subprocess
+
+from contextlib import redirect_stdout
+
+from cards.cards import make
+from cards.context import BuildContext
+from cards.layout import (
+    ResolvedCards, ResolvedDatasource, ResolvedCard, PageLayout, layout_pages,
+    get_resolved_cards_path
+)
+from cards.template import IndexWriter, fill_index
+from cards.constants import CardSizes
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# builds like 'cards ...' would, but reports the peak memory used by the build on stderr;
+# note that the peak resident set size of a process is only told apart from that of its parent
+# (i.e. the test) through /proc
+MEASURED_BUILD = ('import re, sys, runpy\n'
+                  'try:\n'
+                  '    runpy.run_module("cards", run_name="__main__")\n'
+                  'finally:\n'
+                  '    with open("/proc/self/status") as status:\n'
+                  '        sys.stderr.write("peak memory: {0}\\n".format(\n'
+                  '            re.search(r"VmHWM:\\s*(\\d+)", status.read()).group(1)))\n')
+
+
+class ResolvedCardsTest(unittest.TestCase):
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            data_path = os.path.join(path, 'cards.csv')
+
+            with open(data_path, 'w') as data_file:
+                data_file.write('title\nA\n')
+
+            resolved_cards = ResolvedCards()
+            resolved_cards.data_paths = [data_path]
+            resolved_cards.datasources.append(ResolvedDatasource(
+                'cards.csv', data_path, 'jumbo', cards=[ResolvedCard(2, 3, 'A')]))
+            resolved_cards.record_inputs([data_path])
+
+            resolved_cards_path = os.path.join(path, '.cards', 'index.html.json')
+
+            resolved_cards.save(resolved_cards_path)
+
+            loaded_cards = ResolvedCards.load(resolved_cards_path)
+
+            self.assertEqual(loaded_cards.cards_total_unique(), 1)
+            self.assertEqual(loaded_cards.datasources[0].cards_total(), 3)
+            self.assertEqual(loaded_cards.datasources[0].size_identifier, 'jumbo')
+            self.assertTrue(loaded_cards.is_current([data_path], None, False, True))
+            # backs were never resolved
+            self.assertFalse(loaded_cards.is_current([data_path], None, False, False))
+
+            with open(data_path, 'a') as data_file:
+                data_file.write('B\n')
+
+            self.assertFalse(loaded_cards.is_current([data_path], None, False, True))
+
+    def test_layout_pages(self):
+        resolved_cards = ResolvedCards()
+        resolved_cards.datasources.append(ResolvedDatasource(
+            'cards.csv', 'cards.csv', cards=[ResolvedCard(2, 10, 'A {{ _card_index }}')]))
+
+        page_layout = PageLayout(
+            '{{ _card_content }}', '[{{ _cards }}]', '', '',
+            CardSizes.get_default_card_size(),
+            should_disable_backs=True,
+            should_disable_page_sections=True)
+
+        pages, pages_total, cards_total = layout_pages(resolved_cards.datasources, page_layout)
+
+        # 9 standard cards fit on a page
+        self.assertEqual(pages_total, 2)
+        self.assertEqual(cards_total, 10)
+        self.assertIn('A 10', pages)
+
+    def test_written_pages_are_the_same_as_filled_pages(self):
+        resolved_cards = ResolvedCards()
+        resolved_cards.datasources.append(ResolvedDatasource(
+            'cards.csv', 'cards.csv', cards=[ResolvedCard(2, 10, 'A {{ _card_index }}\n')]))
+
+        index = '<html>\n  <p>{{ _pages_total }}</p>\n  {{ _pages }}\n</html>\n'
+
+        def page_layout(page_writer=None) -> PageLayout:
+            return PageLayout(
+                '<div>\n  {{ _card_content }}\n</div>\n', '<p>\n  {{ _cards }}\n</p>\n', '', '',
+                CardSizes.get_default_card_size(),
+                should_disable_backs=True,
+                should_disable_page_sections=True,
+                page_writer=page_writer)
+
+        pages, pages_total, cards_total = layout_pages(resolved_cards.datasources, page_layout())
+
+        filled_index, _ = fill_index(index, '', pages, '', pages_total, cards_total, {})
+
+        stream = io.StringIO()
+
+        index_writer = IndexWriter(stream, index, '', '', pages_total, cards_total, {})
+        index_writer.begin()
+
+        layout_pages(resolved_cards.datasources, page_layout(index_writer.write_page))
+
+        index_writer.end()
+
+        self.assertEqual(stream.getvalue(), filled_index)
+        self.assertIn('<p>2</p>', filled_index)
+
+    def test_resolved_cards_are_only_kept_when_asked(self):
+        with tempfile.TemporaryDirectory() as path:
+            data_path = os.path.join(path, 'cards.csv')
+
+            with open(data_path, 'w') as data_file:
+                data_file.write('@template,title\n{{ title }},A\n')
+
+            def build(**options) -> (str, BuildContext):
+                context = BuildContext(is_interactive=False)
+
+                with redirect_stdout(io.StringIO()):
+                    variant_results = make([data_path], output_path=path,
+                                           output_filename='index.html', open_output=False,
+                                           context=context, **options)
+
+                resolved_cards_path = get_resolved_cards_path(
+                    os.path.dirname(variant_results[0][0]), 'index.html')
+
+                return resolved_cards_path, context
+
+            resolved_cards_path, _ = build()
+
+            self.assertFalse(os.path.exists(resolved_cards_path))
+
+            resolved_cards_path, _ = build(keep_layout=True)
+
+            self.assertTrue(os.path.exists(resolved_cards_path))
+
+            _, context = build(layout_only=True)
+
+            self.assertIn('layout_only_info',
+                          [diagnostic.kind for diagnostic in context.diagnostics.values()])
+
+    def test_written_pages_have_deferred_totals(self):
+        resolved_cards = ResolvedCards()
+        resolved_cards.datasources.append(ResolvedDatasource(
+            'cards.csv', 'cards.csv', cards=[ResolvedCard(2, 10, 'A {{ _cards_total }}\n')]))
+
+        stream = io.StringIO()
+
+        index_writer = IndexWriter(stream, '<p>{{ _pages_total }}</p>\n{{ _pages }}\n',
+                                   None, '', None, None, {})
+
+        page_layout = PageLayout(
+            '{{ _card_content }}\n', '{{ _cards }} {{ _cards_total_in_context }}\n', '', '',
+            CardSizes.get_default_card_size(),
+            should_disable_backs=True,
+            should_disable_page_sections=True,
+            page_writer=index_writer.write_page)
+
+        index_writer.begin()
+
+        page_layout.begin_datasource(resolved_cards.datasources[0])
+
+        for card in resolved_cards.datasources[0].cards:
+            page_layout.add_card(card)
+
+        page_layout.end_datasource(is_last=True)
+
+        index_writer.end('<style></style>', page_layout.totals())
+
+        output = stream.getvalue()
+
+        self.assertNotIn('{{', output)
+        self.assertIn('<p><span class="deferred-total" data-total="pages"></span></p>', output)
+        self.assertIn('data-total="cards-in-context-1"', output)
+        self.assertIn('<style></style>', output)
+        self.assertIn('({"cards": 10, "cards-in-context-1": 10, "pages": 2})', output)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/status'),
+                         'peak memory is only measured through /proc')
+    def test_streamed_output_does_not_grow_with_rows(self):
+        peak_memory = {}
+
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'card.html'), 'w') as template_file:
+                template_file.write('<b>{{ title }}</b> {{ text }}')
+
+            for rows in [1000, 10000]:
+                data = '@template,title,text\n' + ''.join(
+                    'card.html,Card {0},Some text for card {0}\n'.format(row)
+                    for row in range(rows))
+
+                process = subprocess.run(
+                    [sys.executable, '-c', MEASURED_BUILD, 'make', '-', '--base-dir=' + path,
+                     '--output-path=' + os.path.join(path, str(rows)), '--output-file=-'],
+                    input=data, cwd=ROOT_PATH,
+                    env=dict(os.environ, CARDS_NO_UPDATE_CHECK='1'),
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True, timeout=120)
+
+                self.assertEqual(process.returncode, 0, process.stderr)
+                self.assertEqual(process.stdout.count('<b>Card '), rows)
+
+                peak_memory[rows] = int(re.search(r'peak memory: (\d+)', process.stderr).group(1))
+
+        # ten times the rows must not take noticeably more memory; no row or card is kept
+        self.assertLess(peak_memory[10000], peak_memory[1000] * 1.1)
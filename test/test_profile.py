@@ -0,0 +1,95 @@
+# coding=utf-8
+
+import os
+import time
+import tempfile
+import unittest
+import tracemalloc
+
+from cards.context import BuildContext
+from cards.profile import BuildProfile, BuildTrace, BuildMemoryReport, phase, span
+from cards.resource import copy_images_to_output_directory
+
+
+class ProfileTest(unittest.TestCase):
+    def test_nested_phases_are_excluded(self):
+        profile = BuildProfile()
+
+        with BuildContext(profile=profile):
+            with phase('outer'):
+                with phase('inner'):
+                    time.sleep(0.05)
+
+            with phase('inner'):
+                pass
+
+        self.assertEqual(profile.phases['inner'].count, 2)
+        self.assertEqual(profile.phases['outer'].count, 1)
+        self.assertGreaterEqual(profile.phases['inner'].wall_time, 0.05)
+        self.assertLess(profile.phases['outer'].wall_time, 0.05)
+
+    def test_phases_are_not_timed_without_profile(self):
+        with BuildContext() as context:
+            with phase('outer'):
+                pass
+
+        self.assertIsNone(context.profile)
+
+    def test_slowest_spans(self):
+        trace = BuildTrace('trace.json')
+
+        with BuildContext(trace=trace):
+            for row_index, duration in [(2, 0.01), (3, 0.03), (2, 0.01)]:
+                with span('cards.csv:#{0}'.format(row_index), 'card', row_index=row_index):
+                    time.sleep(duration)
+
+            with phase('outer'):
+                pass
+
+        self.assertEqual(len(trace.events), 4)
+        self.assertEqual([(row_index, spans) for row_index, _, spans
+                          in trace.slowest('card', 'row_index')], [(3, 1), (2, 2)])
+
+    def test_each_resource_copy_is_traced(self):
+        trace = BuildTrace('trace.json')
+
+        with tempfile.TemporaryDirectory() as directory_path:
+            image_paths = [os.path.join(directory_path, name) for name in ['a.png', 'b.png']]
+
+            for image_path in image_paths:
+                with open(image_path, 'wb') as image_file:
+                    image_file.write(b'image')
+
+            with BuildContext(trace=trace):
+                copy_images_to_output_directory(
+                    image_paths, 'cards.csv', os.path.join(directory_path, 'generated'))
+
+        self.assertEqual([(event['name'], event['args']) for event in trace.events
+                          if event['cat'] == 'resource'],
+                         [(image_path, {'datasource': 'cards.csv'})
+                          for image_path in image_paths])
+
+    def test_memory_report(self):
+        memory_report = BuildMemoryReport()
+
+        self.addCleanup(tracemalloc.stop)
+
+        with BuildContext(memory_report=memory_report):
+            with phase('outer'):
+                with span('cards.csv', 'datasource', data_path='a/cards.csv'):
+                    retained = [bytearray(1024 * 1024)]
+
+                with span('cards.csv:#2', 'card'):
+                    pass
+
+                # the same name, but not the same datasource
+                with span('cards.csv', 'datasource', data_path='b/cards.csv'):
+                    pass
+
+        self.assertEqual(list(memory_report.datasources), ['a/cards.csv', 'b/cards.csv'])
+        self.assertGreaterEqual(memory_report.datasources['a/cards.csv'].retained_size,
+                                1024 * 1024)
+        self.assertLess(memory_report.datasources['b/cards.csv'].retained_size, 1024 * 1024)
+        self.assertGreaterEqual(memory_report.phases['outer'].peak_size, 1024 * 1024)
+        self.assertEqual(memory_report.top_allocations_phase, 'outer')
+        self.assertEqual(len(retained), 1)
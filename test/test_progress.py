@@ -0,0 +1,74 @@
+# coding=utf-8
+
+import io
+import os
+import tempfile
+import unittest
+
+from cards.cards import count_cards
+from cards.datasource import load_datasources
+from cards.progress import BuildProgress
+
+
+class ProgressTest(unittest.TestCase):
+    def test_progress_is_logged_when_not_on_terminal(self):
+        stream = io.StringIO()
+
+        progress = BuildProgress(stream, log_interval=0)
+        progress.begin(cards_total=4)
+
+        for _ in range(2):
+            progress.advance('cards.csv')
+
+        progress.finish()
+
+        lines = stream.getvalue().splitlines()
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[-1].startswith('[-] Rendering cards.csv: 2/4 cards (50%)'))
+
+    def test_estimated_progress_is_marked(self):
+        stream = io.StringIO()
+
+        progress = BuildProgress(stream, log_interval=0)
+        progress.begin(cards_total=10, is_estimate=True)
+        progress.advance('cards.csv', cards=5)
+
+        self.assertTrue(stream.getvalue().startswith('[-] Rendering cards.csv: 5/~10 cards (50%)'))
+
+    def test_progress_is_rate_limited(self):
+        stream = io.StringIO()
+
+        progress = BuildProgress(stream, log_interval=60)
+        progress.begin(cards_total=1000)
+
+        for _ in range(1000):
+            progress.advance('cards.csv')
+
+        self.assertEqual(stream.getvalue(), '')
+
+    def test_cards_are_counted_ahead(self):
+        with tempfile.TemporaryDirectory() as path:
+            data_path = os.path.join(path, 'cards.csv')
+
+            with open(data_path, 'w') as data_file:
+                # a row spanning several lines, an excluded row and a row that is skipped
+                data_file.write('@count,title\n'
+                                '3,"A\nB"\n'
+                                '#2,C\n'
+                                '0,D\n'
+                                ',E\n')
+
+            datasources = load_datasources([data_path])
+
+            self.assertEqual(count_cards([data_path], datasources), (4, False))
+            self.assertEqual(count_cards([data_path], datasources, is_preview=True), (2, False))
+            self.assertEqual(count_cards([data_path], datasources, shard=(1, 2)), (4, False))
+            self.assertEqual(count_cards([data_path], datasources, shard=(2, 2)), (0, False))
+
+            datasources = load_datasources([data_path], streaming=True)
+
+            self.assertTrue(count_cards([data_path], datasources)[1])
+
+            for datasource in datasources.values():
+                datasource.close()
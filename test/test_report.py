@@ -0,0 +1,34 @@
+# coding=utf-8
+
+import os
+import tempfile
+import unittest
+
+from cards.context import BuildContext
+from cards.report import BuildReport
+from cards.warning import WarningDisplay, WarningContext
+
+
+class ReportTest(unittest.TestCase):
+    def test_report_output_files(self):
+        report = BuildReport('build.json')
+
+        with BuildContext(report=report) as context, \
+                tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.html')
+
+            with open(path, 'w') as output_file:
+                output_file.write('cards')
+
+            context.record_output_file(path, 'written')
+            context.record_copied_file(path, was_copied=False, already_existed=True)
+
+            WarningDisplay.indeterminable_count(WarningContext('cards.csv', 2))
+            WarningDisplay.indeterminable_count(WarningContext('cards.csv', 3))
+
+            result = report.to_dict(context)
+
+        self.assertEqual(result['output']['size'], 5)
+        self.assertEqual(result['output']['states'], {'written': 1})
+        self.assertEqual(result['diagnostics']['indeterminable_count']['count'], 2)
+        self.assertIsNone(result['phases'])
@@ -0,0 +1,44 @@
+# coding=utf-8
+
+import unittest
+
+from cards.shard import parse_shard, is_in_shard, merge_shards
+from cards.layout import ResolvedCards, ResolvedDatasource, ResolvedCard
+
+
+class ShardTest(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        self.assertEqual(parse_shard(' 2 / 2 '), (2, 2))
+        self.assertIsNone(parse_shard('0/4'))
+        self.assertIsNone(parse_shard('5/4'))
+        self.assertIsNone(parse_shard('1'))
+
+    def test_every_row_in_exactly_one_shard(self):
+        for row_sequence in range(1, 20):
+            self.assertEqual(
+                sum(1 for shard_index in range(1, 4)
+                    if is_in_shard(row_sequence, (shard_index, 3))), 1)
+
+    def test_merge_shards(self):
+        shards = []
+
+        for shard_index in range(1, 3):
+            resolved_cards = ResolvedCards()
+            resolved_cards.shard = (shard_index, 2)
+            resolved_cards.datasources.append(ResolvedDatasource(
+                'cards.csv', 'cards.csv',
+                cards=[ResolvedCard(row_index, 1, str(row_index))
+                       for row_index in range(2, 8)
+                       if is_in_shard(row_index - 1, resolved_cards.shard)]))
+            resolved_cards.embedded_styles = [('template-{0}.html'.format(shard_index),
+                                               'style', shard_index)]
+
+            shards.append((resolved_cards, 'shard-{0}/.cards/shard.json'.format(shard_index)))
+
+        merged_cards = merge_shards(list(reversed(shards)))
+
+        self.assertEqual([card.row_index for card in merged_cards.datasources[0].cards],
+                         [2, 3, 4, 5, 6, 7])
+        self.assertEqual([style[0] for style in merged_cards.embedded_styles],
+                         ['template-1.html', 'template-2.html'])
@@ -0,0 +1,45 @@
+# coding=utf-8
+
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the most time that importing the entry point may take (in microseconds); generous enough to
+# not fail on a slow machine, but far from the time it takes to import every command
+IMPORT_TIME_BUDGET = 100000
+
+
+def import_times(module_name: str) -> dict:
+    """ Import a module in a fresh interpreter, and return the cumulative time (in microseconds)
+        spent importing each module along the way.
+    """
+
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module_name],
+                            cwd=ROOT_PATH, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True).stderr
+
+    times = {}
+
+    for line in output.splitlines():
+        # e.g. 'import time:       349 |     170815 | cards.__main__'
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            _, cumulative_time, name = line.split('|')
+
+            if cumulative_time.strip().isdigit():
+                times[name.strip()] = int(cumulative_time)
+
+    return times
+
+
+class StartupTest(unittest.TestCase):
+    def test_entry_point_imports_only_what_is_needed(self):
+        times = import_times('cards.__main__')
+
+        # e.g. for --help or --version, nothing needed for building should be imported
+        for module_name in ['pkg_resources', 'cards.cards', 'cards.template', 'cards.batch']:
+            self.assertNotIn(module_name, times)
+
+        self.assertLess(times['cards.__main__'], IMPORT_TIME_BUDGET)
@@ -0,0 +1,62 @@
+# coding=utf-8
+
+import os
+import time
+import tempfile
+import unittest
+
+from cards.update import UpdateCheck, is_update_check_disabled, UPDATE_CHECK_VARIABLE
+from cards.util import version_key
+
+
+class UpdateCheckTest(unittest.TestCase):
+    def test_version_key(self):
+        self.assertLess(version_key('0.6.9'), version_key('0.6.10'))
+        self.assertLess(version_key('0.7.0b1'), version_key('0.7.0'))
+        self.assertEqual(version_key('1.0'), version_key('1.0.0'))
+
+    def test_check_is_due_once_a_day(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            update_check = UpdateCheck(os.path.join(cache_path, 'cards.py', 'update.json'))
+
+            now = time.time()
+
+            self.assertTrue(update_check.is_due(now))
+
+            update_check.write(None, now)
+
+            self.assertFalse(update_check.is_due(now + 60))
+            self.assertTrue(update_check.is_due(now + update_check.interval))
+
+    def test_newer_version_is_read_from_latest_check(self):
+        with tempfile.TemporaryDirectory() as cache_path:
+            update_check = UpdateCheck(os.path.join(cache_path, 'update.json'))
+
+            self.assertIsNone(update_check.newer_version())
+
+            update_check.write('999.0.0', time.time())
+
+            self.assertEqual(update_check.newer_version(), '999.0.0')
+
+            update_check.write('0.0.1', time.time())
+
+            self.assertIsNone(update_check.newer_version())
+
+    def test_check_can_be_disabled(self):
+        value = os.environ.pop(UPDATE_CHECK_VARIABLE, None)
+
+        try:
+            self.assertFalse(is_update_check_disabled())
+
+            os.environ[UPDATE_CHECK_VARIABLE] = '1'
+
+            self.assertTrue(is_update_check_disabled())
+
+            os.environ[UPDATE_CHECK_VARIABLE] = '0'
+
+            self.assertFalse(is_update_check_disabled())
+        finally:
+            os.environ.pop(UPDATE_CHECK_VARIABLE, None)
+
+            if value is not None:
+                os.environ[UPDATE_CHECK_VARIABLE] = value
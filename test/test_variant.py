@@ -0,0 +1,35 @@
+# coding=utf-8
+
+import os
+import tempfile
+import unittest
+
+from cards.variant import BuildVariant, get_variants_from_file
+
+
+class VariantTest(unittest.TestCase):
+    def test_variants_from_file(self):
+        with tempfile.TemporaryDirectory() as path:
+            variants_path = os.path.join(path, 'variants.csv')
+
+            with open(variants_path, 'w') as variants_file:
+                variants_file.write('Output-File,datasources,card-size,preview,disable-backs\n'
+                                    'index.html,,,,\n'
+                                    'proof.html,,,yes,\n'
+                                    '# excluded.html,,,,\n'
+                                    'tokens.html,tokens.csv other.csv,token,,no\n')
+
+            default_variant = BuildVariant('index.html', should_disable_backs=True)
+
+            variants = get_variants_from_file(variants_path, default_variant)
+
+            self.assertEqual([variant.output_filename for variant in variants],
+                             ['index.html', 'proof.html', 'tokens.html'])
+
+            self.assertFalse(variants[0].is_preview)
+            self.assertTrue(variants[0].should_disable_backs)
+            self.assertTrue(variants[1].is_preview)
+            self.assertFalse(variants[2].should_disable_backs)
+            self.assertEqual(variants[2].default_card_size_identifier, 'token')
+            self.assertTrue(variants[2].includes('tokens.csv', 'some/path/tokens.csv'))
+            self.assertFalse(variants[2].includes('cards.csv', 'cards.csv'))
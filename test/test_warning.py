@@ -0,0 +1,45 @@
+# coding=utf-8
+
+import os
+import json
+import tempfile
+import unittest
+
+from cards.context import BuildContext
+from cards.warning import WarningDisplay, WarningContext, save_diagnostics
+
+
+class WarningTest(unittest.TestCase):
+    def test_diagnostics_are_deduplicated(self):
+        with BuildContext() as context:
+            for _ in range(3):
+                WarningDisplay.unresolved_reference(WarningContext('cards.csv', 2), 'title')
+
+            WarningDisplay.unresolved_reference(WarningContext('cards.csv', 3), 'title')
+
+        diagnostics = list(context.diagnostics.values())
+
+        self.assertEqual(len(diagnostics), 2)
+        self.assertEqual(diagnostics[0].times_raised, 3)
+        self.assertFalse(diagnostics[0].is_displayed)
+        self.assertEqual(diagnostics[0].formatted_message(),
+                         'The field \'title\' could not be resolved')
+
+    def test_save_diagnostics(self):
+        with BuildContext(), tempfile.TemporaryDirectory() as directory:
+            WarningDisplay.missing_template_error(WarningContext('cards.csv', 2), 4)
+            WarningDisplay.unused_definitions(['a', 'b'])
+
+            path = os.path.join(directory, 'diagnostics.jsonl')
+
+            save_diagnostics(path)
+
+            with open(path) as diagnostics_file:
+                diagnostics = [json.loads(line) for line in diagnostics_file]
+
+        self.assertEqual([diagnostic['kind'] for diagnostic in diagnostics],
+                         ['missing_template_error', 'unused_definitions'])
+        self.assertEqual(diagnostics[0]['severity'], 'error')
+        self.assertEqual(diagnostics[0]['context']['row_index'], 2)
+        self.assertEqual(diagnostics[0]['message'], 'The card did not provide a template (4 cards)')
+        self.assertEqual(diagnostics[1]['args'], [['a', 'b']])